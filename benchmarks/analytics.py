@@ -0,0 +1,92 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from ledgers import src_path  # noqa: F401 (adds src to sys.path)
+from portfolio.analytics import Performance
+
+
+def synthetic_portfolios(num_portfolios, years, flows_per_year, seed=0):
+    # daily values growing by random returns, with deposits and withdrawals
+    # on random days
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2010-01-01', periods=int(365.25 * years))
+    shape = (len(dates), num_portfolios)
+    returns = rng.normal(0.0003, 0.01, shape)
+    flows = np.zeros(shape)
+    num_flows = int(flows_per_year * years) * num_portfolios
+    flows[rng.integers(1, len(dates), num_flows),
+          rng.integers(0, num_portfolios, num_flows)] = rng.normal(
+              1000, 3000, num_flows)
+    values = np.empty(shape)
+    values[0] = rng.uniform(10000, 100000, num_portfolios)
+    for day in range(1, len(dates)):
+        # withdrawals never take more than there is
+        flows[day] = np.maximum(flows[day], -0.5 * values[day - 1])
+        values[day] = (values[day - 1] + flows[day]) * (1 + returns[day])
+    return pd.DataFrame(values, index=dates), pd.DataFrame(flows, index=dates)
+
+
+def one_at_a_time(values, flows):
+    # each portfolio on its own with pandas, and XIRR by scalar Newton steps
+    years = (values.index - values.index[0]).days.to_numpy() / 365.25
+    results = []
+    for portfolio in values.columns:
+        value = values[portfolio]
+        flow = flows[portfolio]
+        returns = (value / (value.shift() + flow) - 1).fillna(0)
+        growth = (1 + returns).cumprod()
+        cash = -flow.to_numpy().copy()
+        cash[0] = -value.iloc[0]
+        cash[-1] += value.iloc[-1]
+        rate = 0.1
+        for _ in range(50):
+            discounted = cash * (1 + rate) ** -years
+            step = discounted.sum() / (
+                -(discounted * years).sum() / (1 + rate))
+            rate -= step
+            if abs(step) <= 1e-10 * (1 + abs(rate)):
+                break
+        results.append({
+            'twr': growth.iloc[-1] - 1,
+            'xirr': rate,
+            'max_drawdown': (growth / growth.cummax() - 1).min(),
+            'volatility': returns.iloc[1:].std() * np.sqrt(365)
+        })
+    return pd.DataFrame(results, index=values.columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='TWR, XIRR, drawdown and volatility of many portfolios')
+    parser.add_argument('--portfolios', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--flows-per-year', type=float, default=4)
+    parser.add_argument('--sample', type=int, default=100,
+                        help='portfolios timed one at a time')
+    args = parser.parse_args()
+
+    values, flows = synthetic_portfolios(
+        args.portfolios, args.years, args.flows_per_year)
+    started = time.perf_counter()
+    summary = Performance(values, flows).summary()
+    batched = time.perf_counter() - started
+
+    sample = values.columns[:args.sample]
+    started = time.perf_counter()
+    expected = one_at_a_time(values[sample], flows[sample])
+    looped = (time.perf_counter() - started) * args.portfolios / len(sample)
+    for column in expected.columns:
+        np.testing.assert_allclose(
+            summary.loc[sample, column], expected[column], rtol=1e-6)
+
+    print('{} portfolios x {} days'.format(args.portfolios, len(values)))
+    print('{:<28} {:>9.2f}s'.format('batched', batched))
+    print('{:<28} {:>9.2f}s'.format(
+        'one at a time (from {})'.format(len(sample)), looped))
+    print('{:<28} {:>9.1f}x'.format('speedup', looped / batched))
+    print('unsolved XIRR: {}'.format(int(summary['xirr'].isnull().sum())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from offline import use_stub_server, clients
+from prices.backfill import Backfill, backfill_tasks, date_chunks
+from prices.clients.cache_client import CacheClient
+from prices.clients.sqlite_storage import SqliteStorage
+from stub_servers import StubServer
+
+
+def point_at_stub(url, port):
+    # runs in each backfill worker process
+    use_stub_server(SimpleNamespace(url=url, port=port))
+
+
+def crawl(symbols, start, end, chunk_days):
+    # what filling the cache took before: one range at a time, each written
+    # as it's fetched
+    for symbol in symbols:
+        for chunk_start, chunk_end in date_chunks(start, end, chunk_days):
+            clients.ClientProxy.get_asset_price_history(
+                symbol, chunk_start, chunk_end)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Filling the cache for a symbol universe')
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--chunk-days', type=int, default=365)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    symbols = ['SYM{}'.format(i) for i in range(args.symbols)]
+    start = datetime(2016 - args.years, 1, 1)
+    end = datetime(2015, 12, 31)
+    tasks = len(backfill_tasks(symbols, [], start, end, args.chunk_days))
+    print('{:>22} {:>9} {:>10} {:>8} {:>10}'.format(
+        'run', 'seconds', 'requests', 'tasks', 'rows'))
+    with StubServer(latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        use_stub_server(server)
+        runs = [
+            ['sequential crawl', None, symbols, 1],
+            ['backfill, 1 process', 'one', symbols, 1],
+            ['backfill, {} processes'.format(args.workers), 'many', symbols,
+             args.workers],
+            # interrupted half way: the first half of the universe is in the
+            # checkpoint, so resuming only fetches the second half
+            ['interrupted', 'resumed', symbols[:len(symbols) // 2],
+             args.workers],
+            ['resumed', 'resumed', symbols, args.workers],
+        ]
+        for name, checkpoint, run_symbols, workers in runs:
+            path = os.path.join(directory, (checkpoint or 'crawl'))
+            storage = SqliteStorage(path + '.sqlite3')
+            clients.ClientProxy.cache_client = CacheClient(storage)
+            server.reset_counts()
+            started = time.perf_counter()
+            if checkpoint is None:
+                crawl(run_symbols, start, end, args.chunk_days)
+                fetched = tasks
+            else:
+                stats = Backfill(
+                    run_symbols, start, end,
+                    checkpoint_path=path + '.checkpoint',
+                    workers=workers, chunk_days=args.chunk_days,
+                    setup=point_at_stub, setup_args=(server.url, server.port)
+                ).run(log=lambda line: None)
+                assert stats['failed'] == 0
+                fetched = stats['done']
+            elapsed = time.perf_counter() - started
+            print('{:>22} {:>9.2f} {:>10} {:>8} {:>10}'.format(
+                name, elapsed, server.requests_served, fetched,
+                len(storage.find_asset_prices(symbols))))
+
+
+if __name__ == '__main__':
+    main()
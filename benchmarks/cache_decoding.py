@@ -0,0 +1,124 @@
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import offline  # noqa: F401 (sets the environment prices needs)
+from prices.clients.cache_client import CacheClient
+from prices.clients.helpers import asset_record_keys, asset_columns_map
+
+
+def dict_asset_prices_data_frame(records, keys=asset_record_keys):
+    # the decoding CacheClient used before, kept as the reference
+    result = pd.DataFrame(list(records), columns=keys)
+    result.rename(columns=asset_columns_map, inplace=True)
+    result.set_index('Date', inplace=True)
+    return result
+
+
+def dict_currency_rates_data_frame(symbol, records):
+    rows = [{
+        'Date': r['date'],
+        symbol: r['rate'] if r['symbols'][1] == symbol else r['inverse']
+    } for r in records]
+    result = pd.DataFrame(rows, columns=['Date', symbol])
+    result.set_index('Date', inplace=True)
+    return result
+
+
+def cursor(num_rows, num_symbols, seed=0):
+    # yields fresh documents one at a time, as a pymongo cursor does
+    rng = np.random.default_rng(seed)
+    prices = rng.uniform(1, 200, num_rows).tolist()
+    volumes = rng.integers(0, 10 ** 7, num_rows).tolist()
+    start = datetime(1990, 1, 1)
+    per_symbol = num_rows // num_symbols
+    for i in range(num_rows):
+        placeholder = i % 7 >= 5
+        price = None if placeholder else prices[i]
+        yield {
+            'symbol': 'SYM{}'.format(i // per_symbol),
+            'date': start + timedelta(days=i % per_symbol),
+            'open': price, 'high': price, 'low': price, 'close': price,
+            'volume': None if placeholder else volumes[i]
+        }
+
+
+def rate_cursor(num_rows):
+    rng = np.random.default_rng(1)
+    rates = rng.uniform(0.5, 2, num_rows).tolist()
+    start = datetime(1990, 1, 1)
+    for i in range(num_rows):
+        yield {
+            'date': start + timedelta(days=i),
+            'symbols': ['EUR', 'USD'] if i % 3 else ['USD', 'EUR'],
+            'rate': rates[i], 'inverse': 1 / rates[i]
+        }
+
+
+def measure(decode):
+    # timed and traced separately, since tracing slows allocation down
+    started = time.perf_counter()
+    result = decode()
+    elapsed = time.perf_counter() - started
+    del result
+    tracemalloc.start()
+    result = decode()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def check_edge_cases():
+    day = datetime(2000, 1, 3)
+    placeholder = dict([[key, None] for key in asset_record_keys], date=day)
+    whole = dict(placeholder, open=1.5, high=2, low=1, close=1.5, volume=10)
+    for records in [[], [placeholder], [whole], [whole, placeholder]]:
+        pd.testing.assert_frame_equal(
+            dict_asset_prices_data_frame(records),
+            CacheClient.create_asset_prices_data_frame(records))
+    for records in [[], list(rate_cursor(5))]:
+        pd.testing.assert_frame_equal(
+            dict_currency_rates_data_frame('EUR', records),
+            CacheClient.create_currency_rates_data_frame('EUR', records))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Decoding cached price records into frames')
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--symbols', type=int, default=100)
+    args = parser.parse_args()
+
+    check_edge_cases()
+    keys = ['symbol'] + asset_record_keys
+    cases = [
+        ['asset prices', 'dicts',
+         lambda: dict_asset_prices_data_frame(
+             cursor(args.rows, args.symbols), keys)],
+        ['asset prices', 'columnar',
+         lambda: CacheClient.decode_asset_prices(
+             cursor(args.rows, args.symbols), keys)],
+        ['currency rates', 'dicts',
+         lambda: dict_currency_rates_data_frame(
+             'EUR', rate_cursor(args.rows))],
+        ['currency rates', 'columnar',
+         lambda: CacheClient.create_currency_rates_data_frame(
+             'EUR', rate_cursor(args.rows))],
+    ]
+    print('{:>15} {:>9} {:>12} {:>9}'.format(
+        'records', 'decoding', 'rows/s', 'peak MB'))
+    expected = None
+    for name, decoding, decode in cases:
+        result, elapsed, peak = measure(decode)
+        if decoding == 'dicts':
+            expected = result
+        else:
+            pd.testing.assert_frame_equal(expected, result)
+        print('{:>15} {:>9} {:>12.0f} {:>9.0f}'.format(
+            name, decoding, args.rows / elapsed, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
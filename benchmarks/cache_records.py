@@ -0,0 +1,132 @@
+import argparse
+import math
+import time
+from datetime import datetime, date, timedelta
+import numpy as np
+import pandas as pd
+import offline  # noqa: F401 (sets the environment prices needs)
+from prices.calendars import calendars
+from prices.clients.cache_client import CacheClient
+
+
+def per_day_asset_records(source, symbol, price_data, start_date, end_date):
+    # the per day serializer CacheClient used before, kept as the reference
+    today = datetime(date.today().year, date.today().month, date.today().day)
+    if start_date is None:
+        start_date = price_data.index[0]
+    if end_date is None:
+        end_date = price_data.index[-1]
+    if end_date >= today:
+        end_date = today - timedelta(days=1)
+    num_days = (end_date - start_date).days + 1
+
+    def sanitize_float(value):
+        value = float(value)
+        if math.isnan(value):
+            return None
+        return value
+
+    def create_record(row_date):
+        try:
+            row = price_data.loc[row_date]
+            return {
+                'symbol': symbol, 'date': row_date,
+                'open': sanitize_float(row['Open']),
+                'high': sanitize_float(row['High']),
+                'low': sanitize_float(row['Low']),
+                'close': sanitize_float(row['Close']),
+                'volume': int(row['Volume']),
+                '_source': source, '_placeholer': False
+            }
+        except (KeyError, AttributeError):
+            return {
+                'symbol': symbol, 'date': row_date, 'open': None,
+                'high': None, 'low': None, 'close': None, 'volume': None,
+                '_source': source, '_placeholer': True
+            }
+
+    return [create_record(start_date + timedelta(days=i))
+            for i in range(num_days)]
+
+
+def per_day_currency_records(source, base_currency, rate_data):
+    records = []
+    for other_currency, rates in rate_data.items():
+        if base_currency < other_currency:
+            symbols = [base_currency, other_currency]
+            reverse_order = False
+        else:
+            symbols = [other_currency, base_currency]
+            reverse_order = True
+        for exchange_date, rate in rates.items():
+            if not math.isnan(rate):
+                [rate, inverse] = CacheClient.format_rate_and_inverse(rate)
+                if reverse_order:
+                    [rate, inverse] = [inverse, rate]
+                records.append({
+                    'date': exchange_date, 'symbols': symbols,
+                    'rate': rate, 'inverse': inverse,
+                    '_source': source, '_placeholer': False
+                })
+    return records
+
+
+def assert_identical(expected, actual):
+    assert len(expected) == len(actual)
+    for left, right in zip(expected, actual):
+        assert list(left) == list(right), (left, right)
+        for key in left:
+            assert left[key] == right[key] and (
+                type(left[key]) is type(right[key])), (key, left, right)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Cache record serialization of 10 year series')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--currencies', type=int, default=30)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    start_date = datetime(2005, 1, 1)
+    end_date = datetime(2005 + args.years - 1, 12, 31)
+    days = pd.bdate_range(start_date, end_date)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+    close[rng.choice(len(days), len(days) // 50)] = np.nan
+    prices = pd.DataFrame({
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99,
+        'Close': close, 'Volume': rng.integers(0, 10 ** 7, len(days))
+    }, index=days)
+    rates = pd.DataFrame(dict([
+        ['C{:02d}'.format(i), np.exp(rng.normal(0, 2, len(days)))]
+        for i in range(args.currencies)
+    ]), index=days)
+    rates[rates < 0.05] = np.nan
+
+    print('{:>16} {:>10} {:>12} {:>9}'.format(
+        'records', 'per day s', 'vectorized s', 'speedup'))
+    for name, reference, vectorized, arguments in [
+            ['asset prices', per_day_asset_records,
+             # with a placeholder for every day, as the reference does
+             lambda *args: CacheClient.asset_prices_to_cache_records(
+                 *args, calendar=calendars['EVERY_DAY']),
+             ('benchmark', 'SYM', prices, start_date, end_date)],
+            ['currency rates', per_day_currency_records,
+             CacheClient.currency_rates_to_cache_records,
+             ('benchmark', 'C15', rates)]]:
+        reference_seconds, expected = timed(reference, *arguments)
+        vectorized_seconds, actual = timed(vectorized, *arguments)
+        assert_identical(expected, actual)
+        print('{:>16} {:>10.3f} {:>12.3f} {:>8.0f}x'.format(
+            name, reference_seconds, vectorized_seconds,
+            reference_seconds / vectorized_seconds))
+
+
+if __name__ == '__main__':
+    main()
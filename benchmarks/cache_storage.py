@@ -0,0 +1,80 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import offline  # noqa: F401 (sets the environment prices needs)
+from prices.clients.cache_client import CacheClient
+from prices.clients.sqlite_storage import SqliteStorage
+
+
+def price_frames(num_symbols, start_date, end_date, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, end_date)
+    for i in range(num_symbols):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        yield 'SYM{}'.format(i), pd.DataFrame({
+            'Open': close, 'High': close * 1.01, 'Low': close * 0.99,
+            'Close': close, 'Volume': rng.integers(1000, 100000, len(dates))
+        }, index=dates)
+
+
+def measure(name, cache, num_symbols, start_date, end_date):
+    started = time.perf_counter()
+    num_days = 0
+    for symbol, frame in price_frames(num_symbols, start_date, end_date):
+        cache.put_asset_prices('benchmark', symbol, frame, start_date,
+                               end_date)
+        # the frames have a row for every weekday, which covers every day
+        # the symbols' exchange is open
+        num_days += len(frame)
+    write_seconds = time.perf_counter() - started
+
+    symbols = ['SYM{}'.format(i) for i in range(num_symbols)]
+    started = time.perf_counter()
+    num_rows = 0
+    for symbol in symbols:
+        num_rows += len(cache.get_asset_prices(symbol, start_date, end_date))
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frames = cache.get_many_asset_prices(symbols, start_date, end_date)
+    many_seconds = time.perf_counter() - started
+    assert num_rows == num_days
+    assert sum(len(frame) for frame in frames.values()) == num_days
+    print('{:>8} {:>14.0f} {:>14.0f} {:>14.0f}'.format(
+        name, num_days / write_seconds, num_rows / single_seconds,
+        num_rows / many_seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Cache storage backend read and write throughput')
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--mongo-url', default=None,
+                        help='e.g. mongodb://localhost:27017/benchmark')
+    args = parser.parse_args()
+
+    start_date = datetime(2010, 1, 1)
+    end_date = datetime(2010 + args.years - 1, 12, 31)
+    print('{:>8} {:>14} {:>14} {:>14}'.format(
+        'backend', 'writes/s', 'reads/s', 'batch reads/s'))
+    with tempfile.TemporaryDirectory() as directory:
+        storage = SqliteStorage(os.path.join(directory, 'cache.sqlite3'))
+        measure('sqlite', CacheClient(storage), args.symbols, start_date,
+                end_date)
+        storage.close()
+    if args.mongo_url:
+        from pymongo import MongoClient
+        from prices.clients.mongo_storage import MongoStorage
+        db = MongoClient(args.mongo_url).get_default_database()
+        db.asset_prices.drop()
+        measure('mongodb', CacheClient(MongoStorage(db)), args.symbols,
+                start_date, end_date)
+
+
+if __name__ == '__main__':
+    main()
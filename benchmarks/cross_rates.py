@@ -0,0 +1,80 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from offline import clients  # noqa: F401 (sets up config for prices)
+from prices.cross_rates import CrossRates
+
+
+class CountingRates:
+    # Stands in for Prices.fetch_currency_rates, counting the series fetched.
+    # Every pair is consistent with one random walk per currency against the
+    # pivot, as real rates are up to rounding.
+
+    def __init__(self, currencies, start_date, end_date, seed=0):
+        rng = np.random.default_rng(seed)
+        self.dates = pd.bdate_range(start_date, end_date)
+        self.walks = dict([
+            [currency, np.exp(np.cumsum(
+                rng.normal(0, 0.005, len(self.dates)))) * (1 + i)]
+            for i, currency in enumerate(currencies)
+        ])
+        self.walks[currencies[0]] = np.ones(len(self.dates))
+        self.fetches = 0
+
+    def __call__(self, base_currency, other_currency, start_date, end_date):
+        self.fetches += 1
+        return pd.DataFrame(
+            {other_currency: self.walks[other_currency] /
+             self.walks[base_currency]},
+            index=self.dates).loc[start_date:end_date]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='All-pairs exchange rates, pairwise vs triangulated')
+    parser.add_argument('--currencies', type=int, default=30)
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+
+    currencies = ['C{:02d}'.format(i) for i in range(args.currencies)]
+    start = pd.Timestamp('2010-01-01')
+    end = start + pd.DateOffset(years=args.years) - pd.Timedelta(days=1)
+    fetch_rates = CountingRates(currencies, start, end)
+
+    started = time.perf_counter()
+    pairwise = dict([
+        [(base, other), fetch_rates(base, other, start, end)[other]]
+        for base in currencies for other in currencies if base != other
+    ])
+    elapsed = time.perf_counter() - started
+    print('{:<22} {:>5} series fetched, {:.3f}s'.format(
+        'pairwise', fetch_rates.fetches, elapsed))
+
+    fetch_rates.fetches = 0
+    cross_rates = CrossRates(fetch_rates, pivot_currency=currencies[0])
+    started = time.perf_counter()
+    matrix = cross_rates.matrix(currencies, start, end)
+    elapsed = time.perf_counter() - started
+    print('{:<22} {:>5} series fetched, {:.3f}s'.format(
+        'triangulated matrix', fetch_rates.fetches, elapsed))
+
+    worst = max(
+        np.nanmax(np.abs(
+            matrix.rates_from(base, [other])[other].to_numpy() /
+            direct.to_numpy() - 1))
+        for (base, other), direct in pairwise.items())
+    print('largest relative difference to the direct pairs: {:.2e}'.format(
+        worst))
+
+    subset = currencies[1:args.currencies // 2]
+    started = time.perf_counter()
+    for base in subset:
+        cross_rates.rates(base, subset, start + pd.DateOffset(years=1), end)
+    elapsed = time.perf_counter() - started
+    print('{} subset lookups from the kept matrix in {:.3f}s, {}'.format(
+        len(subset), elapsed, cross_rates.stats()))
+
+
+if __name__ == '__main__':
+    main()
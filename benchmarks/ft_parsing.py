@@ -0,0 +1,99 @@
+import argparse
+import json
+import time
+from datetime import datetime
+import pandas as pd
+from dateutil.parser import parse
+from lxml import html
+from offline import use_stub_server, clients
+from prices.clients.ft_client import FtClient
+from prices.clients.helpers import asset_column_names
+from stub_servers import StubServer, ft_rows, synthetic_days
+
+
+def parse_float_cell(cell):
+    try:
+        return float(cell.text.replace(',', ''))
+    except ValueError:
+        return None
+
+
+def row_by_row(html_text):
+    # what FtClient.fetch_history did with a response before
+    history = []
+    for html_row in html.fromstring(html_text).xpath('//tr'):
+        html_cells = html_row.getchildren()
+        history.append({
+            'Date': parse(html_cells[0].getchildren()[0].text),
+            'Open': parse_float_cell(html_cells[1]),
+            'High': parse_float_cell(html_cells[2]),
+            'Low': parse_float_cell(html_cells[3]),
+            'Close': parse_float_cell(html_cells[4]),
+            'Volume': parse_float_cell(html_cells[5].getchildren()[0])
+        })
+    result = pd.DataFrame(history, columns=asset_column_names)
+    result.set_index('Date', inplace=True)
+    return result
+
+
+def best_of(repeat, parse_history, html_text):
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = parse_history(html_text)
+        seconds.append(time.perf_counter() - started)
+    return min(seconds), result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='FT history parsing throughput and range splitting')
+    parser.add_argument('--capture',
+                        help='a saved get-historical-prices JSON response '
+                             '(default: 20 years in the same format)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--max-rows', type=int, default=300,
+                        help='rows the stub cuts responses short to')
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture) as capture:
+            html_text = json.load(capture)['html']
+    else:
+        html_text = ft_rows(reversed(synthetic_days(
+            'CAPTURED', '1996-01-01', '2015-12-31')))
+    print('{:<14} {:>8} {:>9} {:>12}'.format(
+        'parser', 'rows', 'seconds', 'rows/s'))
+    for name, parse_history in [['row by row', row_by_row],
+                                ['columns', FtClient.parse_history]]:
+        seconds, result = best_of(args.repeat, parse_history, html_text)
+        print('{:<14} {:>8} {:>9.4f} {:>12.0f}'.format(
+            name, len(result), seconds, len(result) / seconds))
+        if name == 'row by row':
+            expected = result
+    pd.testing.assert_frame_equal(expected, result, check_index_type=False)
+
+    start = datetime(2016 - args.years, 1, 1)
+    end = datetime(2015, 12, 31)
+    print('\n{:<14} {:>8} {:>9} {:>9}'.format(
+        'range', 'rows', 'seconds', 'requests'))
+    with StubServer(latency=args.latency,
+                    ft_max_rows=args.max_rows) as server:
+        use_stub_server(server)
+        client = clients.ft_client
+        for name, window_days in [['one request', 100000],
+                                  ['yearly windows', 365],
+                                  ['monthly windows', 31]]:
+            client.window_days = window_days
+            server.reset_counts()
+            started = time.perf_counter()
+            result = client.fetch_history('SYM', start, end)
+            print('{:<14} {:>8} {:>9.2f} {:>9}'.format(
+                name, len(result), time.perf_counter() - started,
+                server.requests_served))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+from offline import use_stub_server, clients
+from prices.clients.rate_limits import ProviderLimit
+from stub_servers import StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='FX history fetching against a local fixer stub')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--rate', type=float, default=50)
+    args = parser.parse_args()
+
+    start = datetime(2015, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+    fixer = clients.fixer_client
+    with StubServer(latency=args.latency) as server:
+        use_stub_server(server)
+        scenarios = [
+            ('sequential, 150ms spacing', 1, ProviderLimit(
+                requests_per_second=1 / 0.15, burst=1), None),
+            ('concurrent, {:g} req/s'.format(args.rate), 8, ProviderLimit(
+                8, requests_per_second=args.rate), None),
+            ('timeseries endpoint', 8, ProviderLimit(8), server.url + (
+                '/fixer/timeseries?start_date={start:%Y-%m-%d}'
+                '&end_date={end:%Y-%m-%d}&base={base}')),
+        ]
+        for name, workers, limit, timeseries_url in scenarios:
+            fixer.max_workers = workers
+            fixer.rate_limit = limit
+            fixer.timeseries_url = timeseries_url
+            started = time.perf_counter()
+            result = fixer.fetch_history('USD', 'GBP', start, end)
+            elapsed = time.perf_counter() - started
+            assert result['GBP'].notnull().all()
+            print('{:<28} {} days in {:.2f}s'.format(name, args.days, elapsed))
+
+
+if __name__ == '__main__':
+    main()
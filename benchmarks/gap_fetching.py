@@ -0,0 +1,64 @@
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from offline import use_stub_server
+import prices
+from stub_servers import StubServer
+
+
+class HoleyCache:
+    # Stands in for CacheClient with a fully cached range except for holes
+
+    def __init__(self, start_date, end_date, num_holes, hole_days, seed=0):
+        dates = pd.date_range(start_date, end_date)
+        rng = np.random.default_rng(seed)
+        holes = rng.choice(len(dates) - hole_days, num_holes, replace=False)
+        present = np.ones(len(dates), dtype=bool)
+        for hole in holes:
+            present[hole:hole + hole_days] = False
+        self.frame = pd.DataFrame(
+            {'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': 1.0,
+             'Volume': 1}, index=pd.Index(dates[present], name='Date'))
+
+    def get_asset_prices(self, symbol, start_date=None, end_date=None):
+        return self.frame
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Upstream traffic needed to fill holes in cached prices')
+    parser.add_argument('--holes', type=int, nargs='+',
+                        default=[0, 1, 10, 50])
+    parser.add_argument('--hole-days', type=int, default=3)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    start_date = datetime(2000, 1, 1)
+    end_date = datetime(2000 + args.years - 1, 12, 31)
+    strategies = [
+        ('whole span', float('inf')),
+        ('coalesced', prices.Prices().gap_tolerance_days)
+    ]
+    print('{:>6} {:>12} {:>9} {:>12}'.format(
+        'holes', 'strategy', 'requests', 'bytes'))
+    with StubServer(latency=args.latency) as server:
+        use_stub_server(server)
+        for num_holes in args.holes:
+            prices.cache_client = HoleyCache(
+                start_date, end_date, num_holes, args.hole_days)
+            for name, tolerance in strategies:
+                fetcher = prices.Prices()
+                fetcher.gap_tolerance_days = tolerance
+                server.reset_counts()
+                result = fetcher.fetch_asset_prices(
+                    'SYM', start_date, end_date)
+                assert not result.index.duplicated().any()
+                print('{:>6} {:>12} {:>9} {:>12}'.format(
+                    num_holes, name, server.requests_served,
+                    server.bytes_served))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import time
+import pandas as pd
+from ledgers import synthetic_ledger
+from updates import Updates
+from columnar_updates import ColumnarUpdates
+from incremental_updates import IncrementalUpdates
+
+
+def time_build(updates_class, transactions):
+    started = time.perf_counter()
+    result = updates_class(transactions)
+    return result, time.perf_counter() - started
+
+
+def assert_same_updates(expected, actual):
+    assert list(expected.updates) == list(actual.updates)
+    for symbol, asset_updates in expected.updates.items():
+        assert asset_updates['asset_currency'] == \
+            actual.updates[symbol]['asset_currency']
+        pd.testing.assert_frame_equal(
+            asset_updates['updates'], actual.updates[symbol]['updates'])
+
+
+def time_incremental_append(transactions, num_new=10):
+    updates = IncrementalUpdates(transactions.iloc[:-num_new])
+    started = time.perf_counter()
+    updates.append(transactions.iloc[-num_new:])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare Updates with ColumnarUpdates')
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument(
+        '--skip-iterrows-above', type=int, default=None,
+        help='only time the columnar engine above this many rows')
+    args = parser.parse_args()
+
+    print('{:>10} {:>12} {:>12} {:>8}'.format(
+        'rows', 'iterrows s', 'columnar s', 'speedup'))
+    for size in args.sizes:
+        transactions = synthetic_ledger(size)
+        print('{:>10} incremental append of 10 rows: {:.4f}s'.format(
+            size, time_incremental_append(transactions)))
+        columnar, columnar_time = time_build(ColumnarUpdates, transactions)
+        if args.skip_iterrows_above is not None and \
+                size > args.skip_iterrows_above:
+            print('{:>10} {:>12} {:>12.3f} {:>8}'.format(
+                size, '-', columnar_time, '-'))
+            continue
+        reference, reference_time = time_build(Updates, transactions)
+        assert_same_updates(reference, columnar)
+        print('{:>10} {:>12.3f} {:>12.3f} {:>7.1f}x'.format(
+            size, reference_time, columnar_time,
+            reference_time / columnar_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import urllib3
+from offline import clients  # noqa: F401 (sets up paths and config)
+from prices.clients.http_sessions import PooledSession
+from stub_servers import StubServer
+
+
+def run(get, url, num_requests, workers):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(
+            lambda _: get(url, verify=False).json(), range(num_requests)))
+    return num_requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Requests per second with and without pooled sessions')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+    warnings.simplefilter('ignore', urllib3.exceptions.InsecureRequestWarning)
+
+    with StubServer(latency=0, tls=True) as server:
+        url = server.url + (
+            '/v1/markets/history?symbol=ABC&start=2016-01-04&end=2016-01-08')
+        print('{:>8} {:>16} {:>16}'.format(
+            'workers', 'requests.get/s', 'pooled/s'))
+        for workers in args.workers:
+            session = PooledSession(pool_size=workers)
+            print('{:>8} {:>16.1f} {:>16.1f}'.format(
+                workers,
+                run(requests.get, url, args.requests, workers),
+                run(session.get, url, args.requests, workers)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+import subprocess
+import sys
+from os import path
+
+default_src = path.abspath(path.join(path.dirname(__file__), '..', 'src'))
+heavy_packages = ['quandl', 'lxml', 'pymongo', 'requests']
+scenarios = [
+    ['import transactions', 'import transactions'],
+    ['import prices', 'import prices'],
+    ['import prices.clients', 'import prices.clients'],
+    ['first fixer use', 'import prices.clients as c; c.fixer_client.timeout'],
+]
+
+
+def environment(src):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([path.join(src, 'transactions'), src])
+    # config resolves these; nothing connects to them
+    for name in ['MONGODB_HOST', 'MONGODB_PORT', 'MONGODB_USERNAME',
+                 'MONGODB_PASSWORD', 'MONGODB_DATABASE', 'QUANDL_API_KEY',
+                 'TRADIER_ACCESS_TOKEN']:
+        env.setdefault(name, '27017' if name == 'MONGODB_PORT' else 'x')
+    return env
+
+
+def import_time(src, code):
+    # total microseconds of the top level imports and the heavy packages
+    # among them, from python -X importtime
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=environment(src), capture_output=True, text=True, check=True)
+    total = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            total += int(cumulative)
+        if name.strip() in heavy_packages:
+            imported.add(name.strip())
+    return total, sorted(imported)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Startup import time, python -X importtime')
+    parser.add_argument('--src', default=default_src,
+                        help='src directory of the checkout to measure')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('{:<22} {:>8}  {}'.format('scenario', 'ms', 'heavy packages'))
+    for name, code in scenarios:
+        runs = [import_time(args.src, code) for _ in range(args.repeat)]
+        print('{:<22} {:>8.0f}  {}'.format(
+            name, min(total for total, _ in runs) / 1000,
+            ', '.join(runs[0][1]) or '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import pandas as pd
+from os import path
+from ledgers import synthetic_ledger
+from transactions import Transactions
+
+
+def write_ledger(ledger_path, num_rows, chunk_rows=200000, json_lines=False):
+    with open(ledger_path, 'w') as ledger_file:
+        if not json_lines:
+            ledger_file.write('[')
+        written = 0
+        while written < num_rows:
+            size = min(chunk_rows, num_rows - written)
+            start = pd.Timestamp('2000-01-01') + pd.Timedelta(minutes=written)
+            records = synthetic_ledger(
+                size, seed=written, start=start
+            ).to_json(orient='records', lines=json_lines)
+            if json_lines:
+                ledger_file.write(records.rstrip('\n') + '\n')
+            else:
+                ledger_file.write(('' if written == 0 else ',') +
+                                  records[1:-1])
+            written += size
+        if not json_lines:
+            ledger_file.write(']')
+
+
+def load(mode, ledger_path):
+    transactions = Transactions()
+    started = time.perf_counter()
+    if mode.startswith('json'):
+        with open(ledger_path) as ledger_file:
+            transactions.transactions = \
+                transactions.create_transactions_frame(json.load(ledger_file))
+    elif mode.startswith('streaming-load'):
+        transactions.load_file(ledger_path)
+    if mode.endswith('+updates'):
+        transactions.compute_updates()
+    if mode == 'streaming-incremental':
+        transactions.load_file(ledger_path, incremental=True)
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'mode': mode, 'seconds': elapsed, 'peak_mb': peak_mb}))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Peak memory and wall time of ledger loading')
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--path', default='/tmp/benchmark_ledger.json')
+    parser.add_argument('--lines', action='store_true')
+    parser.add_argument('--modes', nargs='+', default=[
+        'json-load', 'streaming-load', 'json-load+updates',
+        'streaming-load+updates', 'streaming-incremental'])
+    parser.add_argument('--load', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load:
+        return load(args.load, args.path)
+
+    if not path.exists(args.path):
+        write_ledger(args.path, args.rows, json_lines=args.lines)
+    print('ledger: {} ({:.2f} GB)'.format(
+        args.path, path.getsize(args.path) / 1e9))
+    for mode in args.modes:
+        # each loader runs in a fresh process so peak RSS is its own
+        subprocess.run([sys.executable, __file__, '--path', args.path,
+                        '--load', mode], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import sys
+from os import path
+import numpy as np
+import pandas as pd
+
+src_path = path.abspath(path.join(path.dirname(__file__), '..', 'src'))
+for import_path in [path.join(src_path, 'transactions'), src_path]:
+    if import_path not in sys.path:
+        sys.path.insert(0, import_path)
+
+from transactions import Transactions  # noqa: E402
+
+currencies = ['USD', 'GBP', 'EUR', 'JPY']
+
+
+def synthetic_ledger(num_rows, num_assets=200, seed=0, start='2000-01-01',
+                     freq='min'):
+    # Every currency is deposited up front so that all cash symbols exist
+    # before they are used as a base or fee currency.
+    rng = np.random.default_rng(seed)
+    num_seed_rows = len(currencies)
+    num_rows = max(num_rows, num_seed_rows)
+    num_random = num_rows - num_seed_rows
+
+    types = rng.choice(
+        ['Purchase', 'Sale', 'Deposit', 'Withdrawal', 'Payment', 'Fee'],
+        size=num_random, p=[0.4, 0.3, 0.1, 0.08, 0.07, 0.05])
+    asset_ids = rng.integers(0, num_assets, size=num_random)
+    asset_currency = np.array(currencies)[asset_ids % len(currencies)]
+    base_currency = rng.choice(currencies, size=num_random)
+    is_cash = np.isin(types, ['Deposit', 'Withdrawal', 'Payment', 'Fee'])
+    assets = np.where(
+        is_cash, base_currency,
+        np.char.add('ASSET', asset_ids.astype(str)))
+    asset_currency = np.where(is_cash, base_currency, asset_currency)
+    has_fee = rng.random(num_random) < 0.3
+
+    dates = pd.date_range(start, periods=num_rows, freq=freq)
+    frame = pd.DataFrame({
+        'Type': np.concatenate([['Deposit'] * num_seed_rows, types]),
+        'Date': dates.strftime('%Y-%m-%d %H:%M'),
+        'Asset': np.concatenate([currencies, assets]),
+        'Quantity': np.concatenate([
+            [1e9] * num_seed_rows,
+            rng.integers(1, 1000, size=num_random).astype(float)]),
+        'Price': np.concatenate([
+            [np.nan] * num_seed_rows,
+            np.where(is_cash, np.nan,
+                     np.round(rng.uniform(1, 500, size=num_random), 2))]),
+        'Price Factor': 1.0,
+        'Asset Currency': np.concatenate([currencies, asset_currency]),
+        'Exchange Rate': np.concatenate([
+            [1.0] * num_seed_rows,
+            np.round(rng.uniform(0.5, 2, size=num_random), 4)]),
+        'Base Currency': np.concatenate([currencies, base_currency]),
+        'Fee': np.concatenate([
+            [0.0] * num_seed_rows,
+            np.where(has_fee, np.round(rng.uniform(1, 20, num_random), 2),
+                     0.0)]),
+        'Fee Currency': np.concatenate([
+            currencies, rng.choice(currencies, size=num_random)]),
+        'Notes': ''
+    }, columns=Transactions.transaction_columns)
+    return frame
@@ -0,0 +1,78 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import offline  # noqa: F401 (sets the environment prices needs)
+import prices
+from prices.clients.cache_client import CacheClient
+from prices.clients.memory_cache import MemoryCacheClient
+
+
+class RoundTripCache:
+    # Stands in for CacheClient over a complete cache, paying a fixed round
+    # trip per query plus the real per record decoding
+
+    def __init__(self, start_date, end_date, latency):
+        self.dates = pd.date_range(start_date, end_date).to_pydatetime()
+        self.latency = latency
+        self.queries = 0
+
+    def _records(self, symbol, start_date, end_date):
+        return [
+            {'symbol': symbol, 'date': day, 'open': 1.0, 'high': 1.0,
+             'low': 1.0, 'close': 1.0, 'volume': 100}
+            for day in self.dates if start_date <= day <= end_date
+        ]
+
+    def get_many_asset_prices(self, symbols, start_date, end_date):
+        self.queries += 1
+        time.sleep(self.latency)
+        return CacheClient.create_asset_prices_data_frames(symbols, [
+            record for symbol in symbols
+            for record in self._records(symbol, start_date, end_date)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Repeated overlapping valuations with the memory tier')
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--portfolios', type=int, default=40)
+    parser.add_argument('--portfolio-size', type=int, default=30)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.005)
+    args = parser.parse_args()
+
+    start_date = pd.Timestamp('2010-01-01').to_pydatetime()
+    end_date = (pd.Timestamp(start_date) + pd.DateOffset(
+        years=args.years) - pd.Timedelta(days=1)).to_pydatetime()
+    rng = np.random.default_rng(0)
+    universe = ['SYM{}'.format(i) for i in range(args.symbols)]
+    requests = []
+    for _ in range(args.portfolios):
+        offset = pd.Timedelta(days=int(rng.integers(0, 365)))
+        requests.append((
+            list(rng.choice(universe, args.portfolio_size, replace=False)),
+            start_date + offset, end_date))
+
+    print('{:>8} {:>9} {:>8} {:>6} {:>7} {:>10}'.format(
+        'tier', 'seconds', 'queries', 'hits', 'misses', 'evictions'))
+    for name in ['none', 'memory']:
+        backing = RoundTripCache(start_date, end_date, args.latency)
+        tier = MemoryCacheClient(backing)
+        prices.cache_client = tier if name == 'memory' else backing
+        fetcher = prices.Prices()
+        started = time.perf_counter()
+        for symbols, first, last in requests * args.rounds:
+            result = fetcher.fetch_many_asset_prices(symbols, first, last)
+            assert not result.empty
+        elapsed = time.perf_counter() - started
+        stats = tier.stats()
+        print('{:>8} {:>9.2f} {:>8} {:>6} {:>7} {:>10}'.format(
+            name, elapsed, backing.queries, stats['hits'], stats['misses'],
+            stats['evictions']))
+
+
+if __name__ == '__main__':
+    main()
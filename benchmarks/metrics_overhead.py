@@ -0,0 +1,105 @@
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+from ledgers import synthetic_ledger, currencies
+from offline import use_stub_server, clients
+import prices
+from columnar_updates import ColumnarUpdates
+from metrics import metrics
+from portfolio import Valuation
+from prices.clients.cache_client import CacheClient
+from prices.clients.sqlite_storage import SqliteStorage
+from stub_servers import StubServer
+
+
+def no_op(name, **labels):
+    pass
+
+
+def call_cost(calls):
+    # nanoseconds per counter increment and per timed block
+    started = time.perf_counter()
+    for _ in range(calls):
+        metrics.count('benchmark_total', kind='asset')
+    counted = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(calls):
+        with metrics.timer('benchmark_seconds', kind='asset'):
+            pass
+    timed = time.perf_counter() - started
+    return 1e9 * counted / calls, 1e9 * timed / calls
+
+
+def value(updates, start, end, path):
+    cache = CacheClient(SqliteStorage(path))
+    clients.ClientProxy.cache_client = cache
+    prices.cache_client = cache
+    started = time.perf_counter()
+    Valuation(updates, prices.Prices(), currencies[0], start, end)
+    return time.perf_counter() - started
+
+
+def breakdown():
+    # seconds by metric and label, from the JSON export
+    rows = []
+    for timer in metrics.snapshot()['timers']:
+        labels = ','.join(
+            '{}={}'.format(name, value)
+            for name, value in timer['labels'].items()
+            if name != 'outcome')
+        rows.append(('{}{{{}}}'.format(timer['name'], labels),
+                     timer['count'], timer['sum']))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Cost of the metrics layer, and what it shows')
+    parser.add_argument('--assets', type=int, default=40)
+    parser.add_argument('--transactions', type=int, default=5000)
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for _ in range(args.calls):
+        no_op('benchmark_total', kind='asset')
+    print('a no-op function call with the same arguments: {:.0f} ns'.format(
+        1e9 * (time.perf_counter() - started) / args.calls))
+    metrics.configure(False)
+    print('disabled: {:.0f} ns per count, {:.0f} ns per timer'.format(
+        *call_cost(args.calls)))
+    metrics.configure(True)
+    print('enabled:  {:.0f} ns per count, {:.0f} ns per timer'.format(
+        *call_cost(args.calls)))
+    metrics.reset()
+
+    start = pd.Timestamp('2015-01-01')
+    end = pd.Timestamp('2015-12-31')
+    transactions = synthetic_ledger(
+        args.transactions, num_assets=args.assets, start=start,
+        freq=(end - start) / args.transactions)
+    transactions['Date'] = pd.to_datetime(transactions['Date'])
+    updates = ColumnarUpdates(transactions)
+
+    print('{:>10} {:>10} {:>10}'.format('metrics', 'cold s', 'warm s'))
+    with StubServer(latency=0) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        use_stub_server(server)
+        for enabled in [False, True]:
+            metrics.configure(enabled)
+            metrics.reset()
+            path = os.path.join(directory, '{}.sqlite3'.format(enabled))
+            cold = value(updates, start, end, path)
+            warm = value(updates, start, end, path)
+            print('{:>10} {:>10.2f} {:>10.2f}'.format(
+                'on' if enabled else 'off', cold, warm))
+        # fetches and writes run concurrently, so their sums overlap
+        print('\nwhere the time went, cold and warm runs together:')
+        for name, count, seconds in breakdown():
+            print('{:<58} {:>6} {:>8.3f}s'.format(name, count, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import logging
+import os
+import ledgers  # noqa: F401 (adds src to sys.path)
+
+# config resolves these when prices is imported; nothing connects to them
+for name, value in [
+        ('MONGODB_HOST', 'localhost'), ('MONGODB_PORT', '27017'),
+        ('MONGODB_USERNAME', 'benchmark'), ('MONGODB_PASSWORD', 'benchmark'),
+        ('MONGODB_DATABASE', 'benchmark'), ('QUANDL_API_KEY', 'benchmark'),
+        ('TRADIER_ACCESS_TOKEN', 'benchmark')]:
+    os.environ.setdefault(name, value)
+
+import quandl  # noqa: E402
+import prices  # noqa: E402
+from prices import clients  # noqa: E402
+from prices.clients.rate_limits import ProviderLimit  # noqa: E402
+from prices.clients.provider_health import ProviderHealth  # noqa: E402
+
+# the stub's unavailable providers fail every fetch, and each failure is
+# logged as a warning; the benchmarks expect them
+logging.getLogger('portfolio_tracker.prices.clients').setLevel(logging.ERROR)
+
+
+class DiscardingCache:
+    # Stands in for CacheClient when only upstream fetching is measured
+
+    def put_asset_prices(self, *args):
+        pass
+
+    def put_many_asset_prices(self, *args):
+        pass
+
+    def put_currency_rates(self, *args):
+        pass
+
+    def put_many_currency_rates(self, *args):
+        pass
+
+    def flush(self):
+        pass
+
+
+def use_stub_server(server, limits=None):
+    # point every provider client at the local stub server
+    limits = limits or {}
+    quandl.ApiConfig.api_base = server.url + '/quandl'
+    # an unavailable provider answers 503 at once; quandl would retry that
+    # with backoff
+    quandl.ApiConfig.use_retries = False
+    clients.tradier_client.host = '127.0.0.1'
+    clients.tradier_client.port = server.port
+    clients.tradier_client.secure = False
+    clients.ft_client.query_url = server.url + (
+        '/data/equities/ajax/get-historical-prices'
+        '?startDate={start_date}&endDate={end_date}&symbol={symbol}')
+    clients.fixer_client.query_url = server.url + '/fixer/{date}?base={base}'
+    clients.fixer_client.rate_limit = limits.get('fixer', ProviderLimit())
+    # the ft client limits each of its requests itself
+    clients.ft_client.rate_limit = limits.get('ft', ProviderLimit())
+    clients.ClientProxy.cache_client = DiscardingCache()
+    # fresh provider health that isn't saved between runs
+    clients.ClientProxy.provider_health = ProviderHealth(
+        list(clients.ClientProxy.asset_clients))
+    clients.ClientProxy.provider_limits = dict([
+        [name, limits.get(name, ProviderLimit())]
+        for name in clients.ClientProxy.asset_clients if name != 'ft'
+    ])
+
+
+def use_cache(cache):
+    # the cache client both Prices and ClientProxy read and write through
+    prices.cache_client = cache
+    clients.ClientProxy.cache_client = cache
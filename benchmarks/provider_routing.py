@@ -0,0 +1,73 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from offline import use_stub_server, clients
+from prices.clients.provider_health import ProviderHealth
+from stub_servers import StubServer
+
+
+class FixedOrder:
+    # The routing ClientProxy did before: every client in dict order
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+
+    def route(self, symbol):
+        return self.providers
+
+    def fallback(self, symbol, tried):
+        return []
+
+    def begin_request(self, provider):
+        pass
+
+    def record(self, provider, symbol, succeeded, seconds):
+        pass
+
+    def record_miss(self, provider, symbol, seconds):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Asset fetches with quandl down, by provider routing')
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--failure-latency', type=float, default=0.2,
+                        help='extra seconds the failing provider takes')
+    args = parser.parse_args()
+
+    requests = [
+        ('SYM{}'.format(i), datetime(2016, 1, 1), datetime(2016, 12, 31))
+        for i in range(args.symbols)
+    ]
+    providers = list(clients.ClientProxy.asset_clients)
+    with StubServer(latency=args.latency,
+                    failure_latency=args.failure_latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        use_stub_server(server)
+        path = os.path.join(directory, 'provider_health.json')
+        print('{:>16} {:>9} {:>10}'.format('routing', 'seconds', 'requests'))
+        for name, routing in [
+                ['fixed order', lambda: FixedOrder(providers)],
+                ['health', lambda: ProviderHealth(providers, path)],
+                ['after restart', lambda: ProviderHealth(providers, path)]]:
+            health = routing()
+            clients.ClientProxy.provider_health = health
+            server.reset_counts()
+            started = time.perf_counter()
+            results = clients.ClientProxy.get_many_asset_price_histories(
+                requests, max_workers=args.workers)
+            elapsed = time.perf_counter() - started
+            assert all(result is not None for result in results.values())
+            if isinstance(health, ProviderHealth):
+                health.save()
+            print('{:>16} {:>9.2f} {:>10}'.format(
+                name, elapsed, server.requests_served))
+
+
+if __name__ == '__main__':
+    main()
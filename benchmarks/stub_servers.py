@@ -0,0 +1,203 @@
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+
+def synthetic_days(symbol, start, end):
+    start = datetime.strptime(start[:10], '%Y-%m-%d')
+    end = datetime.strptime(end[:10], '%Y-%m-%d')
+    # seeded the same in every process, so responses are reproducible
+    rng = np.random.default_rng(zlib.crc32(symbol.encode('utf-8')))
+    days = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            close = round(float(100 + rng.normal(0, 5)), 2)
+            days.append({
+                'date': day.strftime('%Y-%m-%d'),
+                'open': close, 'high': close + 1, 'low': close - 1,
+                'close': close, 'volume': int(rng.integers(1000, 100000))
+            })
+        day += timedelta(days=1)
+    return days
+
+
+def quandl_response(path, query):
+    # /datasets/WIKI/<symbol>/data, in the shape of the WIKI prices database
+    symbol = path.split('/')[-2]
+    days = synthetic_days(symbol, query['start_date'][0],
+                          query['end_date'][0])
+    return {'dataset_data': {
+        'column_names': ['Date', 'Open', 'High', 'Low', 'Close', 'Volume',
+                         'Ex-Dividend', 'Split Ratio'],
+        'data': [
+            [day['date'], day['open'], day['high'], day['low'],
+             day['close'], day['volume'], 0.0, 1.0]
+            for day in days],
+        'start_date': query['start_date'][0],
+        'end_date': query['end_date'][0],
+        'frequency': 'daily', 'limit': None, 'transform': None,
+        'column_index': None, 'collapse': None, 'order': None
+    }}
+
+
+def tradier_response(query):
+    days = synthetic_days(query['symbol'][0], query['start'][0],
+                          query['end'][0])
+    return {'history': {'day': days} if days else None}
+
+
+def ft_rows(days):
+    # as on markets.ft.com: long and short forms of the date and volume,
+    # one of each shown depending on the screen width
+    return ''.join(
+        '<tr><td class="mod-ui-table__cell--text">'
+        '<span class="mod-ui-hide-small-below">{date:%A, %B %d, %Y}</span>'
+        '<span class="mod-ui-hide-medium-above">{date:%a, %b %d, %Y}</span>'
+        '</td><td>{open:.2f}</td><td>{high:.2f}</td><td>{low:.2f}</td>'
+        '<td>{close:.2f}</td><td>'
+        '<span class="mod-ui-hide-small-below">{volume:,}</span>'
+        '<span class="mod-ui-hide-medium-above">{short_volume:.2f}k</span>'
+        '</td></tr>'.format(**dict(
+            day, date=datetime.strptime(day['date'], '%Y-%m-%d'),
+            short_volume=day['volume'] / 1000))
+        for day in days)
+
+
+def ft_response(query, max_rows=None):
+    days = synthetic_days(query['symbol'][0], query['startDate'][0],
+                          query['endDate'][0])
+    # most recent first, like the real endpoint, which also cuts long
+    # ranges short
+    return {'html': ft_rows(list(reversed(days))[:max_rows])}
+
+
+def fixer_timeseries_response(query):
+    start = datetime.strptime(query['start_date'][0], '%Y-%m-%d')
+    end = datetime.strptime(query['end_date'][0], '%Y-%m-%d')
+    rates = {}
+    day = start
+    while day <= end:
+        path = '/' + day.strftime('%Y-%m-%d')
+        rates[path[1:]] = fixer_response(path, query)['rates']
+        day += timedelta(days=1)
+    return {'base': query.get('base', ['EUR'])[0], 'rates': rates}
+
+
+def fixer_response(path, query):
+    base = query.get('base', ['EUR'])[0]
+    rng = np.random.default_rng(zlib.crc32(path.encode('utf-8')))
+    rates = dict([
+        [currency, round(float(rng.uniform(0.5, 2)), 5)]
+        for currency in ['USD', 'GBP', 'EUR', 'JPY', 'CHF'] if currency != base
+    ])
+    return {'base': base, 'date': path.strip('/'), 'rates': rates}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Serves synthetic responses in the shape of each upstream provider.
+    # Unless the server is created with quandl=True, quandl requests fail,
+    # so the asset fallback order is exercised.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path.startswith('/v1/markets/history'):
+            body = tradier_response(query)
+        elif url.path.startswith('/data/equities'):
+            body = ft_response(query, self.server.ft_max_rows)
+        elif url.path.startswith('/fixer/timeseries'):
+            body = fixer_timeseries_response(query)
+        elif url.path.startswith('/fixer/'):
+            body = fixer_response(url.path[len('/fixer'):], query)
+        elif (self.server.quandl and
+                url.path.startswith('/quandl/datasets/')):
+            body = quandl_response(url.path, query)
+        else:
+            # an unavailable provider, possibly one that is slow to fail
+            time.sleep(self.server.failure_latency)
+            self.send_error(503)
+            self.server.record(0)
+            return
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.record(len(payload))
+
+    def log_message(self, *args):
+        pass
+
+
+def self_signed_context(directory):
+    cert = os.path.join(directory, 'stub.pem')
+    key = os.path.join(directory, 'stub.key')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+        '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=127.0.0.1'
+    ], check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class StubServer:
+    def __init__(self, latency=0.02, tls=False, failure_latency=0,
+                 quandl=False, ft_max_rows=None):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.server.failure_latency = failure_latency
+        self.server.quandl = quandl
+        self.server.ft_max_rows = ft_max_rows
+        self.scheme = 'http'
+        if tls:
+            with tempfile.TemporaryDirectory() as directory:
+                context = self_signed_context(directory)
+            self.server.socket = context.wrap_socket(
+                self.server.socket, server_side=True)
+            self.scheme = 'https'
+        self.server.record = self.record
+        self.lock = threading.Lock()
+        self.reset_counts()
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    def record(self, num_bytes):
+        with self.lock:
+            self.requests_served += 1
+            self.bytes_served += num_bytes
+
+    def reset_counts(self):
+        self.requests_served = 0
+        self.bytes_served = 0
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def url(self):
+        return '{}://127.0.0.1:{}'.format(self.scheme, self.port)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from analytics import synthetic_portfolios
+from ledgers import synthetic_ledger, currencies
+from offline import use_stub_server, use_cache, clients
+import prices
+from updates import Updates
+from columnar_updates import ColumnarUpdates
+from incremental_updates import IncrementalUpdates
+from portfolio import Valuation
+from portfolio.analytics import Performance
+from prices.clients.cache_client import CacheClient
+from prices.clients.memory_cache import MemoryCacheClient
+from prices.clients.sqlite_storage import SqliteStorage
+from stub_servers import StubServer
+
+# Every scenario runs offline: the providers are served by the local stub
+# server (synthetic responses in each provider's format) and the cache is
+# SQLite in a temporary directory, standing in for Mongo.
+#
+#   python suite.py --output results.json
+#   python suite.py --compare results.json    # after a change
+#
+# Sizes are fixed per profile so that results files of the same profile
+# can be compared across versions.
+profiles = {
+    'quick': {
+        'symbols': 20, 'years': 1, 'ledger_rows': 100000,
+        'iterrows_rows': 5000, 'valuation_assets': 30,
+        'valuation_years': 2, 'fx_days': 90, 'portfolios': 500,
+        'repeat': 3
+    },
+    'full': {
+        'symbols': 100, 'years': 2, 'ledger_rows': 1000000,
+        'iterrows_rows': 20000, 'valuation_assets': 200,
+        'valuation_years': 5, 'fx_days': 365, 'portfolios': 5000,
+        'repeat': 5
+    }
+}
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class Suite:
+
+    def __init__(self, sizes, server, directory):
+        self.sizes = sizes
+        self.server = server
+        self.directory = directory
+        self.files = 0
+        self.start = datetime(2016 - sizes['years'], 1, 1)
+        self.end = datetime(2015, 12, 31)
+        self.symbols = ['SYM{}'.format(i) for i in range(sizes['symbols'])]
+        self.ledgers = {}
+
+    def measure(self, run, setup=None):
+        # seconds of each repeat of run(setup()), setup not included
+        seconds = []
+        for _ in range(self.sizes['repeat']):
+            state = setup() if setup is not None else None
+            started = time.perf_counter()
+            run(state)
+            seconds.append(time.perf_counter() - started)
+        return seconds
+
+    def sqlite_cache(self):
+        self.files += 1
+        return CacheClient(SqliteStorage(os.path.join(
+            self.directory, 'cache{}.sqlite3'.format(self.files))))
+
+    def ledger(self, rows):
+        if rows not in self.ledgers:
+            transactions = synthetic_ledger(rows)
+            # as produced by Transactions.load_file
+            transactions['Date'] = pd.to_datetime(transactions['Date'])
+            self.ledgers[rows] = transactions
+        return self.ledgers[rows]
+
+    def provider(self, name):
+        # each provider's client on its own, one symbol at a time, so
+        # request, parsing and normalization cost is what's measured
+        client = clients.ClientProxy.asset_clients[name]
+
+        def run(_):
+            for symbol in self.symbols:
+                assert client.fetch_history(
+                    symbol, self.start, self.end) is not None
+        return self.measure(run), len(self.symbols)
+
+    def provider_quandl(self):
+        return self.provider('quandl')
+
+    def provider_tradier(self):
+        return self.provider('tradier')
+
+    def provider_ft(self):
+        return self.provider('ft')
+
+    def provider_fixer(self):
+        days = self.sizes['fx_days']
+
+        def run(_):
+            result = clients.fixer_client.fetch_history(
+                'USD', 'GBP', self.start,
+                self.start + pd.Timedelta(days=days - 1))
+            assert result['GBP'].notnull().all()
+        return self.measure(run), days
+
+    def cold_fetch(self):
+        # an empty cache: routing, upstream fetches and cache writes
+        def setup():
+            use_cache(self.sqlite_cache())
+            return prices.Prices()
+
+        def run(fetcher):
+            fetcher.fetch_many_asset_prices(
+                self.symbols, self.start, self.end)
+        return self.measure(run, setup), len(self.symbols)
+
+    def warm_cache_read(self, cache=None):
+        cache = cache or self.sqlite_cache()
+        use_cache(cache)
+        prices.Prices().fetch_many_asset_prices(
+            self.symbols, self.start, self.end)
+        self.server.reset_counts()
+
+        def run(_):
+            result = prices.Prices().fetch_many_asset_prices(
+                self.symbols, self.start, self.end)
+            assert len(result.columns) == 5 * len(self.symbols)
+        seconds = self.measure(run)
+        assert self.server.requests_served == 0
+        return seconds, len(self.symbols)
+
+    def warm_memory_read(self):
+        return self.warm_cache_read(MemoryCacheClient(self.sqlite_cache()))
+
+    def updates(self, updates_class, rows):
+        transactions = self.ledger(rows)
+        return self.measure(lambda _: updates_class(transactions)), rows
+
+    def updates_columnar(self):
+        return self.updates(ColumnarUpdates, self.sizes['ledger_rows'])
+
+    def updates_incremental(self):
+        return self.updates(IncrementalUpdates, self.sizes['ledger_rows'])
+
+    def updates_iterrows(self):
+        return self.updates(Updates, self.sizes['iterrows_rows'])
+
+    def valuation_updates(self):
+        start = pd.Timestamp(self.end) - pd.DateOffset(
+            years=self.sizes['valuation_years']) + pd.Timedelta(days=1)
+        transactions = synthetic_ledger(
+            20 * self.sizes['valuation_assets'],
+            num_assets=self.sizes['valuation_assets'], start=start,
+            freq=(pd.Timestamp(self.end) - start) / (
+                20 * self.sizes['valuation_assets']))
+        transactions['Date'] = pd.to_datetime(transactions['Date'])
+        return ColumnarUpdates(transactions), start
+
+    def valuation(self, warm):
+        updates, start = self.valuation_updates()
+
+        def value(_):
+            Valuation(updates, prices.Prices(), currencies[0], start,
+                      self.end)
+
+        def setup():
+            use_cache(self.sqlite_cache())
+            if warm:
+                value(None)
+        return self.measure(value, setup), len(updates.updates)
+
+    def valuation_cold(self):
+        return self.valuation(False)
+
+    def valuation_warm(self):
+        return self.valuation(True)
+
+    def performance(self):
+        # returns of many portfolios' ten years of daily values at once
+        values, flows = synthetic_portfolios(self.sizes['portfolios'], 10, 4)
+        return self.measure(lambda _: Performance(values, flows)), len(
+            values.columns)
+
+
+scenarios = [
+    'provider_quandl', 'provider_tradier', 'provider_ft', 'provider_fixer',
+    'cold_fetch', 'warm_cache_read', 'warm_memory_read',
+    'updates_columnar', 'updates_incremental', 'updates_iterrows',
+    'valuation_cold', 'valuation_warm', 'performance',
+]
+
+
+def version():
+    def git(*args):
+        try:
+            return subprocess.run(
+                ['git'] + list(args), cwd=root, capture_output=True,
+                text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(status) if status is not None else None
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def run_suite(profile, names, log):
+    sizes = profiles[profile]
+    results = {}
+    with StubServer(latency=0, quandl=True) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        use_stub_server(server)
+        clients.fixer_client.timeseries_url = None
+        suite = Suite(sizes, server, directory)
+        for name in names:
+            server.reset_counts()
+            seconds, items = getattr(suite, name)()
+            results[name] = {
+                'seconds': seconds,
+                'best': min(seconds),
+                'median': statistics.median(seconds),
+                'items': items,
+                'items_per_second': items / min(seconds),
+                'requests': server.requests_served
+            }
+            log('{:<22} {:>9.3f}s best {:>9.3f}s median {:>12.0f}/s'.format(
+                name, min(seconds), statistics.median(seconds),
+                items / min(seconds)))
+    return {
+        'profile': profile,
+        'sizes': sizes,
+        'version': version(),
+        'environment': environment(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'scenarios': results
+    }
+
+
+def compare(baseline, current, threshold):
+    # best times, current against baseline; returns the regressed scenarios
+    if baseline['profile'] != current['profile']:
+        print('Warning: comparing a {} run against a {} baseline'.format(
+            current['profile'], baseline['profile']))
+    print('\n{:<22} {:>10} {:>10} {:>8}'.format(
+        'scenario', 'baseline', 'current', 'change'))
+    regressions = []
+    for name, result in current['scenarios'].items():
+        if name not in baseline['scenarios']:
+            continue
+        before = baseline['scenarios'][name]['best']
+        change = result['best'] / before - 1
+        flag = ''
+        if change > threshold:
+            flag = ' slower'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = ' faster'
+        print('{:<22} {:>9.3f}s {:>9.3f}s {:>+7.0%}{}'.format(
+            name, before, result['best'], change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Offline end to end benchmarks, saved as JSON')
+    parser.add_argument('--profile', choices=sorted(profiles),
+                        default='quick')
+    parser.add_argument('--scenarios', nargs='+', choices=scenarios,
+                        default=scenarios)
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--compare', help='a results file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='changes within this fraction are noise')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    results = run_suite(args.profile, args.scenarios, print)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(json.load(baseline), results, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
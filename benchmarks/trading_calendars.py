@@ -0,0 +1,66 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+import offline  # noqa: F401 (sets the environment prices needs)
+import prices
+from prices.calendars import calendars
+from prices.clients.cache_client import CacheClient
+from prices.clients.sqlite_storage import SqliteStorage
+from cache_storage import price_frames
+
+
+def fill(storage, num_symbols, start_date, end_date, calendar):
+    for symbol, frame in price_frames(num_symbols, start_date, end_date):
+        # a row dropped by the provider for each exchange holiday
+        frame = frame[calendars['NYSE'].is_open(frame.index)]
+        storage.upsert_asset_prices(
+            CacheClient.asset_prices_to_cache_records(
+                'benchmark', symbol, frame, start_date, end_date, calendar))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Cache size and reads with and without trading calendars')
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    start_date = datetime(2005, 1, 1)
+    end_date = datetime(2005 + args.years - 1, 12, 31)
+    symbols = ['SYM{}'.format(i) for i in range(args.symbols)]
+    fetcher = prices.Prices()
+    # missing ranges found by gap detection over weekdays (as before
+    # calendars) and over NYSE trading days
+    print('{:>18} {:>8} {:>6} {:>7} {:>16} {:>12}'.format(
+        'placeholders', 'records', 'MB', 'read s', 'missing weekdays',
+        'missing NYSE'))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, calendar in [['every day', calendars['EVERY_DAY']],
+                               ['NYSE trading days', calendars['NYSE']]]:
+            path = os.path.join(directory, calendar.name + '.sqlite3')
+            storage = SqliteStorage(path)
+            fill(storage, args.symbols, start_date, end_date, calendar)
+            storage.connection.execute('VACUUM')
+            cache = CacheClient(storage)
+            seconds = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                frames = cache.get_many_asset_prices(
+                    symbols, start_date, end_date)
+                seconds.append(time.perf_counter() - started)
+            num_missing = [
+                sum(len(fetcher.missing_ranges(
+                    frames[symbol], start_date, end_date, calendars[gaps]))
+                    for symbol in symbols)
+                for gaps in ['WEEKDAYS', 'NYSE']]
+            print('{:>18} {:>8} {:>6.1f} {:>7.3f} {:>16} {:>12}'.format(
+                name, sum(len(frame) for frame in frames.values()),
+                os.path.getsize(path) / 1e6, min(seconds), *num_missing))
+            storage.close()
+
+
+if __name__ == '__main__':
+    main()
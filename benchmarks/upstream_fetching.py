@@ -0,0 +1,40 @@
+import argparse
+import time
+from datetime import datetime
+from offline import use_stub_server, clients
+from prices.clients.rate_limits import ProviderLimit
+from stub_servers import StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Concurrent upstream fetch throughput against stubs')
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--tradier-concurrency', type=int, default=16)
+    parser.add_argument('--tradier-rate', type=float, default=None)
+    args = parser.parse_args()
+
+    requests = [
+        ('SYM{}'.format(i), datetime(2016, 1, 1), datetime(2016, 12, 31))
+        for i in range(args.symbols)
+    ]
+    with StubServer(latency=args.latency) as server:
+        use_stub_server(server, {
+            'tradier': ProviderLimit(
+                args.tradier_concurrency, args.tradier_rate)
+        })
+        print('{:>8} {:>10} {:>12}'.format('workers', 'seconds', 'symbols/s'))
+        for workers in args.workers:
+            started = time.perf_counter()
+            results = clients.ClientProxy.get_many_asset_price_histories(
+                requests, max_workers=workers)
+            elapsed = time.perf_counter() - started
+            assert all(result is not None for result in results.values())
+            print('{:>8} {:>10.2f} {:>12.1f}'.format(
+                workers, elapsed, len(requests) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from ledgers import synthetic_ledger, currencies
+from offline import clients  # noqa: F401 (sets up config for prices)
+from columnar_updates import ColumnarUpdates
+from portfolio import Valuation
+from prices.cross_rates import CrossRates
+
+
+class InMemoryPrices:
+    # Stands in for prices.Prices with every series already cached
+
+    def __init__(self, start_date, end_date, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.business_days = pd.bdate_range(start_date, end_date)
+        self.asset_prices = {}
+        self.currency_rates = {}
+        self.cross_rates = CrossRates(self.fetch_currency_rates)
+
+    def _random_walk(self):
+        steps = self.rng.normal(0, 0.01, len(self.business_days))
+        return 100 * np.exp(np.cumsum(steps))
+
+    def fetch_asset_prices(self, symbol, start_date, end_date):
+        if symbol not in self.asset_prices:
+            self.asset_prices[symbol] = pd.DataFrame(
+                {'Close': self._random_walk()}, index=self.business_days)
+        return self.asset_prices[symbol].loc[start_date:end_date]
+
+    def fetch_many_asset_prices(self, symbols, start_date, end_date):
+        return pd.concat(dict([
+            [symbol, self.fetch_asset_prices(symbol, start_date, end_date)]
+            for symbol in symbols
+        ]), axis=1)
+
+    def fetch_currency_rates(
+            self, base_currency, other_currency, start_date, end_date):
+        key = (base_currency, other_currency)
+        if key not in self.currency_rates:
+            self.currency_rates[key] = pd.DataFrame(
+                {other_currency: self._random_walk() / 100},
+                index=self.business_days)
+        return self.currency_rates[key].loc[start_date:end_date]
+
+    def fetch_cross_rates(
+            self, base_currency, currencies, start_date, end_date):
+        return self.cross_rates.rates(
+            base_currency, currencies, start_date, end_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Daily portfolio valuation')
+    parser.add_argument('--assets', type=int, default=500)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--transactions', type=int, default=100000)
+    args = parser.parse_args()
+
+    start = pd.Timestamp('2010-01-01')
+    end = start + pd.DateOffset(years=args.years) - pd.Timedelta(days=1)
+    freq = (end - start) / args.transactions
+    transactions = synthetic_ledger(
+        args.transactions, num_assets=args.assets, start=start, freq=freq)
+    # as produced by Transactions.load_file
+    transactions['Date'] = pd.to_datetime(transactions['Date'])
+    updates = ColumnarUpdates(transactions)
+    prices = InMemoryPrices(start, end)
+    # first run fills the in memory price cache
+    Valuation(updates, prices, currencies[0], start, end)
+
+    started = time.perf_counter()
+    valuation = Valuation(updates, prices, currencies[0], start, end)
+    elapsed = time.perf_counter() - started
+    print('{} days x {} assets valued in {:.3f}s'.format(
+        len(valuation.dates), len(valuation.symbols), elapsed))
+
+
+if __name__ == '__main__':
+    main()
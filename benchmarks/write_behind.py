@@ -0,0 +1,77 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+from offline import use_stub_server, clients
+from prices.clients.cache_client import CacheClient
+from prices.clients.sqlite_storage import SqliteStorage
+from prices.clients.write_behind import WriteBehindStorage
+from stub_servers import StubServer
+
+
+class RemoteStorage:
+    # Adds a fixed round trip to every write of a local storage, standing in
+    # for a cache database on another host
+
+    def __init__(self, storage, latency):
+        self.storage = storage
+        self.latency = latency
+        self.writes = 0
+
+    def upsert_asset_prices(self, records):
+        self.writes += 1
+        time.sleep(self.latency)
+        self.storage.upsert_asset_prices(records)
+
+    def find_asset_prices(self, *args, **kwargs):
+        return self.storage.find_asset_prices(*args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Fetch latency seen by callers with write-behind caching')
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--write-latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    print('{:>14} {:>9} {:>9} {:>9} {:>7}'.format(
+        'storage', 'mean ms', 'p95 ms', 'total s', 'writes'))
+    with StubServer(latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        use_stub_server(server)
+        for name in ['synchronous', 'write-behind']:
+            remote = RemoteStorage(SqliteStorage(
+                os.path.join(directory, name + '.sqlite3')),
+                args.write_latency)
+            storage = remote
+            if name == 'write-behind':
+                storage = WriteBehindStorage(remote)
+            clients.ClientProxy.cache_client = CacheClient(storage)
+            latencies = []
+            started = time.perf_counter()
+            for i in range(args.symbols):
+                call_started = time.perf_counter()
+                result = clients.ClientProxy.get_asset_price_history(
+                    'SYM{}'.format(i), datetime(2016, 1, 1),
+                    datetime(2016, 12, 31))
+                latencies.append(time.perf_counter() - call_started)
+                assert result is not None
+            if name == 'write-behind':
+                storage.close()
+            elapsed = time.perf_counter() - started
+            # the stub has a row for every weekday and no placeholders are
+            # kept for the weekends the exchange is closed
+            assert len(remote.find_asset_prices(
+                ['SYM{}'.format(i) for i in range(args.symbols)])) == (
+                    np.busday_count('2016-01-01', '2017-01-01') *
+                    args.symbols)
+            print('{:>14} {:>9.1f} {:>9.1f} {:>9.2f} {:>7}'.format(
+                name, 1000 * np.mean(latencies),
+                1000 * np.percentile(latencies, 95), elapsed, remote.writes))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,22 @@
+from collections.abc import Mapping
 from os import environ, path
 import json
+import logging
+import threading
 
+logger = logging.getLogger('portfolio_tracker.config')
 env = environ.get('ENV', 'dev')
 config_path = path.abspath(
     path.realpath(__file__ + '/../../configuration/' + env + '.json'))
-raw_config = json.load(open(config_path))
 
 
 def resolve_config(root, path=''):
     if isinstance(root, str) and root[0] == '$':
         value = environ.get(root[1:])
         if value is None:
-            print(
-                'Warning: no environmental variable set for ' +
-                path + ' : ' + root)
+            logger.warning(
+                'No environmental variable set for %s : %s', path, root,
+                extra={'config_path': path, 'variable': root[1:]})
         return [[path, value]]
     if isinstance(root, dict):
         return [
@@ -28,4 +31,30 @@ def resolve_config(root, path=''):
     return [[path, root]]
 
 
-config = dict(resolve_config(raw_config))
+class Config(Mapping):
+    # The flattened configuration, read from config_path and resolved
+    # against the environment the first time a key is looked up
+
+    def __init__(self, config_path):
+        self.config_path = config_path
+        self.values = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.values is None:
+                with open(self.config_path) as config_file:
+                    self.values = dict(resolve_config(json.load(config_file)))
+            return self.values
+
+    def __getitem__(self, key):
+        return (self.values or self.load())[key]
+
+    def __iter__(self):
+        return iter(self.values or self.load())
+
+    def __len__(self):
+        return len(self.values or self.load())
+
+
+config = Config(config_path)
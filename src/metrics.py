@@ -0,0 +1,225 @@
+from bisect import bisect_left
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from config import config
+
+# seconds
+default_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+
+class NullTimer:
+    # What Metrics.timer returns while metrics are disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+null_timer = NullTimer()
+
+
+class Timer:
+    __slots__ = ['metrics', 'name', 'labels', 'started']
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(
+            self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        return {
+            'count': self.count, 'sum': self.total,
+            'min': self.min, 'max': self.max,
+            'mean': self.total / self.count if self.count else None
+        }
+
+
+class LogBackend:
+    # Logs every observation as one JSON object per line: at debug level,
+    # or at info level for timings of at least slow_seconds
+
+    def __init__(self, logger=None, slow_seconds=None):
+        self.logger = logger or logging.getLogger('portfolio_tracker.metrics')
+        self.slow_seconds = slow_seconds
+
+    def record(self, kind, name, value, labels):
+        level = logging.DEBUG
+        if (kind == 'timer' and self.slow_seconds is not None and
+                value >= self.slow_seconds):
+            level = logging.INFO
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, json.dumps(dict(
+                labels, metric=name, type=kind, value=value)))
+
+
+class Metrics:
+    # Counters and timers, each kept per name and set of labels, exported as
+    # JSON or in the Prometheus text format. While disabled every call
+    # returns straight away. Whether it's enabled and which backends get
+    # each observation is read from config on first use, unless configure
+    # is called first.
+
+    def __init__(self, config=None, buckets=default_buckets):
+        self.config = config
+        self.buckets = buckets
+        self.counters = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name not in ['enabled', 'backends']:
+            raise AttributeError(name)
+        self.configure_from(self.config)
+        return self.__dict__[name]
+
+    def configure(self, enabled=True, backends=()):
+        self.backends = list(backends)
+        self.enabled = enabled
+
+    def configure_from(self, config):
+        if config is None or not config.get('metrics.enabled'):
+            return self.configure(False)
+        backends = []
+        if config.get('metrics.log'):
+            backends.append(LogBackend(
+                slow_seconds=config.get('metrics.slow_seconds')))
+        self.configure(True, backends)
+        if config.get('metrics.export_path'):
+            atexit.register(self.export, config.get('metrics.export_path'))
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        for backend in self.backends:
+            backend.record('counter', name, value, labels)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = self.key(name, labels)
+        with self.lock:
+            if key not in self.timers:
+                self.timers[key] = Histogram(self.buckets)
+            self.timers[key].observe(seconds)
+        for backend in self.backends:
+            backend.record('timer', name, seconds, labels)
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return null_timer
+        return Timer(self, name, labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.timers = {}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [
+                    dict(name=name, labels=dict(labels), value=value)
+                    for (name, labels), value in sorted(
+                        self.counters.items())
+                ],
+                'timers': [
+                    dict(histogram.to_dict(), name=name, labels=dict(labels))
+                    for (name, labels), histogram in sorted(
+                        self.timers.items(), key=lambda item: item[0])
+                ]
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    @staticmethod
+    def prometheus_labels(labels, **extra):
+        labels = list(labels) + sorted(extra.items())
+        if not labels:
+            return ''
+        return '{' + ','.join(
+            '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                             .replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in labels) + '}'
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append('# TYPE {} counter'.format(name))
+                    typed.add(name)
+                lines.append('{}{} {}'.format(
+                    name, self.prometheus_labels(labels), value))
+            for (name, labels), histogram in sorted(
+                    self.timers.items(), key=lambda item: item[0]):
+                if name not in typed:
+                    lines.append('# TYPE {} histogram'.format(name))
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(
+                        list(self.buckets) + ['+Inf'],
+                        histogram.bucket_counts):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(
+                        name, self.prometheus_labels(labels, le=bound),
+                        cumulative))
+                lines.append('{}_sum{} {}'.format(
+                    name, self.prometheus_labels(labels), histogram.total))
+                lines.append('{}_count{} {}'.format(
+                    name, self.prometheus_labels(labels), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        # Prometheus text for a .prom file (e.g. for node_exporter's textfile
+        # collector), JSON otherwise; written aside and renamed
+        text = (self.to_prometheus() if path.endswith('.prom')
+                else self.to_json())
+        staging = path + '.tmp'
+        with open(staging, 'w') as export_file:
+            export_file.write(text)
+        os.replace(staging, path)
+
+
+metrics = Metrics(config)
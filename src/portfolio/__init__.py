@@ -0,0 +1,183 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+from metrics import metrics
+
+
+class Valuation:
+    # Values a set of per asset updates (see transactions.Updates) on a daily
+    # calendar: holdings are forward filled from their update dates, prices
+    # and exchange rates are fetched once per asset / currency and every
+    # date x asset matrix is computed with whole array operations.
+    cash_prefix = 'Cash:'
+    price_column = 'Close'
+    # external cash flows, signed as Updates applies them to cash holdings
+    flow_signs = {'Deposit': 1, 'Payment': 1, 'Withdrawal': -1, 'Fee': -1}
+
+    def __init__(self, updates, prices, base_currency,
+                 start_date=None, end_date=None):
+        self.updates = updates.updates
+        self.prices = prices
+        self.base_currency = base_currency
+        self.symbols = list(self.updates)
+        self.is_cash = np.array([
+            symbol.startswith(self.cash_prefix) for symbol in self.symbols],
+            dtype=bool)
+        self.currencies = [
+            symbol[len(self.cash_prefix):] if is_cash
+            else self.updates[symbol]['asset_currency']
+            for symbol, is_cash in zip(self.symbols, self.is_cash)]
+        self.dates = self._calendar(start_date, end_date)
+        with metrics.timer('valuation_seconds', stage='holdings'):
+            self.holdings, self.price_factors = self._holdings_matrices()
+        with metrics.timer('valuation_seconds', stage='prices'):
+            self.asset_prices = self._price_matrix()
+        with metrics.timer('valuation_seconds', stage='exchange_rates'):
+            self.exchange_rates = self._exchange_rate_matrix()
+        with metrics.timer('valuation_seconds', stage='values'):
+            self.values = (
+                self.holdings * self.asset_prices * self.price_factors /
+                self.exchange_rates)
+
+    @staticmethod
+    def _normalize_dates(dates):
+        if not isinstance(dates, pd.DatetimeIndex):
+            dates = pd.DatetimeIndex(pd.to_datetime(dates))
+        return dates.normalize()
+
+    def _day_positions(self, dates):
+        # row of the calendar for each date, by whole days from its start
+        if not isinstance(dates, pd.DatetimeIndex):
+            dates = pd.DatetimeIndex(pd.to_datetime(dates))
+        days = dates.to_numpy().astype('datetime64[D]')
+        return (days - self.dates[0].to_datetime64().astype(
+            'datetime64[D]')).astype('int64')
+
+    def _calendar(self, start_date, end_date):
+        if start_date is None:
+            start_date = min(
+                self._normalize_dates(self.updates[symbol]['updates'].index)
+                .min() for symbol in self.symbols)
+        if end_date is None:
+            end_date = date.today()
+        return pd.date_range(
+            pd.Timestamp(start_date).normalize(),
+            pd.Timestamp(end_date).normalize())
+
+    @staticmethod
+    def _forward_fill(matrix, initial):
+        # fill each NaN from the last value above it in the same column
+        rows = np.where(
+            np.isnan(matrix), 0, np.arange(len(matrix))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        result = matrix[rows, np.arange(matrix.shape[1])]
+        result[np.isnan(result)] = initial
+        return result
+
+    def _holdings_matrices(self):
+        shape = (len(self.dates), len(self.symbols))
+        frames = [self.updates[symbol]['updates'] for symbol in self.symbols]
+        lengths = [len(frame) for frame in frames]
+        if not self.symbols or sum(lengths) == 0:
+            return np.zeros(shape), np.ones(shape)
+        codes = np.repeat(np.arange(len(frames)), lengths)
+        positions = self._day_positions(np.concatenate([
+            frame.index.to_numpy() for frame in frames]))
+        quantities = np.concatenate([
+            frame['Quantity'].to_numpy(dtype=float) for frame in frames])
+        factors = np.concatenate([
+            frame['Price Factor'].to_numpy(dtype=float) for frame in frames])
+
+        # updates before the calendar carry into its first day and updates
+        # after it are dropped; the last update of a day wins
+        order = np.lexsort((np.arange(len(codes)), positions, codes))
+        order = order[positions[order] < shape[0]]
+        cells = np.maximum(positions[order], 0) * shape[1] + codes[order]
+        is_last = np.append(cells[1:] != cells[:-1], True)
+
+        holdings = np.full(shape, np.nan)
+        price_factors = np.full(shape, np.nan)
+        holdings.flat[cells[is_last]] = quantities[order][is_last]
+        price_factors.flat[cells[is_last]] = factors[order][is_last]
+        price_factors[:, self.is_cash] = 1
+        return (self._forward_fill(holdings, 0),
+                self._forward_fill(price_factors, 1))
+
+    def _aligned(self, series):
+        # one column per series, aligned on the calendar and forward filled
+        # over days without a price or rate (weekends, holidays)
+        result = np.full((len(self.dates), len(series)), np.nan)
+        for column, values in enumerate(series):
+            positions = self._day_positions(values.index)
+            found = (positions >= 0) & (positions < len(self.dates))
+            result[positions[found], column] = \
+                values.to_numpy(dtype=float)[found]
+        return self._forward_fill(result, np.nan)
+
+    def _price_matrix(self):
+        start = self.dates[0].to_pydatetime()
+        end = self.dates[-1].to_pydatetime()
+        assets = [
+            symbol for symbol, is_cash in zip(self.symbols, self.is_cash)
+            if not is_cash]
+        asset_prices = self.prices.fetch_many_asset_prices(
+            assets, start, end)
+        series = [
+            asset_prices[(symbol, self.price_column)]
+            for symbol in assets
+        ]
+        result = np.ones((len(self.dates), len(self.symbols)))
+        result[:, ~self.is_cash] = self._aligned(series)
+        return result
+
+    def _exchange_rate_matrix(self):
+        start = self.dates[0].to_pydatetime()
+        end = self.dates[-1].to_pydatetime()
+        currencies = sorted(set(self.currencies) - {self.base_currency})
+        series = []
+        if currencies:
+            # one series per currency, against the pivot currency
+            rates = self.prices.fetch_cross_rates(
+                self.base_currency, currencies, start, end)
+            series = [rates[currency] for currency in currencies]
+        rates = np.hstack([
+            np.ones((len(self.dates), 1)), self._aligned(series)])
+        columns = [
+            0 if currency == self.base_currency
+            else currencies.index(currency) + 1
+            for currency in self.currencies]
+        return rates[:, columns]
+
+    def cash_flows(self, transactions, flow_signs=None):
+        # Net flows into the portfolio on each day of the calendar, in the
+        # base currency, from the cash transactions among transactions
+        # (those the holdings were computed from). Flows before the calendar
+        # are part of its opening value and are left out, as are those after.
+        flow_signs = flow_signs or self.flow_signs
+        signs = transactions['Type'].astype(object).map(flow_signs)
+        flows = transactions[signs.notnull().to_numpy()]
+        signs = signs[signs.notnull()].to_numpy(dtype=float)
+        columns = pd.Index(self.symbols).get_indexer(
+            self.cash_prefix + flows['Asset'].astype(str))
+        positions = self._day_positions(flows['Date'])
+        found = (columns >= 0) & (positions >= 0) & (
+            positions < len(self.dates))
+        amounts = flows['Quantity'].to_numpy(dtype=float)[found] * \
+            signs[found] / self.exchange_rates[
+                positions[found], columns[found]]
+        result = np.zeros(len(self.dates))
+        np.add.at(result, positions[found], amounts)
+        return pd.Series(result, index=self.dates, name=self.base_currency)
+
+    def holdings_frame(self):
+        return pd.DataFrame(
+            self.holdings, index=self.dates, columns=self.symbols)
+
+    def values_frame(self):
+        return pd.DataFrame(
+            self.values, index=self.dates, columns=self.symbols)
+
+    def total(self):
+        return pd.Series(
+            np.nansum(self.values, axis=1), index=self.dates,
+            name=self.base_currency)
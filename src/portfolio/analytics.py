@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+# Returns of many portfolios at once. Each portfolio is a column of a
+# (dates x portfolios) matrix of daily values and of one of the net external
+# cash flows into it (deposits positive, withdrawals negative), in the same
+# currency; see Valuation.total and Valuation.cash_flows. A day's flows
+# arrive at its start, so they earn that day's return, and the first day's
+# value (flows of that day included) is the capital the period starts with.
+
+days_per_year = 365.25
+
+
+def daily_returns(values, flows):
+    # v[t] / (v[t-1] + f[t]) - 1, and 0 on days with nothing invested
+    invested = values[:-1] + flows[1:]
+    growth = np.ones_like(values)
+    np.divide(values[1:], invested, out=growth[1:], where=invested > 0)
+    return growth - 1
+
+
+def drawdowns(growth):
+    # fall of each day's growth from the highest growth before it
+    peaks = np.maximum.accumulate(growth, axis=0)
+    result = np.zeros_like(growth)
+    np.divide(growth, peaks, out=result, where=peaks > 0)
+    return np.where(peaks > 0, result - 1, 0.0)
+
+
+def compress_flows(flows):
+    # the non-zero flows of each portfolio, left aligned and zero padded:
+    # (portfolios x most flows) matrices of amounts and of their day indices
+    portfolios, days = np.nonzero(flows.T)
+    counts = np.bincount(portfolios, minlength=flows.shape[1])
+    slots = np.arange(len(portfolios)) - np.repeat(
+        np.cumsum(counts) - counts, counts)
+    shape = (flows.shape[1], counts.max() if len(portfolios) else 0)
+    amounts = np.zeros(shape)
+    day_indices = np.zeros(shape, dtype='int64')
+    amounts[portfolios, slots] = flows[days, portfolios]
+    day_indices[portfolios, slots] = days
+    return amounts, day_indices
+
+
+def xirr(amounts, years, guess=0.1, tolerance=1e-10, max_iterations=50):
+    # The annual rate at which each row of amounts (paid in negative, paid
+    # out positive), received the given years after the start, has a net
+    # present value of 0. Newton's method for every row at once, iterating
+    # only the rows that haven't converged; NaN where there's no solution
+    # (the amounts are all of one sign) or it didn't converge.
+    amounts = np.asarray(amounts, dtype=float)
+    years = np.broadcast_to(years, amounts.shape)
+    rates = np.full(len(amounts), float(guess))
+    solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+    converged = ~solvable
+    pending = np.flatnonzero(solvable)
+    for _ in range(max_iterations):
+        if len(pending) == 0:
+            break
+        rate = rates[pending]
+        discounted = amounts[pending] * np.exp(
+            -years[pending] * np.log1p(rate)[:, None])
+        value = discounted.sum(axis=1)
+        slope = -(discounted * years[pending]).sum(axis=1) / (1 + rate)
+        step = np.divide(value, slope, out=np.zeros_like(value),
+                         where=slope != 0)
+        updated = rate - step
+        # never at or below -100%: go half way there instead
+        updated = np.where(updated <= -1, (rate - 1) / 2, updated)
+        rates[pending] = updated
+        done = np.abs(updated - rate) <= tolerance * (1 + np.abs(rate))
+        converged[pending[done]] = True
+        pending = pending[~done & np.isfinite(updated)]
+    rates[~(converged & solvable) | ~np.isfinite(rates)] = np.nan
+    return rates
+
+
+class Performance:
+    # Time weighted return (chained daily returns, so flows don't count as
+    # performance), money weighted return (XIRR of the flows and the opening
+    # and closing values), drawdowns of the time weighted growth and the
+    # annualized volatility of daily returns, for every portfolio.
+
+    def __init__(self, values, flows=None, dates=None, periods_per_year=365):
+        if isinstance(values, pd.DataFrame):
+            self.portfolios = list(values.columns)
+            dates = values.index if dates is None else dates
+        else:
+            self.portfolios = list(range(np.shape(values)[1]))
+        self.dates = pd.DatetimeIndex(dates)
+        self.values = np.asarray(values, dtype=float)
+        self.flows = (np.zeros_like(self.values) if flows is None
+                      else np.asarray(flows, dtype=float))
+        self.periods_per_year = periods_per_year
+
+        self.returns = daily_returns(self.values, self.flows)
+        self.growth = np.cumprod(1 + self.returns, axis=0)
+        self.twr = self.growth[-1] - 1
+        self.drawdowns = drawdowns(self.growth)
+        self.max_drawdown = self.drawdowns.min(axis=0)
+        self.volatility = np.full(len(self.portfolios), np.nan)
+        if len(self.values) > 2:
+            self.volatility = self.returns[1:].std(
+                axis=0, ddof=1) * np.sqrt(periods_per_year)
+        self.xirr = xirr(*self.investor_flows())
+
+    @classmethod
+    def from_valuations(self, valuations, transactions, **options):
+        # one portfolio per Valuation, with the cash flows of its
+        # transactions; portfolios are aligned on the union of their dates,
+        # worth nothing before their own and unchanged after them
+        values = pd.concat(
+            [valuation.total() for valuation in valuations], axis=1)
+        flows = pd.concat([
+            valuation.cash_flows(portfolio_transactions)
+            for valuation, portfolio_transactions in zip(
+                valuations, transactions)
+        ], axis=1)
+        values.columns = flows.columns = range(len(valuations))
+        return self(values.ffill().fillna(0), flows.fillna(0), **options)
+
+    def years(self):
+        return (self.dates - self.dates[0]).days.to_numpy() / days_per_year
+
+    def annualized_twr(self):
+        years = self.years()[-1]
+        if years <= 0:
+            return np.full(len(self.portfolios), np.nan)
+        return (1 + self.twr) ** (1 / years) - 1
+
+    def investor_flows(self):
+        # what the investor paid in (negative) and out (positive): the
+        # opening value, every later flow and the closing value
+        cash = -self.flows.copy()
+        cash[0] = -self.values[0]
+        cash[-1] += self.values[-1]
+        amounts, day_indices = compress_flows(cash)
+        return amounts, self.years()[day_indices]
+
+    def summary(self):
+        return pd.DataFrame({
+            'twr': self.twr,
+            'annualized_twr': self.annualized_twr(),
+            'xirr': self.xirr,
+            'max_drawdown': self.max_drawdown,
+            'volatility': self.volatility
+        }, index=pd.Index(self.portfolios, name='portfolio'))
@@ -1,10 +1,28 @@
 from datetime import datetime, date
 from .clients import ClientProxy, cache_client
+from .cross_rates import CrossRates
+from .calendars import calendars, calendar_for_symbol
+import numpy as np
 import pandas as pd
 from config import config
+from metrics import metrics
 
 
 class Prices:
+
+    def __init__(self):
+        # missing runs at most this many days apart are fetched as one range
+        self.gap_tolerance_days = int(
+            config.get('prices.gap_tolerance_days', 7))
+        # currency that cross rates are triangulated through
+        self.pivot_currency = config.get('prices.pivot_currency', 'EUR')
+        self.cross_rates = CrossRates(
+            self.fetch_currency_rates, self.pivot_currency,
+            max_bytes=int(config.get(
+                'prices.cross_rates_max_bytes', 64 << 20)),
+            ttl=float(config.get('memory_cache.ttl_seconds', 300)),
+            recent_days=int(config.get('memory_cache.recent_days', 7)))
+
     def parse_date(self, d):
         if isinstance(d, datetime):
             return d
@@ -15,30 +33,122 @@ class Prices:
     def strip_empty_rows(self, df):
         return df.dropna(how='all')
 
+    def today(self):
+        return datetime(date.today().year,
+                        date.today().month,
+                        date.today().day)
+
+    def missing_ranges(self, from_cache, start_date, end_date, calendar=None):
+        # Splits the trading days missing from the cache into runs of
+        # consecutive trading days, drops runs from today on and merges runs
+        # that are at most gap_tolerance_days apart. Days the calendar knows
+        # the exchange is closed count as present; other holidays are cached
+        # as placeholders, so they never count as missing either.
+        if calendar is None:
+            calendar = calendars['WEEKDAYS']
+        trading_days = calendar.trading_days(start_date, end_date)
+        positions = np.flatnonzero(~trading_days.isin(from_cache.index))
+        if len(positions) == 0:
+            return []
+        missing_dates = trading_days[positions]
+        days = missing_dates.values.astype('datetime64[D]')
+        ordinals = days.astype('int64')
+        starts = np.flatnonzero(np.r_[True, np.diff(positions) > 1])
+        ends = np.r_[starts[1:], len(days)] - 1
+        keep = days[starts] < np.datetime64(self.today(), 'D')
+        starts, ends = starts[keep], ends[keep]
+        if len(starts) == 0:
+            return []
+        merged = np.r_[False, (
+            ordinals[starts[1:]] - ordinals[ends[:-1]] - 1 <=
+            self.gap_tolerance_days)]
+        return [
+            (missing_dates[start].to_pydatetime(),
+             missing_dates[end].to_pydatetime())
+            for start, end in zip(
+                starts[~merged], ends[np.r_[~merged[1:], True]])
+        ]
+
+    @staticmethod
+    def record_lookups(kind, symbols, requests):
+        # a symbol is a cache hit if none of its range had to be fetched
+        if not metrics.enabled:
+            return
+        missed = len(set(request[0] for request in requests))
+        metrics.count('prices_cache_lookups_total', len(symbols) - missed,
+                      kind=kind, result='hit')
+        metrics.count('prices_cache_lookups_total', missed, kind=kind,
+                      result='miss')
+        metrics.count('prices_missing_ranges_total', len(requests),
+                      kind=kind)
+
+    def merge_asset_prices(self, from_cache, fetched):
+        # fetched ranges take precedence over cached rows they overlap
+        fetched = [frame for frame in fetched if frame is not None]
+        if not fetched:
+            return self.strip_empty_rows(from_cache)
+        result = pd.concat(fetched + [self.strip_empty_rows(from_cache)])
+        return result[~result.index.duplicated(keep='first')].sort_index()
+
     def fetch_asset_prices(self, symbol, start_date, end_date=date.today()):
         start_date = self.parse_date(start_date)
         end_date = self.parse_date(end_date)
-        num_days = (end_date - start_date).days + 1
-        required_range = pd.date_range(start_date, periods=num_days)
-
         from_cache = cache_client.get_asset_prices(
             symbol, start_date, end_date)
-        missing_dates = required_range.difference(from_cache.index)
-        today = datetime(date.today().year,
-                         date.today().month,
-                         date.today().day)
+        requests = [
+            (symbol, missing_start, missing_end)
+            for missing_start, missing_end in self.missing_ranges(
+                from_cache, start_date, end_date, calendar_for_symbol(symbol))
+        ]
+        self.record_lookups('asset', [symbol], requests)
+        fetched = ClientProxy.get_many_asset_price_histories(requests)
+        return self.merge_asset_prices(from_cache, fetched.values())
 
-        if missing_dates[missing_dates < today].empty:
-            return self.strip_empty_rows(from_cache)
-
-        missing_start = missing_dates.min()
-        missing_end = missing_dates.max()
-
-        return pd.concat([
-            self.strip_empty_rows(from_cache.loc[:missing_start]),
-            ClientProxy.get_asset_price_history(symbol, start_date, end_date),
-            self.strip_empty_rows(from_cache.loc[missing_end:])
+    def fetch_many_asset_prices(
+            self, symbols, start_date, end_date=date.today()):
+        # One cache query for all symbols and concurrent upstream fetches for
+        # the missing ranges of every symbol. Returns a frame with (symbol,
+        # column) MultiIndex columns.
+        start_date = self.parse_date(start_date)
+        end_date = self.parse_date(end_date)
+        symbols = list(symbols)
+        from_cache = cache_client.get_many_asset_prices(
+            symbols, start_date, end_date)
+        requests = [
+            (symbol, missing_start, missing_end)
+            for symbol in symbols
+            for missing_start, missing_end in self.missing_ranges(
+                from_cache[symbol], start_date, end_date,
+                calendar_for_symbol(symbol))
+        ]
+        self.record_lookups('asset', symbols, requests)
+        fetched = dict([[symbol, []] for symbol in symbols])
+        for request, result in ClientProxy.get_many_asset_price_histories(
+                requests).items():
+            fetched[request[0]].append(result)
+        results = dict([
+            [symbol, self.merge_asset_prices(
+                from_cache[symbol], fetched[symbol])]
+            for symbol in symbols
         ])
+        if not results:
+            return pd.DataFrame(
+                columns=pd.MultiIndex.from_arrays([[], []]))
+        return pd.concat(results, axis=1)
+
+    def triangulated_rates(
+            self, base_currency, other_currency, start_date, end_date):
+        # base_currency to other_currency through the pivot currency, from
+        # cached rates only, on the dates both legs are cached for
+        if self.pivot_currency in [base_currency, other_currency]:
+            return None
+        legs = pd.concat([
+            cache_client.get_currency_rates(
+                self.pivot_currency, currency, start_date, end_date)[currency]
+            for currency in [base_currency, other_currency]
+        ], axis=1).dropna()
+        return (legs[other_currency] / legs[base_currency]).to_frame(
+            other_currency)
 
     def fetch_currency_rates(
             self, base_currency, other_currency, start_date, end_date):
@@ -50,13 +160,27 @@ class Prices:
         from_cache = cache_client.get_currency_rates(
             base_currency, other_currency, start_date, end_date)
         missing_dates = required_range.difference(from_cache.index)
-        today = datetime(date.today().year,
-                         date.today().month,
-                         date.today().day)
 
-        if missing_dates[missing_dates < today].empty:
+        if missing_dates[missing_dates < self.today()].empty:
+            metrics.count('prices_cache_lookups_total', kind='currency',
+                          result='hit')
             return from_cache
 
+        # the pair may not be cached directly but still be derivable
+        triangulated = self.triangulated_rates(
+            base_currency, other_currency, start_date, end_date)
+        if triangulated is not None and not triangulated.empty:
+            from_cache = pd.concat([from_cache, triangulated])
+            from_cache = from_cache[
+                ~from_cache.index.duplicated(keep='first')].sort_index()
+            missing_dates = required_range.difference(from_cache.index)
+            if missing_dates[missing_dates < self.today()].empty:
+                metrics.count('prices_cache_lookups_total', kind='currency',
+                              result='triangulated')
+                return from_cache
+
+        metrics.count('prices_cache_lookups_total', kind='currency',
+                      result='miss')
         skip_dates = required_range.difference(missing_dates)
         results = pd.concat([
             from_cache,
@@ -67,3 +191,15 @@ class Prices:
         results = results[~results.index.duplicated(keep='first')].sort_index()
 
         return results
+
+    def fetch_rate_matrix(self, currencies, start_date, end_date):
+        # see CrossRates; one series per currency against the pivot
+        return self.cross_rates.matrix(
+            currencies, self.parse_date(start_date), self.parse_date(end_date))
+
+    def fetch_cross_rates(
+            self, base_currency, currencies, start_date, end_date):
+        # a frame of the amount of each currency one base_currency buys
+        return self.cross_rates.rates(
+            base_currency, currencies,
+            self.parse_date(start_date), self.parse_date(end_date))
@@ -0,0 +1,295 @@
+import argparse
+import json
+import logging
+import os
+import time
+import multiprocessing
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED)
+from datetime import datetime, date, timedelta
+from . import clients
+from .clients.rate_limits import provider_limit
+from config import config
+
+logger = logging.getLogger('portfolio_tracker.prices.backfill')
+# Fills the price cache for a whole universe of symbols (and the rates of a
+# set of base currencies) over a date range. The work is split into
+# (symbol, date chunk) tasks fetched by a pool of processes, each fetching
+# its tasks on a few threads; the parent writes the results through the
+# cache client in large batches and, once a batch is written, appends its
+# tasks to a checkpoint log, so an interrupted run resumes where it stopped.
+
+
+def date_chunks(start_date, end_date, chunk_days):
+    chunks = []
+    start = start_date
+    while start <= end_date:
+        end = min(end_date, start + timedelta(days=chunk_days - 1))
+        chunks.append((start, end))
+        start = end + timedelta(days=1)
+    return chunks
+
+
+def backfill_tasks(symbols, currencies, start_date, end_date, chunk_days):
+    # nothing is fetched from today on, as with Prices.missing_ranges
+    today = datetime.combine(date.today(), datetime.min.time())
+    end_date = min(end_date, today - timedelta(days=1))
+    chunks = date_chunks(start_date, end_date, chunk_days)
+    return [
+        (kind, name, start, end)
+        for kind, names in [['asset', symbols], ['currency', currencies]]
+        for name in names
+        for start, end in chunks
+    ]
+
+
+def task_key(task):
+    kind, name, start, end = task
+    return '{}:{}:{:%Y-%m-%d}:{:%Y-%m-%d}'.format(kind, name, start, end)
+
+
+class Checkpoint:
+    # Append-only log of finished tasks, one JSON line each, synced to disk
+    # after every batch. A line cut short by a crash is ignored on load.
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        finished = {}
+        try:
+            with open(self.path) as log:
+                for line in log:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    finished[entry['task']] = entry['status']
+        except OSError:
+            pass
+        return finished
+
+    def record(self, entries):
+        if not entries:
+            return
+        with open(self.path, 'a') as log:
+            for key, status in entries:
+                log.write(json.dumps({'task': key, 'status': status}) + '\n')
+            log.flush()
+            os.fsync(log.fileno())
+
+
+def init_worker(processes, setup=None, setup_args=()):
+    # the configured provider limits are for the whole job, so each worker
+    # process gets an equal share of them
+    clients.registry.set('provider_limits', dict([
+        [name, provider_limit(config, name, processes)]
+        for name in ['quandl', 'tradier']
+    ]))
+    clients.fixer_client.rate_limit = provider_limit(
+        config, 'fixer', processes)
+    clients.ft_client.rate_limit = provider_limit(config, 'ft', processes)
+    if setup is not None:
+        setup(*setup_args)
+
+
+def fetch_task(task):
+    kind, name, start, end = task
+    try:
+        if kind == 'asset':
+            source, result = clients.ClientProxy.fetch_asset_price_history(
+                name, start, end)
+        else:
+            source, result = clients.ClientProxy.fetch_currency_price_history(
+                name, [], start, end)
+    except Exception as error:
+        logger.warning(
+            'Backfill of %s failed: %s', task_key(task), error,
+            extra={'task': task_key(task)})
+        source, result = None, None
+    return task, source, result
+
+
+def fetch_tasks(tasks):
+    # runs in a worker process; the fetches themselves wait on the network,
+    # so each process runs several at once
+    with ThreadPoolExecutor(
+            clients.ClientProxy.max_concurrent_fetches) as executor:
+        return list(executor.map(fetch_task, tasks))
+
+
+class Backfill:
+
+    def __init__(self, symbols, start_date, end_date, currencies=(),
+                 checkpoint_path=None, workers=None, chunk_days=None,
+                 tasks_per_job=None, batch_records=None, retry_failed=False,
+                 setup=None, setup_args=()):
+        self.symbols = list(symbols)
+        self.currencies = list(currencies)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.checkpoint = (
+            Checkpoint(checkpoint_path) if checkpoint_path else None)
+        self.workers = int(workers or config.get('backfill.workers', 4))
+        self.chunk_days = int(
+            chunk_days or config.get('backfill.chunk_days', 365))
+        self.tasks_per_job = int(
+            tasks_per_job or config.get('backfill.tasks_per_job', 16))
+        # about this many days of prices are written to the cache at a time
+        self.batch_records = int(
+            batch_records or config.get('backfill.batch_records', 50000))
+        self.retry_failed = retry_failed
+        # called in each worker process after the limits are set up
+        self.setup = setup
+        self.setup_args = setup_args
+        self.batch = []
+        self.currency_batch = []
+        self.batch_entries = []
+        self.stats = {'tasks': 0, 'skipped': 0, 'done': 0, 'failed': 0,
+                      'empty': 0, 'writes': 0}
+
+    def pending_tasks(self):
+        tasks = backfill_tasks(
+            self.symbols, self.currencies, self.start_date, self.end_date,
+            self.chunk_days)
+        finished = self.checkpoint.load() if self.checkpoint else {}
+        pending = [
+            task for task in tasks
+            if finished.get(task_key(task)) not in (
+                ['done'] if self.retry_failed else ['done', 'failed'])
+        ]
+        self.stats['tasks'] = len(tasks)
+        self.stats['skipped'] = len(tasks) - len(pending)
+        return pending
+
+    def jobs(self, tasks):
+        return [
+            tasks[i:i + self.tasks_per_job]
+            for i in range(0, len(tasks), self.tasks_per_job)
+        ]
+
+    def add_result(self, task, source, result):
+        kind, name, start, end = task
+        if result is None:
+            status = 'failed'
+        elif kind == 'asset':
+            self.batch.append((source, name, result, start, end))
+            status = 'done'
+        else:
+            self.currency_batch.append((source, name, result, start, end))
+            status = 'done'
+        if status == 'done' and result.dropna(how='all').empty:
+            self.stats['empty'] += 1
+        self.stats[status] += 1
+        self.batch_entries.append((task_key(task), status))
+
+    def batch_size(self):
+        return sum(
+            (end - start).days + 1
+            for _, _, _, start, end in self.batch + self.currency_batch)
+
+    def write_batch(self):
+        # tasks are only checkpointed once their prices are in the cache
+        cache_client = clients.ClientProxy.cache_client
+        if self.batch:
+            cache_client.put_many_asset_prices(self.batch)
+            self.stats['writes'] += 1
+        if self.currency_batch:
+            cache_client.put_many_currency_rates([
+                (source, name, result)
+                for source, name, result, _, _ in self.currency_batch])
+            self.stats['writes'] += 1
+        cache_client.flush()
+        if self.checkpoint:
+            self.checkpoint.record(self.batch_entries)
+        self.batch = []
+        self.currency_batch = []
+        self.batch_entries = []
+
+    def run(self, log=print):
+        tasks = self.pending_tasks()
+        jobs = self.jobs(tasks)
+        started = time.monotonic()
+        if not jobs:
+            return self.stats
+        # spawned rather than forked, so workers don't inherit the parent's
+        # database connections and background threads
+        with ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+                initargs=(self.workers, self.setup, self.setup_args)
+        ) as executor:
+            # a bounded number of jobs in flight, so results are never held
+            # in memory faster than they are written
+            queued = iter(jobs)
+            running = set()
+            try:
+                while True:
+                    while len(running) < self.workers * 2:
+                        job = next(queued, None)
+                        if job is None:
+                            break
+                        running.add(executor.submit(fetch_tasks, job))
+                    if not running:
+                        break
+                    finished, running = wait(
+                        running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        for task, source, result in future.result():
+                            self.add_result(task, source, result)
+                    if self.batch_size() >= self.batch_records:
+                        self.write_batch()
+                        log(self.progress(len(tasks), started))
+            finally:
+                # whatever was fetched is kept, even if interrupted
+                for future in running:
+                    future.cancel()
+                self.write_batch()
+        log(self.progress(len(tasks), started))
+        return self.stats
+
+    def progress(self, pending, started):
+        finished = self.stats['done'] + self.stats['failed']
+        elapsed = time.monotonic() - started
+        return '{}/{} tasks ({} failed) in {:.0f}s, {:.1f} tasks/s'.format(
+            finished, pending, self.stats['failed'], elapsed,
+            finished / elapsed if elapsed else 0)
+
+
+def read_symbols(path):
+    with open(path) as symbols_file:
+        return [
+            line.strip() for line in symbols_file
+            if line.strip() and not line.startswith('#')
+        ]
+
+
+if __name__ == '__main__':
+    # python -m prices.backfill symbols.txt --start 2010-01-01 fills the
+    # cache for every symbol in symbols.txt, one per line
+    parser = argparse.ArgumentParser(
+        description='Fill the price cache for a list of symbols')
+    parser.add_argument('symbols_file')
+    parser.add_argument('--start', required=True,
+                        type=lambda d: datetime.strptime(d, '%Y-%m-%d'))
+    parser.add_argument('--end', default=None,
+                        type=lambda d: datetime.strptime(d, '%Y-%m-%d'))
+    parser.add_argument('--currencies', nargs='*', default=[],
+                        help='base currencies to fetch the rates of')
+    parser.add_argument('--checkpoint', default='backfill.checkpoint')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--chunk-days', type=int)
+    parser.add_argument('--retry-failed', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig()
+    Backfill(
+        read_symbols(args.symbols_file),
+        args.start,
+        args.end or datetime.combine(date.today(), datetime.min.time()),
+        currencies=args.currencies,
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        chunk_days=args.chunk_days,
+        retry_failed=args.retry_failed
+    ).run()
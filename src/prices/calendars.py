@@ -0,0 +1,154 @@
+import threading
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from dateutil.easter import easter
+from config import config
+
+
+def nearest_weekday(day):
+    # Saturday holidays are observed on the Friday, Sunday ones on the Monday
+    return day + timedelta(days={5: -1, 6: 1}.get(day.weekday(), 0))
+
+
+def sunday_to_monday(day):
+    return day + timedelta(days=1) if day.weekday() == 6 else day
+
+
+def next_monday(day):
+    return day + timedelta(days=(7 - day.weekday()) % 7 * (
+        day.weekday() >= 5))
+
+
+def plus_two_on_weekends(day):
+    # Christmas and Boxing Day falling on a weekend move to Monday / Tuesday
+    return day + timedelta(days=2) if day.weekday() >= 5 else day
+
+
+def fixed(month, day, observance=None):
+    def rule(year):
+        holiday = date(year, month, day)
+        return observance(holiday) if observance else holiday
+    return rule
+
+
+def nth_weekday(month, weekday, n):
+    # the nth weekday (0 is Monday) of the month, counted from its end for a
+    # negative n
+    def rule(year):
+        if n > 0:
+            first = date(year, month, 1)
+            return first + timedelta(
+                days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+        last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return last - timedelta(
+            days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+    return rule
+
+
+def from_easter(days):
+    return lambda year: easter(year) + timedelta(days=days)
+
+
+def holiday(rule, first_year=None, last_year=None, except_years=()):
+    def bounded_rule(year):
+        if (first_year is not None and year < first_year or
+                last_year is not None and year > last_year or
+                year in except_years):
+            return None
+        return rule(year)
+    return bounded_rule
+
+
+class TradingCalendar:
+    # The days an exchange is open: the weekdays of weekmask other than its
+    # holidays, which are generated from rules for every year from
+    # first_year to last_year on first use, and its one-off closures
+    first_year = 1970
+    last_year = 2099
+
+    def __init__(self, name, holiday_rules=(), special_closures=(),
+                 weekmask='1111100'):
+        self.name = name
+        self.holiday_rules = list(holiday_rules)
+        self.special_closures = list(special_closures)
+        self.weekmask = weekmask
+        self.busdaycalendar = None
+        self.lock = threading.Lock()
+
+    def holidays(self):
+        days = [
+            rule(year) for year in range(self.first_year, self.last_year + 1)
+            for rule in self.holiday_rules
+        ] + [date.fromisoformat(day) for day in self.special_closures]
+        return np.array(
+            sorted(set(day for day in days if day is not None)),
+            dtype='datetime64[D]')
+
+    def _busdaycalendar(self):
+        with self.lock:
+            if self.busdaycalendar is None:
+                self.busdaycalendar = np.busdaycalendar(
+                    weekmask=self.weekmask, holidays=self.holidays())
+            return self.busdaycalendar
+
+    def is_open(self, dates):
+        days = pd.DatetimeIndex(dates).to_numpy().astype('datetime64[D]')
+        return np.is_busday(days, busdaycal=self._busdaycalendar())
+
+    def trading_days(self, start_date, end_date):
+        days = pd.date_range(start_date, end_date)
+        return days[self.is_open(days)]
+
+
+calendars = dict([[calendar.name, calendar] for calendar in [
+    TradingCalendar('WEEKDAYS'),
+    TradingCalendar('EVERY_DAY', weekmask='1111111'),
+    TradingCalendar('NYSE', [
+        fixed(1, 1, sunday_to_monday),
+        holiday(nth_weekday(1, 0, 3), first_year=1998),
+        nth_weekday(2, 0, 3),
+        from_easter(-2),
+        nth_weekday(5, 0, -1),
+        holiday(fixed(6, 19, nearest_weekday), first_year=2022),
+        fixed(7, 4, nearest_weekday),
+        nth_weekday(9, 0, 1),
+        nth_weekday(11, 3, 4),
+        fixed(12, 25, nearest_weekday),
+    ], [
+        '1994-04-27', '2001-09-11', '2001-09-12', '2001-09-13',
+        '2001-09-14', '2004-06-11', '2007-01-02', '2012-10-29',
+        '2012-10-30', '2018-12-05', '2025-01-09',
+    ]),
+    TradingCalendar('LSE', [
+        fixed(1, 1, next_monday),
+        from_easter(-2),
+        from_easter(1),
+        holiday(nth_weekday(5, 0, 1), first_year=1978,
+                except_years=(1995, 2020)),
+        holiday(nth_weekday(5, 0, -1), except_years=(2002, 2012, 2022)),
+        nth_weekday(8, 0, -1),
+        fixed(12, 25, plus_two_on_weekends),
+        fixed(12, 26, plus_two_on_weekends),
+    ], [
+        '1995-05-08', '1999-12-31', '2002-06-03', '2002-06-04',
+        '2011-04-29', '2012-06-04', '2012-06-05', '2020-05-08',
+        '2022-06-02', '2022-06-03', '2022-09-19', '2023-05-08',
+    ]),
+]])
+
+# the calendar for the exchange code of FT symbols (e.g. VOD:LSE)
+exchange_calendars = {
+    'NYQ': 'NYSE',
+    'NSQ': 'NYSE',
+    'ASQ': 'NYSE',
+    'LSE': 'LSE',
+}
+
+
+def calendar_for_symbol(symbol):
+    if ':' in symbol:
+        return calendars[exchange_calendars.get(
+            symbol.rsplit(':', 1)[1], 'WEEKDAYS')]
+    # quandl WIKI and tradier symbols are all US listings
+    return calendars[config.get('prices.default_calendar', 'NYSE')]
@@ -1,21 +1,76 @@
-from .cache_db import db
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .cache_db import create_storage
 from .cache_client import CacheClient
+from .memory_cache import MemoryCacheClient
 from .quandl_client import QuandlCleint
 from .tradier_client import TradierClient
 from .ft_client import FtClient
 from .fixer_client import FixerClient
+from .rate_limits import ProviderLimit, provider_limit
+from .http_sessions import create_session
+from .provider_health import ProviderHealth
+from .helpers import ProviderError
+from .registry import Registry
 from config import config
+from metrics import metrics
 
+# Every client (and the cache database connection) is created on first use
+# rather than on import; provider packages such as quandl, lxml and pymongo
+# are only imported then too. Benchmarks and tests can swap one out with
+# registry.set before it's used.
+registry = Registry()
 
-cache_client = CacheClient(db)
-quandl_client = QuandlCleint(api_key=config['quandl.api_key'])
-tradier_client = TradierClient(access_token=config['tradier.access_token'])
-ft_client = FtClient()
-fixer_client = FixerClient()
+
+def create_cache_client():
+    return MemoryCacheClient(
+        CacheClient(create_storage(config)),
+        max_bytes=int(config.get('memory_cache.max_bytes') or 64 << 20),
+        ttl=float(config.get('memory_cache.ttl_seconds') or 300),
+        recent_days=int(config.get('memory_cache.recent_days') or 7))
+
+
+def create_quandl_client():
+    from quandl.connection import Connection
+    return QuandlCleint(
+        api_key=config['quandl.api_key'],
+        session=create_session(config, max_retries=Connection.get_retries()))
+
+
+def create_provider_health():
+    return ProviderHealth(
+        ['quandl', 'tradier', 'ft'],
+        path=config.get('providers.health_path'),
+        failure_threshold=int(config.get('providers.failure_threshold', 5)),
+        reset_seconds=float(config.get('providers.reset_seconds', 300)))
+
+
+cache_client = registry.register('cache_client', create_cache_client)
+quandl_client = registry.register('quandl_client', create_quandl_client)
+tradier_client = registry.register('tradier_client', lambda: TradierClient(
+    access_token=config['tradier.access_token'],
+    session=create_session(config)))
+ft_client = registry.register('ft_client', lambda: FtClient(
+    session=create_session(config),
+    rate_limit=provider_limit(config, 'ft'),
+    window_days=config.get('ft.window_days')))
+fixer_client = registry.register('fixer_client', lambda: FixerClient(
+    rate_limit=provider_limit(config, 'fixer'),
+    session=create_session(config)))
 
 
 class ClientProxy:
     cache_client = cache_client
+    max_concurrent_fetches = 8
+
+    # each provider has its own concurrency and rate limit, shared by all
+    # threads fetching through the proxy; ft isn't limited here as its
+    # client holds its limit around each of the requests a fetch makes
+    provider_limits = registry.register('provider_limits', lambda: dict([
+        [name, provider_limit(config, name)]
+        for name in ['quandl', 'tradier']
+    ]))
+    no_limit = ProviderLimit()
 
     asset_clients = {
         "quandl": quandl_client,
@@ -27,27 +82,121 @@ class ClientProxy:
         "fixer": fixer_client
     }
 
+    # which asset client to try first for each symbol, see ProviderHealth
+    provider_health = registry.register(
+        'provider_health', create_provider_health)
+
+    @staticmethod
+    def record_fetch(client_name, kind, result, seconds, waited=0.0,
+                     outcome='error'):
+        # seconds spent in the client's fetch_history, and before that
+        # waiting on the provider's limits; outcome is that of a fetch
+        # without a result
+        if not metrics.enabled:
+            return
+        metrics.observe(
+            'provider_fetch_seconds', seconds, provider=client_name,
+            kind=kind, outcome=outcome if result is None else 'ok')
+        metrics.observe(
+            'provider_limit_wait_seconds', waited, provider=client_name)
+        if result is not None:
+            metrics.count('provider_fetch_rows_total', len(result),
+                          provider=client_name, kind=kind)
+
     @classmethod
-    def get_asset_price_history(self, symbol, start_date, end_date):
-        for client_name, client in self.asset_clients.items():
-            result = client.fetch_history(symbol, start_date, end_date)
+    def fetch_asset_price_history(self, symbol, start_date, end_date):
+        # tries the asset clients in routing order, then those routing left
+        # out; returns the name of the client that had the prices and the
+        # prices, without caching them
+        routed = self.provider_health.route(symbol)
+        for client_name in routed + self.provider_health.fallback(
+                symbol, routed):
+            result = self.fetch_asset_prices_from(
+                client_name, symbol, start_date, end_date)
             if result is not None:
-                self.cache_client.put_asset_prices(
-                    client_name, symbol, result, start_date, end_date)
-                return result
+                return client_name, result
+        return None, None
 
     @classmethod
-    def get_currency_price_history(
-            self, base_currency, other_currency, start_date, end_date,
+    def fetch_asset_prices_from(self, client_name, symbol, start_date,
+                                end_date):
+        # a client failing to reach its provider counts against the
+        # provider's health, a client without prices for the symbol doesn't
+        client = self.asset_clients[client_name]
+        waiting = time.monotonic()
+        with self.provider_limits.get(client_name, self.no_limit):
+            self.provider_health.begin_request(client_name)
+            started = time.monotonic()
+            try:
+                result = client.fetch_history(symbol, start_date, end_date)
+                outcome = 'missing'
+            except ProviderError:
+                result = None
+                outcome = 'error'
+            seconds = time.monotonic() - started
+            if result is not None or outcome == 'error':
+                self.provider_health.record(
+                    client_name, symbol, result is not None, seconds)
+            else:
+                self.provider_health.record_miss(
+                    client_name, symbol, seconds)
+        self.record_fetch(client_name, 'asset', result, seconds,
+                          started - waiting, outcome)
+        return result
+
+    @classmethod
+    def get_asset_price_history(self, symbol, start_date, end_date):
+        client_name, result = self.fetch_asset_price_history(
+            symbol, start_date, end_date)
+        if result is not None:
+            self.cache_client.put_asset_prices(
+                client_name, symbol, result, start_date, end_date)
+        return result
+
+    @classmethod
+    def get_many_asset_price_histories(self, requests, max_workers=None):
+        # requests is a list of (symbol, start_date, end_date), fetched
+        # concurrently, each still trying the asset clients in order;
+        # returns the results keyed by request
+        if not requests:
+            return {}
+        if max_workers is None:
+            max_workers = self.max_concurrent_fetches
+        with ThreadPoolExecutor(
+                min(max_workers, len(requests))) as executor:
+            results = executor.map(
+                lambda request: self.get_asset_price_history(*request),
+                requests)
+            return dict(zip(requests, results))
+
+    @classmethod
+    def fetch_currency_price_history(
+            self, base_currency, other_currencies, start_date, end_date,
             skip_dates=None):
+        # the rates of every currency the client has against base_currency
+        # (other_currencies first), without caching them
         for client_name, client in self.currency_clients.items():
+            started = time.monotonic()
             result = client.fetch_history(
                 base_currency,
-                other_currency,
+                other_currencies,
                 start_date,
                 end_date,
                 skip_dates)
+            self.record_fetch(
+                client_name, 'currency', result,
+                time.monotonic() - started)
             if result is not None:
-                self.cache_client.put_currency_rates(
-                    client_name, base_currency, result)
-                return result[[other_currency]]
+                return client_name, result
+        return None, None
+
+    @classmethod
+    def get_currency_price_history(
+            self, base_currency, other_currency, start_date, end_date,
+            skip_dates=None):
+        client_name, result = self.fetch_currency_price_history(
+            base_currency, other_currency, start_date, end_date, skip_dates)
+        if result is not None:
+            self.cache_client.put_currency_rates(
+                client_name, base_currency, result)
+            return result[[other_currency]]
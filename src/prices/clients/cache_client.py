@@ -1,131 +1,338 @@
-import math
 from datetime import datetime, date, timedelta
+from itertools import islice
+from operator import itemgetter
+import numpy as np
 import pandas as pd
-from pymongo import UpdateOne
 from .helpers import log_client_fetch_error, asset_record_keys, \
     asset_columns_map
+from ..calendars import calendar_for_symbol
+from metrics import metrics
+
+
+def decode_dates(values):
+    return pd.DatetimeIndex(values).to_numpy()
+
+
+def decode_objects(values):
+    result = np.empty(len(values), dtype=object)
+    result[:] = values
+    return result
+
+
+def decode_second_symbols(values):
+    return decode_objects([symbols[1] for symbols in values])
+
+
+def decode_numbers(values):
+    # ints stay ints unless the batch has missing values, which become NaN
+    if None not in values:
+        result = np.array(values)
+        if result.dtype.kind in 'iuf':
+            return result
+    return np.array(values, dtype=float)
+
+
+def finish_column(chunks, num_missing, num_rows):
+    # matches the dtypes pandas infers for a column of Python objects
+    if not chunks:
+        return np.array([], dtype=object)
+    if chunks[0].dtype.kind == 'M':
+        return np.concatenate(chunks).astype(inferred_date_dtype)
+    if chunks[0].dtype.kind in 'iuf' and num_missing == num_rows:
+        return np.full(num_rows, None, dtype=object)
+    return np.concatenate(chunks)
+
+
+inferred_date_dtype = pd.Index([datetime(2000, 1, 1)]).dtype
+asset_record_decoders = {
+    'date': decode_dates,
+    'symbol': decode_objects
+}
 
 
 class CacheClient:
     CURRENCY_SIG_FIG = 5
+    decode_batch_size = 5000
 
-    def __init__(self, db):
-        self.asset_prices = db.asset_prices
-        self.currency_rates = db.currency_rates
+    def __init__(self, storage):
+        self.storage = storage
 
     def put_asset_prices(
             self, source, symbol, price_data, start_date, end_date):
-        records = self.asset_prices_to_cache_records(
-            source, symbol, price_data, start_date, end_date)
-        self.upsert_records(self.asset_prices, records)
+        with metrics.timer('cache_write_seconds', kind='asset'):
+            records = self.asset_prices_to_cache_records(
+                source, symbol, price_data, start_date, end_date)
+            self.storage.upsert_asset_prices(records)
+        self.record_rows('write', 'asset', [price_data], len(records))
+
+    def put_many_asset_prices(self, items):
+        # items of (source, symbol, price_data, start_date, end_date), all
+        # written in one upsert
+        with metrics.timer('cache_write_seconds', kind='asset'):
+            records = []
+            for source, symbol, price_data, start_date, end_date in items:
+                records += self.asset_prices_to_cache_records(
+                    source, symbol, price_data, start_date, end_date)
+            self.storage.upsert_asset_prices(records)
+        self.record_rows(
+            'write', 'asset', [item[2] for item in items], len(records))
+
+    def flush(self):
+        # waits for queued writes, if the storage queues them
+        flush = getattr(self.storage, 'flush', None)
+        if flush is not None:
+            flush()
 
     def get_asset_prices(self, symbol, start_date=None, end_date=None):
-        query = {'symbol': symbol}
-        try:
-            if start_date is not None or end_date is not None:
-                query['date'] = {}
-                if start_date is not None:
-                    query['date']['$gte'] = start_date
-                if end_date is not None:
-                    query['date']['$lte'] = end_date
-            return self.create_asset_prices_data_frame(
-                self.asset_prices.find(query, {'_id': 0})
-            )
-        except Exception:
-            log_client_fetch_error('cache', symbol, start_date, end_date)
-            return self.create_asset_prices_data_frame([])
+        with metrics.timer('cache_read_seconds', kind='asset'):
+            try:
+                result = self.create_asset_prices_data_frame(
+                    self.storage.find_asset_prices(
+                        [symbol], start_date, end_date))
+            except Exception:
+                log_client_fetch_error('cache', symbol, start_date, end_date)
+                result = self.create_asset_prices_data_frame([])
+        self.record_rows('read', 'asset', [result])
+        return result
+
+    def get_many_asset_prices(self, symbols, start_date=None, end_date=None):
+        # one query for all symbols, split into a frame per symbol
+        symbols = list(symbols)
+        with metrics.timer('cache_read_seconds', kind='asset'):
+            try:
+                results = self.create_asset_prices_data_frames(
+                    symbols,
+                    self.storage.find_asset_prices(
+                        symbols, start_date, end_date))
+            except Exception:
+                log_client_fetch_error(
+                    'cache', symbols, start_date, end_date)
+                results = self.create_asset_prices_data_frames(symbols, [])
+        self.record_rows('read', 'asset', results.values())
+        return results
 
     def put_currency_rates(self, source, base_currency, rate_data):
-        records = self.currency_rates_to_cache_records(
-            source, base_currency, rate_data)
-        self.upsert_records(self.currency_rates, records)
+        with metrics.timer('cache_write_seconds', kind='currency'):
+            records = self.currency_rates_to_cache_records(
+                source, base_currency, rate_data)
+            self.storage.upsert_currency_rates(records)
+        self.record_rows('write', 'currency', [rate_data], len(records))
+
+    def put_many_currency_rates(self, items):
+        # items of (source, base_currency, rate_data), all written in one
+        # upsert
+        with metrics.timer('cache_write_seconds', kind='currency'):
+            records = []
+            for source, base_currency, rate_data in items:
+                records += self.currency_rates_to_cache_records(
+                    source, base_currency, rate_data)
+            self.storage.upsert_currency_rates(records)
+        self.record_rows(
+            'write', 'currency', [item[2] for item in items], len(records))
 
     def get_currency_rates(
             self, base_currency, other_currency, start_date, end_date):
         symbols = sorted([base_currency, other_currency])
-        query = {'symbols': symbols}
-        try:
-            if start_date is not None or end_date is not None:
-                query['date'] = {}
-                if start_date is not None:
-                    query['date']['$gte'] = start_date
-                if end_date is not None:
-                    query['date']['$lte'] = end_date
-            return self.create_currency_rates_data_frame(
-                other_currency,
-                self.currency_rates.find(query, {'_id': 0})
-            )
-        except Exception:
-            log_client_fetch_error('cache', symbols, start_date, end_date)
-            return self.create_currency_rates_data_frame(other_currency, [])
+        with metrics.timer('cache_read_seconds', kind='currency'):
+            try:
+                result = self.create_currency_rates_data_frame(
+                    other_currency,
+                    self.storage.find_currency_rates(
+                        symbols, start_date, end_date))
+            except Exception:
+                log_client_fetch_error(
+                    'cache', symbols, start_date, end_date)
+                result = self.create_currency_rates_data_frame(
+                    other_currency, [])
+        self.record_rows('read', 'currency', [result])
+        return result
 
-    @classmethod
-    def upsert_records(self, collection, records):
-        # TODO: put this in a background thread
-        operations = []
-        for record in records:
-            query = {'date': record['date']}
-            if 'symbol' in record:
-                query['symbol'] = record['symbol']
-            if 'symbols' in record:
-                query['symbols'] = record['symbols']
-            # avoid overwritting a day that isn't missing with one that is
-            if record['_placeholer']:
-                query['_placeholer'] = True
-            operations.append(UpdateOne(query, {'$set': record}, upsert=True))
-        collection.bulk_write(operations, ordered=False)
+    @staticmethod
+    def record_rows(operation, kind, frames, rows=None):
+        # rows read or written (by default the rows of the frames) and the
+        # in memory size of the frames they were decoded into or encoded from
+        if not metrics.enabled:
+            return
+        frames = [frame for frame in frames if frame is not None]
+        if rows is None:
+            rows = sum(len(frame) for frame in frames)
+        metrics.count('cache_rows_total', rows, operation=operation,
+                      kind=kind)
+        metrics.count('cache_bytes_total', int(sum(
+            frame.memory_usage(index=True).sum() for frame in frames)),
+            operation=operation, kind=kind)
 
     @classmethod
     def format_rate_and_inverse(self, rate):
         float_parse_template = '%.' + str(self.CURRENCY_SIG_FIG) + 'g'
         return [float(float_parse_template % n) for n in [rate, 1 / rate]]
 
+    @classmethod
+    def round_significant(self, values):
+        # the same as float('%.5g' % value) for each value, computed as
+        # round(value * 10^k) / 10^k; values whose scaled form is too close
+        # to a rounding boundary to be sure of (or that can't be scaled
+        # exactly) are formatted one at a time instead
+        float_parse_template = '%.' + str(self.CURRENCY_SIG_FIG) + 'g'
+        values = np.asarray(values, dtype=float)
+        magnitudes = np.abs(values)
+        usable = np.isfinite(values) & (magnitudes > 0)
+        exponents = np.zeros(len(values), dtype=int)
+        exponents[usable] = np.floor(np.log10(magnitudes[usable]))
+        # log10 can land on the wrong side of an exact power of ten
+        exponents += (magnitudes >= 10.0 ** (exponents + 1)) & usable
+        exponents -= (magnitudes < 10.0 ** exponents) & usable
+        digits = self.CURRENCY_SIG_FIG - 1 - exponents
+        usable &= np.abs(digits) <= 22
+        scale = 10.0 ** np.where(usable, np.abs(digits), 0)
+        scaled = np.where(digits >= 0, magnitudes * scale, magnitudes / scale)
+        fraction = scaled - np.floor(scaled)
+        usable &= np.abs(fraction - 0.5) > 1e-9
+        rounded = np.round(scaled)
+        result = np.copysign(
+            np.where(digits >= 0, rounded / scale, rounded * scale), values)
+        for i in np.flatnonzero(~usable):
+            result[i] = float(float_parse_template % values[i])
+        return result
+
     @classmethod
     def currency_rates_to_cache_records(
             self, source, base_currency, rate_data):
         records = []
-        for other_currency, rates in rate_data.iteritems():
+        # boxing the dates is the slow part, so it's done once for all columns
+        dates = np.array(list(rate_data.index), dtype=object)
+        for other_currency in rate_data.columns:
+            values = rate_data[other_currency].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            rate = self.round_significant(values[valid])
+            inverse = self.round_significant(1 / values[valid])
             if base_currency < other_currency:
                 symbols = [base_currency, other_currency]
-                reverse_order = False
             else:
                 symbols = [other_currency, base_currency]
-                reverse_order = True
-            for exchange_date, rate in rates.iteritems():
-                if not math.isnan(rate):
-                    [rate, inverse] = self.format_rate_and_inverse(rate)
-                    if reverse_order:
-                        [rate, inverse] = [inverse, rate]
-                    records.append({
-                        'date': exchange_date,
-                        'symbols': symbols,
-                        'rate': rate,
-                        'inverse': inverse,
-                        "_source": source,
-                        "_placeholer": False
-                    })
+                rate, inverse = inverse, rate
+            records += [
+                {
+                    'date': exchange_date,
+                    'symbols': symbols,
+                    'rate': rate_value,
+                    'inverse': inverse_value,
+                    "_source": source,
+                    "_placeholer": False
+                }
+                for exchange_date, rate_value, inverse_value in zip(
+                    dates[valid], rate.tolist(), inverse.tolist())
+            ]
         return records
 
-    @staticmethod
-    def create_asset_prices_data_frame(records):
-        result = pd.DataFrame(list(records), columns=asset_record_keys)
+    @classmethod
+    def decode_columns(self, records, decoders):
+        # Reads records a batch at a time, turning each batch straight into
+        # one array chunk per field, so only one batch of records is ever
+        # held as Python objects. Returns the columns and the row count.
+        chunks = dict([[field, []] for field in decoders])
+        missing = dict([[field, 0] for field in decoders])
+        get_fields = itemgetter(*decoders)
+        records = iter(records)
+        num_rows = 0
+        while True:
+            # records are released as they are read, keeping only the values
+            batch = list(map(get_fields, islice(
+                records, self.decode_batch_size)))
+            if not batch:
+                break
+            num_rows += len(batch)
+            for position, (field, decode) in enumerate(decoders.items()):
+                values = [row[position] for row in batch]
+                missing[field] += values.count(None)
+                chunks[field].append(decode(values))
+        return dict([
+            [field, finish_column(chunks[field], missing[field], num_rows)]
+            for field in decoders
+        ]), num_rows
+
+    @classmethod
+    def decode_asset_prices(self, records, keys):
+        decoders = dict([
+            [key, asset_record_decoders.get(key, decode_numbers)]
+            for key in keys
+        ])
+        columns, num_rows = self.decode_columns(records, decoders)
+        if num_rows:
+            result = pd.DataFrame(columns, columns=keys)
+        else:
+            result = pd.DataFrame([], columns=keys)
         result.rename(columns=asset_columns_map, inplace=True)
         result.set_index('Date', inplace=True)
         return result
 
-    @staticmethod
-    def create_currency_rates_data_frame(symbol, records):
-        rows = [{
-            'Date': r['date'],
-            symbol: r['rate'] if r['symbols'][1] == symbol else r['inverse']
-        } for r in records]
-        result = pd.DataFrame(rows, columns=['Date', symbol])
+    @classmethod
+    def create_asset_prices_data_frame(self, records):
+        return self.decode_asset_prices(records, asset_record_keys)
+
+    @classmethod
+    def create_asset_prices_data_frames(self, symbols, records):
+        result = self.decode_asset_prices(
+            records, ['symbol'] + asset_record_keys)
+        by_symbol = dict(list(result.groupby('symbol', sort=False)))
+        empty = result.iloc[:0]
+        return dict([
+            [symbol, by_symbol.get(symbol, empty).drop(columns='symbol')]
+            for symbol in symbols
+        ])
+
+    @classmethod
+    def create_currency_rates_data_frame(self, symbol, records):
+        columns, num_rows = self.decode_columns(records, {
+            'date': decode_dates,
+            'rate': decode_numbers,
+            'inverse': decode_numbers,
+            'symbols': decode_second_symbols
+        })
+        if not num_rows:
+            result = pd.DataFrame([], columns=['Date', symbol])
+        else:
+            # records store the rate of their second symbol in the first
+            rates = np.where(columns['symbols'] == symbol,
+                             columns['rate'], columns['inverse'])
+            if rates.dtype == object:
+                rates = list(rates)
+                rates = finish_column(
+                    [decode_numbers(rates)], rates.count(None), num_rows)
+            result = pd.DataFrame(
+                {'Date': columns['date'], symbol: rates},
+                columns=['Date', symbol])
         result.set_index('Date', inplace=True)
         return result
 
     @staticmethod
+    def nullable_floats(values):
+        values = np.asarray(values, dtype=float)
+        result = values.astype(object)
+        result[np.isnan(values)] = None
+        return result
+
+    @staticmethod
+    def nullable_ints(values):
+        values = np.asarray(values)
+        if values.dtype.kind in 'iub':
+            return values.astype('int64').astype(object)
+        values = values.astype(float)
+        missing = np.isnan(values)
+        result = np.where(missing, 0, np.trunc(values)).astype(
+            'int64').astype(object)
+        result[missing] = None
+        return result
+
+    @classmethod
     def asset_prices_to_cache_records(
-            source, symbol, price_data, start_date, end_date):
+            self, source, symbol, price_data, start_date, end_date,
+            calendar=None):
+        # one record per trading day in the range, placeholders for the
+        # days price_data has no row for; days the exchange is known to be
+        # closed only get a record if price_data has a row for them
+        if calendar is None:
+            calendar = calendar_for_symbol(symbol)
         today = datetime(date.today().year,
                          date.today().month,
                          date.today().day)
@@ -136,48 +343,51 @@ class CacheClient:
         if end_date >= today:
             end_date = today - timedelta(days=1)
         num_days = (end_date - start_date).days + 1
+        if num_days <= 0:
+            return []
 
-        def sanitize_float(value):
-            value = float(value)
-            if math.isnan(value):
-                return None
-            return value
-
-        def sanitize_int(value):
-            try:
-                return int(value)
-            except TypeError:
-                return None
+        days = pd.date_range(start_date, periods=num_days)
+        row_dates = list(days) if isinstance(
+            start_date, pd.Timestamp) else list(days.to_pydatetime())
+        columns = dict([[name, [None] * num_days] for name in
+                        ['Open', 'High', 'Low', 'Close', 'Volume']])
+        placeholder = np.ones(num_days, dtype=bool)
+        if price_data is not None and all(
+                name in price_data.columns for name in columns):
+            positions = price_data.index.get_indexer(days)
+            placeholder = positions < 0
+            found = positions[~placeholder]
+            for name in columns:
+                values = np.full(num_days, None, dtype=object)
+                column = price_data[name].to_numpy()[found]
+                values[~placeholder] = (
+                    self.nullable_ints(column) if name == 'Volume'
+                    else self.nullable_floats(column))
+                columns[name] = values.tolist()
 
-        def create_record(row_date):
-            try:
-                row = price_data.loc[row_date]
-                return {
-                    'symbol': symbol,
-                    'date': row_date,
-                    'open': sanitize_float(row['Open']),
-                    'high': sanitize_float(row['High']),
-                    'low': sanitize_float(row['Low']),
-                    'close': sanitize_float(row['Close']),
-                    'volume': sanitize_int(row['Volume']),
-                    '_source': source,
-                    '_placeholer': False
-                }
-            except (KeyError, AttributeError):
-                return {
-                    'symbol': symbol,
-                    'date': row_date,
-                    'open': None,
-                    'high': None,
-                    'low': None,
-                    'close': None,
-                    'volume': None,
-                    '_source': source,
-                    '_placeholer': True
-                }
+        kept = np.flatnonzero(~placeholder | calendar.is_open(days))
+        if len(kept) < num_days:
+            row_dates = [row_dates[i] for i in kept]
+            columns = dict([
+                [name, [values[i] for i in kept]]
+                for name, values in columns.items()
+            ])
+            placeholder = placeholder[kept]
 
-        return (
-            create_record(row_date) for row_date in (
-                start_date + timedelta(days=i) for i in range(0, num_days)
-            )
-        )
+        return [
+            {
+                'symbol': symbol,
+                'date': row_date,
+                'open': open_price,
+                'high': high,
+                'low': low,
+                'close': close,
+                'volume': volume,
+                '_source': source,
+                '_placeholer': is_placeholder
+            }
+            for row_date, open_price, high, low, close, volume, is_placeholder
+            in zip(row_dates, columns['Open'], columns['High'],
+                   columns['Low'], columns['Close'], columns['Volume'],
+                   placeholder.tolist())
+        ]
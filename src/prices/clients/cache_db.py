@@ -1,13 +1,45 @@
-from pymongo import MongoClient
-from config import config
-
-url = 'mongodb://{username}:{password}@{host}:{port}/{database}'.format(
-    username=config['mongodb.username'],
-    password=config['mongodb.password'],
-    host=config['mongodb.host'],
-    port=config['mongodb.port'],
-    database=config['mongodb.database']
-)
-
-client = MongoClient(url)
-db = client.get_default_database()
+def mongo_url(config):
+    return 'mongodb://{username}:{password}@{host}:{port}/{database}'.format(
+        username=config['mongodb.username'],
+        password=config['mongodb.password'],
+        host=config['mongodb.host'],
+        port=config['mongodb.port'],
+        database=config['mongodb.database']
+    )
+
+
+def create_storage(config):
+    storage = create_backend_storage(config)
+    if config.get('cache.write_behind', False):
+        from .write_behind import WriteBehindStorage
+        storage = WriteBehindStorage(
+            storage,
+            batch_size=int(config.get('cache.write_batch_size') or 5000),
+            flush_interval=float(
+                config.get('cache.write_flush_seconds') or 0.5),
+            max_pending=int(config.get('cache.max_pending_writes') or 100000))
+    return storage
+
+
+def create_backend_storage(config):
+    # cache.backend selects where cached prices are stored; only the chosen
+    # backend is imported and connected to
+    backend = config.get('cache.backend') or 'mongodb'
+    if backend == 'sqlite':
+        from .sqlite_storage import SqliteStorage
+        return SqliteStorage(config['cache.sqlite_path'])
+    if backend == 'mongodb':
+        from pymongo import MongoClient
+        from .mongo_storage import MongoStorage
+        client = MongoClient(mongo_url(config))
+        return MongoStorage(
+            client.get_default_database(),
+            check_indexes=config.get('cache.ensure_indexes', True))
+    raise ValueError('Unknown cache backend: ' + backend)
+
+
+if __name__ == '__main__':
+    # python -m prices.clients.cache_db prints the plan of each cache query
+    from config import config
+    for name, plan in create_storage(config).explain():
+        print('{:<28} {}'.format(name, plan))
@@ -1,8 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 from json.decoder import JSONDecodeError
 import requests
 import time
 import pandas as pd
-from datetime import datetime, date
+from datetime import datetime, timedelta
+from .rate_limits import ProviderLimit
+from .http_sessions import PooledSession
 
 
 class FixerClient:
@@ -12,9 +15,27 @@ class FixerClient:
         # actually just grab and cache everything cos why not
         # '&symbols={symbols}'
     )
+    # e.g. 'http://api.fixer.io/timeseries?start_date={start:%Y-%m-%d}'
+    #      '&end_date={end:%Y-%m-%d}&base={base}'
+    timeseries_url = None
+    timeseries_max_days = 365
 
     earliest_date = datetime(1999, 1, 4)
-    max_retry_budget = 20
+    default_requests_per_second = 6
+    max_workers = 8
+    max_retries = 10
+    initial_backoff = 0.5
+    max_backoff = 30
+    timeout = 30
+
+    def __init__(self, rate_limit=None, timeseries_url=None, session=None):
+        self.session = session if session is not None else PooledSession()
+        if rate_limit is None:
+            rate_limit = ProviderLimit(
+                requests_per_second=self.default_requests_per_second)
+        self.rate_limit = rate_limit
+        if timeseries_url is not None:
+            self.timeseries_url = timeseries_url
 
     def request_url(self, target_date, base_currency, currencies):
         return self.query_url.format(
@@ -23,42 +44,79 @@ class FixerClient:
             symbols=','.join(currencies)
         )
 
+    def request_json(self, url):
+        # retries with exponential backoff, raising the last error once
+        # max_retries is exhausted
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.rate_limit:
+                    return self.session.get(url, timeout=self.timeout).json()
+            except (JSONDecodeError, requests.RequestException):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(min(
+                    self.max_backoff, self.initial_backoff * 2 ** attempt))
+
+    def fetch_day(self, target_date, base_currency, currencies):
+        response = self.request_json(
+            self.request_url(target_date, base_currency, currencies))
+        return {target_date: response['rates']}
+
+    def fetch_timeseries(self, start_date, end_date, base_currency):
+        response = self.request_json(self.timeseries_url.format(
+            start=start_date, end=end_date, base=base_currency))
+        return dict([
+            [pd.Timestamp(rate_date), rates]
+            for rate_date, rates in response['rates'].items()
+        ])
+
+    def timeseries_ranges(self, dates):
+        ranges = []
+        start = dates.min()
+        while start <= dates.max():
+            end = min(
+                dates.max(),
+                start + timedelta(days=self.timeseries_max_days - 1))
+            ranges.append((start, end))
+            start = end + timedelta(days=1)
+        return ranges
+
     def fetch_history(
             self, base_currency, currencies, start_date, end_date,
-            skip_dates=None, remaining_retries=10):
+            skip_dates=None):
         if isinstance(currencies, str):
             currencies = [currencies]
-        dates = pd.date_range(start_date, end_date)
-        result = pd.DataFrame(index=dates, columns=currencies)
-
+        all_dates = pd.date_range(start_date, end_date)
+        dates = all_dates
         if skip_dates is not None:
             dates = dates.difference(skip_dates)
 
-        for target_date in dates:
-            # gradually increase remaining retry budget with successful
-            # requests
-            remaining_retries = min(
-                self.max_retry_budget, remaining_retries + 0.075)
-            # throttle harder if fewer retries remaining
-            time.sleep(
-                max(0.15,
-                    0.6 * (1 - (remaining_retries / self.max_retry_budget))))
-            req = requests.get(self.request_url(
-                target_date, base_currency, currencies))
-            try:
-                res = req.json()
-            except JSONDecodeError as req_error:
-                if remaining_retries > 0:
-                    # wait longer if fewer retries remaining
-                    time.sleep(
-                        max(2, self.max_retry_budget - remaining_retries))
-                    return self.fetch_history(
-                        base_currency, currencies, target_date, end_date,
-                        skip_dates, remaining_retries - 1)
-                else:
-                    raise req_error
-
-            for currency in res['rates']:
-                result.at[target_date, currency] = res['rates'][currency]
+        rates = {}
+        if len(dates) > 0:
+            if self.timeseries_url is not None:
+                requests_to_send = [
+                    (self.fetch_timeseries, start, end, base_currency)
+                    for start, end in self.timeseries_ranges(dates)]
+            else:
+                requests_to_send = [
+                    (self.fetch_day, target_date, base_currency, currencies)
+                    for target_date in dates]
+            with ThreadPoolExecutor(
+                    min(self.max_workers, len(requests_to_send))) as executor:
+                for result in executor.map(
+                        lambda request: request[0](*request[1:]),
+                        requests_to_send):
+                    rates.update(result)
+        return self.create_rates_data_frame(
+            all_dates, dates, currencies, rates)
 
-        return result
+    @staticmethod
+    def create_rates_data_frame(all_dates, dates, currencies, rates):
+        # one row per date in the range, NaN for skipped dates; the requested
+        # currencies first, then every other currency that was returned
+        result = pd.DataFrame.from_dict(rates, orient='index', dtype=float)
+        result = result.loc[result.index.isin(dates)]
+        columns = currencies + [
+            currency for currency in result.columns
+            if currency not in currencies]
+        return result.reindex(index=all_dates, columns=columns)
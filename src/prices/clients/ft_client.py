@@ -1,9 +1,17 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+import numpy as np
 import pandas as pd
-from datetime import date
-from dateutil.parser import parse
-from lxml import html
 import requests
-from .helpers import log_client_fetch_error, asset_column_names
+from dateutil.parser import parse
+from .helpers import log_client_fetch_error, asset_column_names, \
+    ProviderError, check_provider_status
+from .http_sessions import PooledSession
+from .rate_limits import ProviderLimit
+
+# what pandas makes of a column of datetimes, as the other clients return
+date_dtype = pd.Index([datetime(2000, 1, 1)]).dtype
 
 
 class FtClient:
@@ -13,44 +21,149 @@ class FtClient:
         '&endDate={end_date}'
         '&symbol={symbol}'
     )
+    headers = {'Accept': 'text/html,application/xhtml+xml,application/xml'}
+    # One row of the history table: the long form date (in the first span of
+    # the first cell), open, high, low, close and the full volume (in the
+    # first span of the last cell)
+    row_pattern = re.compile(
+        r'<tr[^>]*>\s*<td[^>]*>\s*<span[^>]*>([^<]*)</span>.*?</td>'
+        r'\s*<td[^>]*>([^<]*)</td>\s*<td[^>]*>([^<]*)</td>'
+        r'\s*<td[^>]*>([^<]*)</td>\s*<td[^>]*>([^<]*)</td>'
+        r'\s*<td[^>]*>\s*<span[^>]*>([^<]*)</span>', re.S)
+    # e.g. Friday, December 29, 2017
+    date_format = '%A, %B %d, %Y'
+    months = dict([
+        [name, number + 1] for number, name in enumerate([
+            'January', 'February', 'March', 'April', 'May', 'June', 'July',
+            'August', 'September', 'October', 'November', 'December'])
+    ])
+    # the endpoint truncates long ranges, so they're requested in windows of
+    # at most this many days, fetched concurrently
+    window_days = 365
+    max_workers = 4
+
+    def __init__(self, session=None, rate_limit=None, window_days=None):
+        self.session = session if session is not None else PooledSession()
+        self.rate_limit = (
+            rate_limit if rate_limit is not None else ProviderLimit())
+        if window_days is not None:
+            self.window_days = window_days
+
+    def windows(self, start_date, end_date):
+        start = pd.Timestamp(start_date).to_pydatetime().date()
+        end = pd.Timestamp(end_date).to_pydatetime().date()
+        windows = []
+        while start <= end:
+            last = min(end, start + timedelta(days=self.window_days - 1))
+            windows.append((start, last))
+            start = last + timedelta(days=1)
+        return windows or [(start, end)]
+
+    def fetch_window(self, query_url, symbol, start, end):
+        url = query_url.format(
+            symbol=symbol,
+            start_date=start.isoformat(),
+            end_date=end.isoformat()
+        )
+        with self.rate_limit:
+            try:
+                response = self.session.get(url, headers=self.headers)
+            except requests.RequestException as error:
+                raise ProviderError(str(error)) from error
+        check_provider_status(response.status_code)
+        html_text = response.json()['html']
+        # nothing at all (rather than an empty table) for a window without
+        # any history
+        if not html_text.strip():
+            return None
+        return self.parse_history(html_text)
 
     def fetch_history(
             self, symbol, start_date,
-            end_date=date.today().isoformat(), query_url=query_url):
+            end_date=date.today().isoformat(), query_url=None):
         try:
-            url = (query_url).format(
-                symbol=symbol,
-                start_date=start_date,
-                end_date=end_date
-            )
-            headers = {
-                'Accept': 'text/html,application/xhtml+xml,application/xml'}
-            request = requests.get(url, headers=headers)
-            response = request.json()
-            html_data = html.fromstring(response['html'])
-            history = []
-            html_rows = html_data.xpath('//tr')
-            for html_row in html_rows:
-                html_cells = html_row.getchildren()
-                history.append({
-                    'Date': parse(html_cells[0].getchildren()[0].text),
-                    'Open': self._parseFloatCell(html_cells[1]),
-                    'High': self._parseFloatCell(html_cells[2]),
-                    'Low': self._parseFloatCell(html_cells[3]),
-                    'Close': self._parseFloatCell(html_cells[4]),
-                    'Volume': self._parseFloatCell(
-                        html_cells[5].getchildren()[0])
-                })
-            result = pd.DataFrame(
-                history, columns=asset_column_names)
-            result.set_index('Date', inplace=True)
-            return result
+            query_url = query_url or self.query_url
+            windows = self.windows(start_date, end_date)
+            with ThreadPoolExecutor(
+                    min(self.max_workers, len(windows))) as executor:
+                frames = [
+                    frame for frame in executor.map(
+                        lambda window: self.fetch_window(
+                            query_url, symbol, *window),
+                        windows)
+                    if frame is not None
+                ]
+            if not frames:
+                raise ValueError('No FT history for ' + symbol)
+            result = pd.concat(frames) if len(frames) > 1 else frames[0]
+            return result[~result.index.duplicated(keep='last')].sort_index()
 
+        except ProviderError:
+            log_client_fetch_error('ft', symbol, start_date, end_date)
+            raise
         except Exception:
             log_client_fetch_error('ft', symbol, start_date, end_date)
 
-    def _parseFloatCell(self, cell):
+    @classmethod
+    def parse_history(self, html_text):
+        # Rows are matched with row_pattern in one pass over the text and
+        # each column converted as a whole. If the markup isn't what the
+        # pattern expects (it matches fewer rows than there are) the table
+        # is parsed with lxml instead, still a column at a time.
+        rows = self.row_pattern.findall(html_text)
+        if len(rows) != html_text.count('<tr'):
+            rows = self.xpath_rows(html_text)
+        columns = list(zip(*rows)) or [[]] * len(asset_column_names)
+        result = pd.DataFrame(dict([
+            [name, self.parse_numbers(values)]
+            for name, values in zip(asset_column_names[1:], columns[1:])
+        ]), index=self.parse_dates(columns[0]))
+        result.index.name = 'Date'
+        return result
+
+    @staticmethod
+    def xpath_rows(html_text):
+        # lxml is only needed (and imported) for markup row_pattern misses
+        from lxml import html
+        table = html.fromstring(html_text)
+        columns = [table.xpath('//tr[td]/td[1]/span[1]')] + [
+            table.xpath('//tr[td]/td[{}]'.format(position))
+            for position in range(2, 6)
+        ] + [table.xpath('//tr[td]/td[6]/span[1]')]
+        if any(len(column) != len(columns[0]) for column in columns):
+            raise ValueError('FT history rows have missing cells')
+        return list(zip(*[
+            [cell.text for cell in column] for column in columns]))
+
+    @classmethod
+    def parse_dates(self, texts):
+        # splitting 'Friday, December 29, 2017' into its parts is much
+        # quicker than strptime; other forms go to the general parsers
         try:
-            return float(cell.text.replace(',', ''))
+            parts = [text.split() for text in texts]
+            years = np.array([int(part[3]) for part in parts], dtype='int64')
+            months = np.array(
+                [self.months[part[1]] for part in parts], dtype='int64')
+            days = np.array(
+                [int(part[2].rstrip(',')) for part in parts], dtype='int64')
+        except (AttributeError, IndexError, KeyError, ValueError):
+            try:
+                return pd.DatetimeIndex(pd.to_datetime(
+                    list(texts), format=self.date_format)).astype(date_dtype)
+            except ValueError:
+                return pd.DatetimeIndex(
+                    [parse(text) for text in texts]).astype(date_dtype)
+        dates = (
+            (years - 1970).astype('datetime64[Y]').astype('datetime64[M]') +
+            (months - 1)).astype('datetime64[D]') + (days - 1)
+        return pd.DatetimeIndex(dates).astype(date_dtype)
+
+    @staticmethod
+    def parse_numbers(texts):
+        # thousands separators dropped; cells that aren't numbers are NaN
+        values = np.array(
+            [(text or '').replace(',', '') for text in texts], dtype=object)
+        try:
+            return values.astype(float)
         except ValueError:
-            return None
+            return pd.to_numeric(values, errors='coerce').astype(float)
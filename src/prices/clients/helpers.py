@@ -1,15 +1,34 @@
+import logging
+from metrics import metrics
+
+logger = logging.getLogger('portfolio_tracker.prices.clients')
+
+
+class ProviderError(Exception):
+    # A provider couldn't be reached, timed out, answered with a server error
+    # or asked for fewer requests, as opposed to having no data for what was
+    # asked: asset clients raise it, and return None when there's no data.
+    pass
+
+
+def check_provider_status(status_code):
+    if status_code == 429 or status_code >= 500:
+        raise ProviderError('HTTP status {}'.format(status_code))
+
+
+def format_date(value):
+    return value.strftime('%Y-%m-%d') if hasattr(
+        value, 'strftime') else str(value)
+
 
 def log_client_fetch_error(client, symbol, start, end):
-    msg = (
-        'Error fetching data from {client} for {symbol} '
-        'in range {start:%Y-%m-%d} : {end:%Y-%m-%d}.'
-    ).format(
-        client=client,
-        symbol=symbol,
-        start=start,
-        end=end
-    )
-    print(msg)
+    start, end = format_date(start), format_date(end)
+    logger.warning(
+        'Error fetching data from %s for %s in range %s : %s.',
+        client, symbol, start, end,
+        extra={'client': client, 'symbol': symbol, 'start_date': start,
+               'end_date': end})
+    metrics.count('fetch_errors_total', client=client)
 
 asset_record_keys = ['date', 'open', 'high', 'low', 'close', 'volume']
 asset_column_names = ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
@@ -0,0 +1,34 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+default_pool_size = 16
+default_timeout = 30
+
+
+class PooledSession(requests.Session):
+    # A requests session keeping up to pool_size keep-alive connections per
+    # host, with a default timeout and optional compressed responses.
+
+    def __init__(self, pool_size=default_pool_size, timeout=default_timeout,
+                 compression=True, max_retries=0):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=max_retries)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self.headers['Accept-Encoding'] = \
+            'gzip, deflate' if compression else 'identity'
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(config, max_retries=0):
+    return PooledSession(
+        pool_size=int(config.get('http.pool_size') or default_pool_size),
+        timeout=float(config.get('http.timeout') or default_timeout),
+        compression=config.get('http.compression', True) is not False,
+        max_retries=max_retries)
@@ -0,0 +1,209 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+import pandas as pd
+from metrics import metrics
+
+
+class MemoryCacheEntry:
+    def __init__(self, frame, start_date, end_date, expires_at):
+        self.frame = frame
+        self.start_date = start_date
+        self.end_date = end_date
+        self.expires_at = expires_at
+        self.size = int(frame.memory_usage(index=True, deep=True).sum())
+
+    def covers(self, start_date, end_date):
+        return (
+            (self.start_date is None or (
+                start_date is not None and self.start_date <= start_date)) and
+            (self.end_date is None or (
+                end_date is not None and end_date <= self.end_date))
+        )
+
+    def overlaps(self, start_date, end_date):
+        return (
+            (start_date is None or self.end_date is None or
+             start_date <= self.end_date + timedelta(days=1)) and
+            (end_date is None or self.start_date is None or
+             self.start_date <= end_date + timedelta(days=1))
+        )
+
+    def select(self, start_date, end_date):
+        return self.frame.loc[start_date:end_date]
+
+
+class MemoryCacheClient:
+    # In-process tier in front of a CacheClient. Keeps the date indexed
+    # frame read for each asset symbol and currency pair together with the
+    # date range it covers, answers any sub-range of that from memory and
+    # evicts least recently used frames beyond max_bytes. Frames reaching
+    # into the last recent_days expire after ttl seconds, since those days
+    # may still be filled in upstream. Writes through the tier invalidate
+    # the frames they touch.
+
+    def __init__(self, cache_client, max_bytes=64 << 20, ttl=300,
+                 recent_days=7):
+        self.cache_client = cache_client
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.recent_days = recent_days
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.counters = dict([
+            [name, 0] for name in
+            ['hits', 'misses', 'evictions', 'expirations', 'invalidations']
+        ])
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries),
+                        bytes=self.size)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self.generations[key] = self.generations.get(key, 0) + 1
+                self._discard(key)
+
+    def _discard(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry.size
+
+    def _lookup(self, key, start_date, end_date):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at is not None and (
+                    entry.expires_at <= time.monotonic()):
+                self._discard(key)
+                self.counters['expirations'] += 1
+                entry = None
+            if entry is not None and entry.covers(start_date, end_date):
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                metrics.count('memory_cache_lookups_total', kind=key[0],
+                              result='hit')
+                return entry.select(start_date, end_date), None
+            self.counters['misses'] += 1
+            metrics.count('memory_cache_lookups_total', kind=key[0],
+                          result='miss')
+            return None, self.generations.get(key, 0)
+
+    def _expires_at(self, end_date):
+        today = datetime.combine(date.today(), datetime.min.time())
+        if end_date is not None and (
+                end_date < today - timedelta(days=self.recent_days)):
+            return None
+        return time.monotonic() + self.ttl
+
+    def _store(self, key, generation, frame, start_date, end_date):
+        frame = frame.sort_index()
+        with self.lock:
+            # a write may have invalidated the key while it was being read
+            if self.generations.get(key, 0) != generation:
+                return
+            previous = self.entries.get(key)
+            if previous is not None and previous.overlaps(
+                    start_date, end_date):
+                frame = pd.concat([frame, previous.frame])
+                frame = frame[
+                    ~frame.index.duplicated(keep='first')].sort_index()
+                start_date = None if None in [
+                    start_date, previous.start_date] else min(
+                        start_date, previous.start_date)
+                end_date = None if None in [
+                    end_date, previous.end_date] else max(
+                        end_date, previous.end_date)
+            if previous is not None:
+                self._discard(key)
+            entry = MemoryCacheEntry(
+                frame, start_date, end_date, self._expires_at(end_date))
+            if entry.size > self.max_bytes:
+                return
+            self.entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self.entries)))
+                self.counters['evictions'] += 1
+
+    def _invalidate(self, keys):
+        with self.lock:
+            for key in keys:
+                self.generations[key] = self.generations.get(key, 0) + 1
+                if key in self.entries:
+                    self._discard(key)
+                    self.counters['invalidations'] += 1
+
+    def get_asset_prices(self, symbol, start_date=None, end_date=None):
+        key = ('asset', symbol)
+        result, generation = self._lookup(key, start_date, end_date)
+        if result is None:
+            result = self.cache_client.get_asset_prices(
+                symbol, start_date, end_date)
+            self._store(key, generation, result, start_date, end_date)
+        return result
+
+    def get_many_asset_prices(self, symbols, start_date=None, end_date=None):
+        symbols = list(symbols)
+        results = {}
+        generations = {}
+        for symbol in symbols:
+            results[symbol], generations[symbol] = self._lookup(
+                ('asset', symbol), start_date, end_date)
+        missing = [symbol for symbol in symbols if results[symbol] is None]
+        if missing:
+            fetched = self.cache_client.get_many_asset_prices(
+                missing, start_date, end_date)
+            for symbol in missing:
+                results[symbol] = fetched[symbol]
+                self._store(('asset', symbol), generations[symbol],
+                            fetched[symbol], start_date, end_date)
+        return results
+
+    def get_currency_rates(
+            self, base_currency, other_currency, start_date, end_date):
+        key = ('currency', base_currency, other_currency)
+        result, generation = self._lookup(key, start_date, end_date)
+        if result is None:
+            result = self.cache_client.get_currency_rates(
+                base_currency, other_currency, start_date, end_date)
+            self._store(key, generation, result, start_date, end_date)
+        return result
+
+    def put_asset_prices(
+            self, source, symbol, price_data, start_date, end_date):
+        self.cache_client.put_asset_prices(
+            source, symbol, price_data, start_date, end_date)
+        self._invalidate([('asset', symbol)])
+
+    def put_many_asset_prices(self, items):
+        items = list(items)
+        self.cache_client.put_many_asset_prices(items)
+        self._invalidate([('asset', item[1]) for item in items])
+
+    def flush(self):
+        self.cache_client.flush()
+
+    def put_currency_rates(self, source, base_currency, rate_data):
+        self.cache_client.put_currency_rates(source, base_currency, rate_data)
+        self._invalidate([
+            key for other_currency in rate_data.columns
+            for key in [('currency', base_currency, other_currency),
+                        ('currency', other_currency, base_currency)]
+        ])
+
+    def put_many_currency_rates(self, items):
+        items = list(items)
+        self.cache_client.put_many_currency_rates(items)
+        self._invalidate([
+            key for _, base_currency, rate_data in items
+            for other_currency in rate_data.columns
+            for key in [('currency', base_currency, other_currency),
+                        ('currency', other_currency, base_currency)]
+        ])
@@ -0,0 +1,172 @@
+import logging
+import threading
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger('portfolio_tracker.prices.cache')
+
+metadata_fields = ['_source', '_placeholer']
+
+
+class MongoStorage:
+    # Cache storage in the asset_prices and currency_rates collections of a
+    # MongoDB database. Queries and upserts go through one compound index per
+    # collection; the currency index can't be unique, since unique multikey
+    # indexes apply to each currency of the pair separately.
+    indexes = {
+        'asset_prices': [{
+            'name': 'symbol_date',
+            'keys': [('symbol', ASCENDING), ('date', ASCENDING)],
+            'unique': True
+        }],
+        'currency_rates': [{
+            'name': 'symbols_date',
+            'keys': [('symbols', ASCENDING), ('date', ASCENDING)],
+            'unique': False
+        }]
+    }
+
+    def __init__(self, db, check_indexes=True):
+        self.db = db
+        self.asset_prices = db.asset_prices
+        self.currency_rates = db.currency_rates
+        self.indexes_checked = not check_indexes
+        self.lock = threading.Lock()
+
+    def check_indexes(self):
+        # done once, on first use, so that merely importing the clients
+        # doesn't wait on the server
+        with self.lock:
+            if self.indexes_checked:
+                return
+            self.indexes_checked = True
+            try:
+                problems = self.ensure_indexes()
+            except PyMongoError as error:
+                problems = [str(error)]
+        for problem in problems:
+            logger.warning('Could not create cache index %s', problem,
+                           extra={'problem': problem})
+
+    def ensure_indexes(self):
+        # creates missing indexes and returns a list of problems with the
+        # ones that could not be created as specified
+        problems = []
+        for collection_name, indexes in self.indexes.items():
+            collection = self.db[collection_name]
+            existing = collection.index_information()
+            for index in indexes:
+                current = existing.get(index['name'])
+                if current is not None and (
+                        list(current['key']) == index['keys'] and
+                        current.get('unique', False) == index['unique']):
+                    continue
+                try:
+                    collection.create_index(
+                        index['keys'], name=index['name'],
+                        unique=index['unique'])
+                except OperationFailure as error:
+                    problems.append('{}.{}: {}'.format(
+                        collection_name, index['name'], error))
+        return problems
+
+    @staticmethod
+    def projection(include_metadata):
+        projection = {'_id': 0}
+        if not include_metadata:
+            projection.update([[field, 0] for field in metadata_fields])
+        return projection
+
+    @staticmethod
+    def add_date_range(query, start_date, end_date):
+        if start_date is not None or end_date is not None:
+            query['date'] = {}
+            if start_date is not None:
+                query['date']['$gte'] = start_date
+            if end_date is not None:
+                query['date']['$lte'] = end_date
+        return query
+
+    def asset_prices_query(self, symbols, start_date=None, end_date=None):
+        symbols = list(symbols)
+        symbol = symbols[0] if len(symbols) == 1 else {'$in': symbols}
+        return self.add_date_range({'symbol': symbol}, start_date, end_date)
+
+    def currency_rates_query(self, symbols, start_date=None, end_date=None):
+        return self.add_date_range(
+            {'symbols': list(symbols)}, start_date, end_date)
+
+    def find_asset_prices(self, symbols, start_date=None, end_date=None,
+                          include_metadata=False):
+        self.check_indexes()
+        return self.asset_prices.find(
+            self.asset_prices_query(symbols, start_date, end_date),
+            self.projection(include_metadata))
+
+    def find_currency_rates(self, symbols, start_date=None, end_date=None,
+                            include_metadata=False):
+        self.check_indexes()
+        return self.currency_rates.find(
+            self.currency_rates_query(symbols, start_date, end_date),
+            self.projection(include_metadata))
+
+    def upsert_asset_prices(self, records):
+        self.check_indexes()
+        self.upsert_records(self.asset_prices, records)
+
+    def upsert_currency_rates(self, records):
+        self.check_indexes()
+        self.upsert_records(self.currency_rates, records)
+
+    @classmethod
+    def upsert_records(self, collection, records):
+        operations = []
+        for record in records:
+            query = {'date': record['date']}
+            if 'symbol' in record:
+                query['symbol'] = record['symbol']
+            if 'symbols' in record:
+                query['symbols'] = record['symbols']
+            # avoid overwritting a day that isn't missing with one that is;
+            # matching on _placeholer instead would insert a duplicate day
+            update = '$setOnInsert' if record['_placeholer'] else '$set'
+            operations.append(UpdateOne(query, {update: record}, upsert=True))
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+    @staticmethod
+    def plan_stages(plan):
+        stages = []
+        while plan:
+            stage = plan.get('stage', '?')
+            if 'indexName' in plan:
+                stage += '({})'.format(plan['indexName'])
+            stages.append(stage)
+            inputs = plan.get('inputStages') or [plan.get('inputStage')]
+            plan = inputs[0]
+        return ' > '.join(stages)
+
+    def explain(self):
+        # the winning plan of every query pattern the cache issues
+        self.check_indexes()
+        day = datetime(2000, 1, 3)
+        patterns = [
+            ['asset prices, one symbol', self.asset_prices,
+             self.asset_prices_query(['A'], day, day)],
+            ['asset prices, many symbols', self.asset_prices,
+             self.asset_prices_query(['A', 'B'], day, day)],
+            ['asset prices upsert', self.asset_prices,
+             {'date': day, 'symbol': 'A'}],
+            ['currency rates', self.currency_rates,
+             self.currency_rates_query(['A', 'B'], day, day)],
+            ['currency rates upsert', self.currency_rates,
+             {'date': day, 'symbols': ['A', 'B']}],
+        ]
+        plans = []
+        for name, collection, query in patterns:
+            planner = collection.find(
+                query, self.projection(False)).explain()['queryPlanner']
+            plan = planner['winningPlan']
+            plans.append([name, self.plan_stages(plan.get('queryPlan', plan))])
+        return plans
@@ -0,0 +1,217 @@
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger('portfolio_tracker.prices.providers')
+
+
+class ProviderState:
+    # Running health of one provider: exponentially weighted latency and
+    # error rate, and a circuit breaker that opens after failure_threshold
+    # consecutive failures. Once open, one trial request is let through
+    # every reset_seconds; its success closes the circuit again. Failures are
+    # errors reaching the provider: an answer without data for a symbol is a
+    # miss, which shows the provider is up but doesn't count as an error.
+    fields = ['latency', 'error_rate', 'requests', 'failures',
+              'consecutive_failures', 'opened_at']
+
+    def __init__(self, latency=None, error_rate=0.0, requests=0, failures=0,
+                 consecutive_failures=0, opened_at=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = requests
+        self.failures = failures
+        self.consecutive_failures = consecutive_failures
+        # wall clock time, so that an open circuit stays open on restart
+        self.opened_at = opened_at
+        self.trial_started_at = None
+
+    def to_dict(self):
+        return dict([[field, getattr(self, field)] for field in self.fields])
+
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allows_request(self, now, reset_seconds):
+        if self.opened_at is None:
+            return True
+        if now - self.opened_at < reset_seconds:
+            return False
+        # a single trial at a time while half open
+        return (self.trial_started_at is None or
+                now - self.trial_started_at >= reset_seconds)
+
+    def record_answer(self, seconds, alpha):
+        self.requests += 1
+        self.latency = seconds if self.latency is None else (
+            alpha * seconds + (1 - alpha) * self.latency)
+        self.trial_started_at = None
+
+    def record_miss(self, seconds, alpha):
+        self.record_answer(seconds, alpha)
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record(self, succeeded, seconds, now, alpha, failure_threshold):
+        self.record_answer(seconds, alpha)
+        self.error_rate = alpha * (not succeeded) + (
+            1 - alpha) * self.error_rate
+        if succeeded:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.is_open() or (
+                self.consecutive_failures >= failure_threshold):
+            self.opened_at = now
+
+
+class ProviderHealth:
+    # Tracks the health of each provider and which provider last returned
+    # prices for each symbol, and orders the providers to try for a symbol:
+    # the one that covered it last, then the rest by error rate and latency
+    # (untried ones last), leaving out those with an open circuit. If every
+    # circuit is open they are all tried anyway, and the ones left out are
+    # tried last (see fallback) when none of the others has the symbol. The
+    # state is saved to path
+    # (at most every save_interval seconds, and on exit) and reloaded from it.
+
+    def __init__(self, providers, path=None, failure_threshold=5,
+                 reset_seconds=300, alpha=0.2, save_interval=10):
+        self.providers = list(providers)
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.alpha = alpha
+        self.save_interval = save_interval
+        self.states = dict([
+            [provider, ProviderState()] for provider in self.providers])
+        self.coverage = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        if path is not None:
+            self.load()
+            atexit.register(self.save)
+
+    def load(self):
+        try:
+            with open(self.path) as state_file:
+                saved = json.load(state_file)
+        except (OSError, ValueError):
+            return
+        for provider, state in saved.get('providers', {}).items():
+            if provider in self.states:
+                self.states[provider] = ProviderState(**dict([
+                    [field, state[field]] for field in ProviderState.fields
+                    if field in state]))
+        self.coverage = dict([
+            [symbol, provider]
+            for symbol, provider in saved.get('coverage', {}).items()
+            if provider in self.states
+        ])
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            saved = {
+                'providers': dict([
+                    [provider, state.to_dict()]
+                    for provider, state in self.states.items()]),
+                'coverage': dict(self.coverage)
+            }
+            self.dirty = False
+            self.saved_at = time.monotonic()
+        # written aside and renamed, so a crash never leaves a partial file;
+        # the staging file is unique so that processes sharing the path
+        # (backfill workers) don't write over each other's
+        with self.save_lock:
+            staging = None
+            try:
+                descriptor, staging = tempfile.mkstemp(
+                    dir=os.path.dirname(os.path.abspath(self.path)),
+                    prefix=os.path.basename(self.path) + '.',
+                    suffix='.tmp')
+                with os.fdopen(descriptor, 'w') as state_file:
+                    json.dump(saved, state_file)
+                os.replace(staging, self.path)
+            except OSError as error:
+                logger.warning(
+                    'Could not save provider health: %s', error,
+                    extra={'path': self.path})
+                if staging is not None and os.path.exists(staging):
+                    os.remove(staging)
+
+    def route(self, symbol):
+        now = time.time()
+        with self.lock:
+            ranked = sorted(self.providers, key=lambda provider: (
+                provider != self.coverage.get(symbol),
+                self.states[provider].error_rate,
+                float('inf') if self.states[provider].latency is None
+                else self.states[provider].latency))
+            available = [
+                provider for provider in ranked
+                if self.states[provider].allows_request(
+                    now, self.reset_seconds)]
+            return available or ranked
+
+    def fallback(self, symbol, tried):
+        # the providers route left out, the one that covered the symbol last
+        # first
+        with self.lock:
+            covering = self.coverage.get(symbol)
+        return sorted(
+            [provider for provider in self.providers if provider not in tried],
+            key=lambda provider: provider != covering)
+
+    def begin_request(self, provider):
+        # called just before a request is made to a routed provider, so a
+        # half open provider's trial is only used up by an actual request
+        with self.lock:
+            state = self.states[provider]
+            if state.is_open():
+                state.trial_started_at = time.time()
+
+    def record(self, provider, symbol, succeeded, seconds):
+        with self.lock:
+            self.states[provider].record(
+                succeeded, seconds, time.time(), self.alpha,
+                self.failure_threshold)
+            # an error says nothing about which symbols it covers
+            if succeeded:
+                self.coverage[symbol] = provider
+            due = self.changed()
+        if due:
+            self.save()
+
+    def record_miss(self, provider, symbol, seconds):
+        # the provider answered, but without prices for the symbol
+        with self.lock:
+            self.states[provider].record_miss(seconds, self.alpha)
+            if self.coverage.get(symbol) == provider:
+                del self.coverage[symbol]
+            due = self.changed()
+        if due:
+            self.save()
+
+    def changed(self):
+        # with the lock held; whether a save is due
+        self.dirty = True
+        return time.monotonic() - self.saved_at >= self.save_interval
+
+    def stats(self):
+        with self.lock:
+            return dict([
+                [provider, dict(state.to_dict(), open=state.is_open())]
+                for provider, state in self.states.items()
+            ])
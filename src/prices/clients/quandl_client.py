@@ -1,26 +1,51 @@
 from datetime import date
-import quandl
-from .helpers import log_client_fetch_error
+import requests
+from .helpers import log_client_fetch_error, ProviderError, \
+    check_provider_status
+from .http_sessions import PooledSession
 
 
 class QuandlCleint:
+    # the quandl package is only imported once a client is created
     default_api_version = '2015-04-09'
 
-    def __init__(self, api_key, api_version=default_api_version):
+    def __init__(self, api_key, api_version=default_api_version,
+                 session=None):
+        from quandl.connection import Connection
         self.set_api_config(api_key=api_key, api_version=api_version)
+        self.use_session(session if session is not None else PooledSession(
+            max_retries=Connection.get_retries()))
+
+    @staticmethod
+    def use_session(session):
+        # the quandl package opens a new session (and so a new connection)
+        # per request; make it reuse one pooled session instead
+        from quandl.connection import Connection
+        Connection.get_session = classmethod(lambda cls: session)
 
     def set_api_config(self, api_key=None, api_version=default_api_version):
+        import quandl
         if api_key is not None:
             quandl.ApiConfig.api_key = api_key
         quandl.ApiConfig.api_version = api_version
 
     def fetch_history(
             self, symbol, start_date, end_date=date.today().isoformat()):
+        import quandl
+        from quandl.errors.quandl_error import QuandlError
         qsymbol = "WIKI/" + symbol
         try:
-            return self._normalize_results(
-                quandl.get(qsymbol, start_date=start_date, end_date=end_date)
-            )
+            try:
+                return self._normalize_results(quandl.get(
+                    qsymbol, start_date=start_date, end_date=end_date))
+            except QuandlError as error:
+                check_provider_status(error.http_status or 500)
+                raise
+            except requests.RequestException as error:
+                raise ProviderError(str(error)) from error
+        except ProviderError:
+            log_client_fetch_error('quandl', symbol, start_date, end_date)
+            raise
         except Exception:
             log_client_fetch_error('quandl', symbol, start_date, end_date)
             return
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class TokenBucket:
+    # Allows `rate` acquisitions per second on average, with bursts of up
+    # to `capacity`. Safe to share between threads.
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProviderLimit:
+    # Context manager around a single upstream request: waits for one of
+    # max_concurrent slots and then for a token from the rate limit.
+
+    def __init__(self, max_concurrent=None, requests_per_second=None,
+                 burst=None):
+        self.semaphore = None
+        self.bucket = None
+        if max_concurrent:
+            self.semaphore = threading.BoundedSemaphore(int(max_concurrent))
+        if requests_per_second:
+            self.bucket = TokenBucket(float(requests_per_second), burst)
+
+    def __enter__(self):
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+        if self.bucket is not None:
+            self.bucket.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.semaphore is not None:
+            self.semaphore.release()
+        return False
+
+
+def provider_limit(config, provider, processes=1):
+    # the configured limits are for all processes together, each of the
+    # given number of processes getting an equal share
+    max_concurrent = config.get(provider + '.max_concurrent')
+    requests_per_second = config.get(provider + '.requests_per_second')
+    if max_concurrent:
+        max_concurrent = max(1, int(max_concurrent) // processes)
+    if requests_per_second:
+        requests_per_second = float(requests_per_second) / processes
+    return ProviderLimit(
+        max_concurrent, requests_per_second, config.get(provider + '.burst'))
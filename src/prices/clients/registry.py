@@ -0,0 +1,53 @@
+import threading
+
+
+class Registry:
+    # Named objects (clients, storage connections) created by their factory
+    # the first time they are used, so that importing the package neither
+    # imports every provider's dependencies nor connects to anything
+
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        # factories may get other registered objects
+        self.lock = threading.RLock()
+
+    def register(self, name, factory):
+        self.factories[name] = factory
+        return LazyObject(self, name)
+
+    def get(self, name):
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        with self.lock:
+            if name not in self.instances:
+                self.instances[name] = self.factories[name]()
+            return self.instances[name]
+
+    def set(self, name, instance):
+        with self.lock:
+            self.instances[name] = instance
+
+    def created(self):
+        return list(self.instances)
+
+
+class LazyObject:
+    # Stands in for a registered object, creating it on first attribute
+    # access and forwarding attribute reads and writes to it
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._registry.get(self._name), attribute, value)
+
+    def __repr__(self):
+        if self._name in self._registry.instances:
+            return repr(self._registry.get(self._name))
+        return '<{} (not created yet)>'.format(self._name)
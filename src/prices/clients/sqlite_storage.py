@@ -0,0 +1,177 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+asset_fields = ['open', 'high', 'low', 'close', 'volume']
+rate_fields = ['rate', 'inverse']
+
+
+class SqliteStorage:
+    # Embedded cache storage in a single SQLite file. Each table is keyed
+    # (and clustered) by symbol(s) then date, so range queries are served
+    # from the primary key alone. A placeholder never overwrites a real
+    # day, matching the Mongo upserts.
+    max_symbols_per_query = 500
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS asset_prices ('
+                'symbol TEXT NOT NULL, date TEXT NOT NULL, open REAL, '
+                'high REAL, low REAL, close REAL, volume INTEGER, '
+                'source TEXT, placeholder INTEGER NOT NULL, '
+                'PRIMARY KEY (symbol, date)) WITHOUT ROWID')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS currency_rates ('
+                'first_symbol TEXT NOT NULL, second_symbol TEXT NOT NULL, '
+                'date TEXT NOT NULL, rate REAL, inverse REAL, source TEXT, '
+                'placeholder INTEGER NOT NULL, '
+                'PRIMARY KEY (first_symbol, second_symbol, date)) '
+                'WITHOUT ROWID')
+
+    @staticmethod
+    def format_date(value):
+        return value.strftime('%Y-%m-%dT%H:%M:%S')
+
+    @staticmethod
+    def parse_date(value):
+        return datetime.fromisoformat(value)
+
+    def add_date_range(self, sql, parameters, start_date, end_date):
+        if start_date is not None:
+            sql += ' AND date >= ?'
+            parameters.append(self.format_date(start_date))
+        if end_date is not None:
+            sql += ' AND date <= ?'
+            parameters.append(self.format_date(end_date))
+        return sql, parameters
+
+    def _query(self, sql, parameters):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def asset_prices_sql(self, symbols, start_date, end_date):
+        sql, parameters = self.add_date_range(
+            'SELECT symbol, date, ' + ', '.join(asset_fields) +
+            ', source, placeholder FROM asset_prices WHERE symbol IN (' +
+            ', '.join('?' * len(symbols)) + ')',
+            list(symbols), start_date, end_date)
+        return sql + ' ORDER BY symbol, date', parameters
+
+    def currency_rates_sql(self, symbols, start_date, end_date):
+        sql, parameters = self.add_date_range(
+            'SELECT date, rate, inverse, source, placeholder '
+            'FROM currency_rates WHERE first_symbol = ? AND '
+            'second_symbol = ?', list(symbols), start_date, end_date)
+        return sql + ' ORDER BY date', parameters
+
+    @staticmethod
+    def with_metadata(record, row, include_metadata):
+        if include_metadata:
+            record['_source'] = row[-2]
+            record['_placeholer'] = bool(row[-1])
+        return record
+
+    def find_asset_prices(self, symbols, start_date=None, end_date=None,
+                          include_metadata=False):
+        symbols = list(symbols)
+        rows = []
+        # stay within SQLite's limit on bound parameters
+        for offset in range(0, len(symbols), self.max_symbols_per_query):
+            rows += self._query(*self.asset_prices_sql(
+                symbols[offset:offset + self.max_symbols_per_query],
+                start_date, end_date))
+        return [
+            self.with_metadata(
+                dict(zip(asset_fields, row[2:7]), symbol=row[0],
+                     date=self.parse_date(row[1])),
+                row, include_metadata)
+            for row in rows
+        ]
+
+    def find_currency_rates(self, symbols, start_date=None, end_date=None,
+                            include_metadata=False):
+        symbols = list(symbols)
+        return [
+            self.with_metadata(
+                {'symbols': symbols, 'date': self.parse_date(row[0]),
+                 'rate': row[1], 'inverse': row[2]},
+                row, include_metadata)
+            for row in self._query(*self.currency_rates_sql(
+                symbols, start_date, end_date))
+        ]
+
+    def _upsert(self, sql, rows):
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.executemany(sql, rows)
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    @staticmethod
+    def upsert_sql(table, key_columns, value_columns):
+        columns = key_columns + value_columns + ['source', 'placeholder']
+        return (
+            'INSERT INTO {table} ({columns}) VALUES ({values}) '
+            'ON CONFLICT ({keys}) DO UPDATE SET {updates} '
+            # avoid overwritting a day that isn't missing with one that is
+            'WHERE excluded.placeholder = 0 OR {table}.placeholder = 1'
+        ).format(
+            table=table, columns=', '.join(columns),
+            values=', '.join('?' * len(columns)),
+            keys=', '.join(key_columns),
+            updates=', '.join(
+                '{0} = excluded.{0}'.format(column)
+                for column in value_columns + ['source', 'placeholder']))
+
+    def upsert_asset_prices(self, records):
+        self._upsert(
+            self.upsert_sql('asset_prices', ['symbol', 'date'], asset_fields),
+            [
+                [record['symbol'], self.format_date(record['date'])] +
+                [record[field] for field in asset_fields] +
+                [record['_source'], int(record['_placeholer'])]
+                for record in records
+            ])
+
+    def upsert_currency_rates(self, records):
+        self._upsert(
+            self.upsert_sql(
+                'currency_rates', ['first_symbol', 'second_symbol', 'date'],
+                rate_fields),
+            [
+                list(record['symbols']) + [self.format_date(record['date'])] +
+                [record[field] for field in rate_fields] +
+                [record['_source'], int(record['_placeholer'])]
+                for record in records
+            ])
+
+    def explain(self):
+        # the query plan of every query pattern the cache issues
+        day = datetime(2000, 1, 3)
+        patterns = [
+            ['asset prices, one symbol',
+             self.asset_prices_sql(['A'], day, day)],
+            ['asset prices, many symbols',
+             self.asset_prices_sql(['A', 'B'], day, day)],
+            ['currency rates',
+             self.currency_rates_sql(['A', 'B'], day, day)],
+        ]
+        return [
+            [name, ' > '.join(
+                row[-1] for row in self._query(
+                    'EXPLAIN QUERY PLAN ' + sql, parameters))]
+            for name, (sql, parameters) in patterns
+        ]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
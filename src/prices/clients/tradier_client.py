@@ -1,9 +1,9 @@
-import json
-import http.client
 import pandas as pd
+import requests
 from datetime import datetime
 from .helpers import log_client_fetch_error, asset_record_keys, \
-    asset_columns_map
+    asset_columns_map, ProviderError, check_provider_status
+from .http_sessions import PooledSession
 
 
 class TradierClient:
@@ -14,21 +14,32 @@ class TradierClient:
         '&end={end:%Y-%m-%d}'
     )
 
-    def __init__(self, access_token):
+    def __init__(self, access_token, host='sandbox.tradier.com', port=443,
+                 secure=True, session=None):
         self.access_token = access_token
+        self.host = host
+        self.port = port
+        self.secure = secure
+        self.session = session if session is not None else PooledSession()
+
+    def base_url(self):
+        return '{scheme}://{host}:{port}'.format(
+            scheme='https' if self.secure else 'http',
+            host=self.host, port=self.port)
 
     def fetch_history(self, symbol, start_date, end_date):
-        connection = http.client.HTTPSConnection(
-            'sandbox.tradier.com', 443, timeout=30)
         headers = {'Accept': 'application/json',
                    'Authorization': 'Bearer ' + self.access_token}
         try:
             url = self.query_format.format(
                 symbol=symbol, start=start_date, end=end_date)
-            connection.request('GET', url, None, headers)
-            response = connection.getresponse()
-            history = json.loads(
-                response.read().decode("utf-8"))['history']
+            try:
+                response = self.session.get(
+                    self.base_url() + url, headers=headers)
+            except requests.RequestException as error:
+                raise ProviderError(str(error)) from error
+            check_provider_status(response.status_code)
+            history = response.json()['history']
 
             if history is None:
                 raise LookupError
@@ -47,5 +58,8 @@ class TradierClient:
 
             return result
 
-        except (http.client.HTTPException, LookupError):
+        except ProviderError:
+            log_client_fetch_error('tradier', symbol, start_date, end_date)
+            raise
+        except (ValueError, LookupError):
             log_client_fetch_error('tradier', symbol, start_date, end_date)
@@ -0,0 +1,251 @@
+import atexit
+import logging
+import threading
+import time
+
+metadata_fields = ['_source', '_placeholer']
+logger = logging.getLogger('portfolio_tracker.prices.cache')
+
+
+class WriteBehindStorage:
+    # Wraps a cache storage so that upserts return as soon as the records
+    # are queued. A background worker coalesces queued records by key and
+    # writes them in batches of up to batch_size once that many are queued
+    # or the oldest has waited flush_interval seconds. Upserts block while
+    # max_pending records are queued or being written. Reads merge in the
+    # records that haven't been written yet. A batch that fails to write is
+    # queued again and retried flush_interval later; the error is raised by
+    # the next flush or close.
+    kinds = ['asset_prices', 'currency_rates']
+
+    def __init__(self, storage, batch_size=5000, flush_interval=0.5,
+                 max_pending=100000):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # kind -> group (symbol or pair of symbols) -> date -> record
+        self.pending = dict([[kind, {}] for kind in self.kinds])
+        self.in_flight = dict([[kind, {}] for kind in self.kinds])
+        self.num_pending = 0
+        self.num_in_flight = 0
+        self.oldest_pending = None
+        self.retry_at = None
+        self.error = None
+        self.flushing = False
+        self.closed = False
+        self.condition = threading.Condition()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def group(record):
+        if 'symbol' in record:
+            return record['symbol']
+        return tuple(record['symbols'])
+
+    @staticmethod
+    def overlay(records, pending):
+        # as the storage upserts do, a placeholder never replaces a real day
+        for date, record in pending.items():
+            if not record['_placeholer'] or date not in records:
+                records[date] = record
+
+    def _enqueue(self, kind, records):
+        records = list(records)
+        with self.condition:
+            while (self.num_pending + self.num_in_flight >= self.max_pending
+                   and not self.closed):
+                self.condition.wait()
+            if self.closed:
+                raise RuntimeError('Write-behind cache storage is closed')
+            for record in records:
+                days = self.pending[kind].setdefault(self.group(record), {})
+                if record['date'] not in days:
+                    self.num_pending += 1
+                self.overlay(days, {record['date']: record})
+            if self.oldest_pending is None and self.num_pending:
+                self.oldest_pending = time.monotonic()
+            self.condition.notify_all()
+
+    def upsert_asset_prices(self, records):
+        self._enqueue('asset_prices', records)
+
+    def upsert_currency_rates(self, records):
+        self._enqueue('currency_rates', records)
+
+    def _take_batch(self):
+        # moves up to batch_size queued records of one kind to in_flight
+        for kind in self.kinds:
+            batch = []
+            pending = self.pending[kind]
+            while pending and len(batch) < self.batch_size:
+                group = next(iter(pending))
+                days = pending.pop(group)
+                self.in_flight[kind][group] = days
+                batch += days.values()
+            if batch:
+                self.num_pending -= len(batch)
+                self.num_in_flight += len(batch)
+                if not self.num_pending:
+                    self.oldest_pending = None
+                return kind, batch
+        return None, []
+
+    def _requeue(self, kind):
+        # puts a failed batch back, behind anything queued for the same days
+        # since it was taken
+        for group, days in self.in_flight[kind].items():
+            queued = self.pending[kind].setdefault(group, {})
+            for date, record in days.items():
+                if date not in queued:
+                    queued[date] = record
+                    self.num_pending += 1
+        if self.num_pending and self.oldest_pending is None:
+            self.oldest_pending = time.monotonic()
+
+    def _should_write(self):
+        if not self.num_pending:
+            return False
+        if self.closed:
+            return True
+        if self.retry_at is not None:
+            return time.monotonic() >= self.retry_at
+        return (
+            self.num_pending >= self.batch_size or self.flushing or
+            time.monotonic() - self.oldest_pending >= self.flush_interval)
+
+    def _wait_timeout(self):
+        if self.retry_at is not None:
+            return max(0, self.retry_at - time.monotonic())
+        if self.oldest_pending is not None:
+            return max(0, self.flush_interval - (
+                time.monotonic() - self.oldest_pending))
+        return None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self._should_write():
+                    if self.closed:
+                        return
+                    self.condition.wait(self._wait_timeout())
+                kind, batch = self._take_batch()
+            error = None
+            try:
+                getattr(self.storage, 'upsert_' + kind)(batch)
+            except Exception as write_error:
+                error = write_error
+                logger.error(
+                    'Error writing %d cached %s records: %s',
+                    len(batch), kind, error,
+                    extra={'kind': kind, 'records': len(batch)})
+            with self.condition:
+                if error is None:
+                    self.retry_at = None
+                else:
+                    self.error = error
+                    self._requeue(kind)
+                    self.retry_at = time.monotonic() + self.flush_interval
+                self.in_flight[kind] = {}
+                self.num_in_flight -= len(batch)
+                self.condition.notify_all()
+                if error is not None and self.closed:
+                    # closing gets a last attempt only
+                    return
+
+    def flush(self):
+        # blocks until everything queued so far has been written, or raises
+        # the error of a write that failed (its records stay queued)
+        with self.condition:
+            self.error = None
+            self.flushing = True
+            self.condition.notify_all()
+            try:
+                while ((self.num_pending or self.num_in_flight) and
+                       self.error is None):
+                    self.condition.wait()
+            finally:
+                self.flushing = False
+            if self.error is not None:
+                error, self.error = self.error, None
+                raise error
+
+    def close(self):
+        # writes what's queued and closes the wrapped storage, raising if
+        # some records couldn't be written
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.worker.join()
+        close = getattr(self.storage, 'close', None)
+        try:
+            with self.condition:
+                if self.num_pending:
+                    raise RuntimeError(
+                        '{} cached records were not written'.format(
+                            self.num_pending)) from self.error
+        finally:
+            if close is not None:
+                close()
+
+    def _unwritten(self, kind, groups, start_date, end_date):
+        # a copy of the queued and in flight records of the groups, taken
+        # before the storage is read: a batch written in between is then in
+        # the storage or the copy (or both) rather than in neither
+        with self.condition:
+            unwritten = [
+                [group, dict([
+                    [date, record] for date, record in source[group].items()
+                    if (start_date is None or date >= start_date) and
+                    (end_date is None or date <= end_date)
+                ])]
+                for source in [self.in_flight[kind], self.pending[kind]]
+                for group in groups if group in source
+            ]
+        return [[group, days] for group, days in unwritten if days]
+
+    def _merge_unwritten(self, records, unwritten, include_metadata):
+        if not unwritten:
+            return records
+        by_group = {}
+        for record in records:
+            by_group.setdefault(self.group(record), {})[
+                record['date']] = record
+        for group, days in unwritten:
+            self.overlay(by_group.setdefault(group, {}), days)
+        return [
+            dict([
+                [field, value] for field, value in record.items()
+                if include_metadata or field not in metadata_fields
+            ])
+            for group in by_group
+            for date, record in sorted(by_group[group].items())
+        ]
+
+    def find_asset_prices(self, symbols, start_date=None, end_date=None,
+                          include_metadata=False):
+        symbols = list(symbols)
+        unwritten = self._unwritten(
+            'asset_prices', set(symbols), start_date, end_date)
+        return self._merge_unwritten(
+            list(self.storage.find_asset_prices(
+                symbols, start_date, end_date, include_metadata)),
+            unwritten, include_metadata)
+
+    def find_currency_rates(self, symbols, start_date=None, end_date=None,
+                            include_metadata=False):
+        symbols = list(symbols)
+        unwritten = self._unwritten(
+            'currency_rates', set([tuple(symbols)]), start_date, end_date)
+        return self._merge_unwritten(
+            list(self.storage.find_currency_rates(
+                symbols, start_date, end_date, include_metadata)),
+            unwritten, include_metadata)
+
+    def __getattr__(self, name):
+        # everything else (explain, ...) passes through
+        return getattr(self.storage, name)
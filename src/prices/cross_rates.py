@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+import numpy as np
+import pandas as pd
+
+
+class RateMatrix:
+    # The rates between every pair of a set of currencies on each date:
+    # rates[d, i, j] is the amount of currencies[j] one currencies[i] buys
+
+    def __init__(self, dates, currencies, rates):
+        self.dates = dates
+        self.currencies = list(currencies)
+        self.rates = rates
+        self.positions = dict([
+            [currency, i] for i, currency in enumerate(self.currencies)])
+        self.size = rates.nbytes
+
+    @classmethod
+    def from_pivot_rates(self, pivot_rates):
+        # pivot_rates has one column per currency, the amount of it one pivot
+        # buys (ones for the pivot itself); rate(a, b) = pivot(b) / pivot(a)
+        values = pivot_rates.to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = values[:, np.newaxis, :] / values[:, :, np.newaxis]
+        return self(pivot_rates.index, pivot_rates.columns, rates)
+
+    def select(self, currencies, start_date, end_date):
+        rows = self.dates.slice_indexer(start_date, end_date)
+        columns = [self.positions[currency] for currency in currencies]
+        return RateMatrix(
+            self.dates[rows], currencies,
+            self.rates[rows][:, columns][:, :, columns])
+
+    def rates_from(self, base_currency, currencies=None):
+        # a frame of the amount of each currency one base_currency buys
+        if currencies is None:
+            currencies = self.currencies
+        return pd.DataFrame(
+            self.rates[:, self.positions[base_currency], [
+                self.positions[currency] for currency in currencies]],
+            index=self.dates, columns=list(currencies))
+
+
+class CrossRates:
+    # Derives the rates between any currencies from one series per currency
+    # against a pivot currency, so N currencies take N series rather than a
+    # series per pair. Fixer fetches and caches every rate against a base at
+    # once, so the pivot series mostly come from a single upstream fetch.
+    # Derived matrices are kept in an LRU of up to max_bytes; a request for
+    # fewer currencies or a shorter range than a kept matrix is served from
+    # it. Matrices reaching into the last recent_days expire after ttl
+    # seconds, like the memory cache's frames.
+
+    def __init__(self, fetch_rates, pivot_currency='EUR', max_bytes=64 << 20,
+                 ttl=300, recent_days=7):
+        self.fetch_rates = fetch_rates
+        self.pivot_currency = pivot_currency
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.recent_days = recent_days
+        # (currencies, start_date, end_date) -> (matrix, expires_at)
+        self.matrices = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = dict([
+            [name, 0] for name in ['hits', 'misses', 'evictions']])
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.matrices),
+                        bytes=self.size)
+
+    def clear(self):
+        with self.lock:
+            self.matrices.clear()
+            self.size = 0
+
+    def pivot_rates(self, currencies, start_date, end_date):
+        # one column per currency on the union of the dates of the series
+        series = [
+            self.fetch_rates(
+                self.pivot_currency, currency, start_date, end_date)[currency]
+            for currency in currencies if currency != self.pivot_currency
+        ]
+        if series:
+            result = pd.concat(series, axis=1)
+            result.index = pd.DatetimeIndex(result.index)
+            result = result.sort_index()
+        else:
+            result = pd.DataFrame(index=pd.date_range(start_date, end_date))
+        result[self.pivot_currency] = 1.0
+        return result[currencies].astype(float)
+
+    def _lookup(self, currencies, start_date, end_date):
+        now = time.monotonic()
+        with self.lock:
+            for key, (matrix, expires_at) in list(self.matrices.items()):
+                if expires_at is not None and expires_at <= now:
+                    self._discard(key)
+                    continue
+                kept_currencies, kept_start, kept_end = key
+                if (kept_start <= start_date and end_date <= kept_end and
+                        set(currencies) <= set(kept_currencies)):
+                    self.matrices.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return matrix
+            self.counters['misses'] += 1
+
+    def _discard(self, key):
+        matrix, expires_at = self.matrices.pop(key)
+        self.size -= matrix.size
+
+    def _expires_at(self, end_date):
+        today = datetime.combine(date.today(), datetime.min.time())
+        if end_date < today - timedelta(days=self.recent_days):
+            return None
+        return time.monotonic() + self.ttl
+
+    def _store(self, key, matrix):
+        if matrix.size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.matrices:
+                self._discard(key)
+            self.matrices[key] = (matrix, self._expires_at(key[2]))
+            self.size += matrix.size
+            while self.size > self.max_bytes:
+                self._discard(next(iter(self.matrices)))
+                self.counters['evictions'] += 1
+
+    def matrix(self, currencies, start_date, end_date):
+        currencies = list(dict.fromkeys(currencies))
+        kept = self._lookup(currencies, start_date, end_date)
+        if kept is not None:
+            return kept.select(currencies, start_date, end_date)
+        matrix = RateMatrix.from_pivot_rates(
+            self.pivot_rates(currencies, start_date, end_date))
+        self._store((tuple(currencies), start_date, end_date), matrix)
+        return matrix
+
+    def rates(self, base_currency, currencies, start_date, end_date):
+        return self.matrix(
+            [base_currency] + list(currencies), start_date, end_date
+        ).rates_from(base_currency, currencies)
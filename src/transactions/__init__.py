@@ -1,9 +1,14 @@
 import math
-import json
 from datetime import date
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from updates import Updates
+from columnar_updates import ColumnarUpdates
+from incremental_updates import IncrementalUpdates
+from ledger_reader import iter_ledger_batches
+from snapshots import LedgerSnapshot
+from metrics import metrics
 
 
 class Transactions:
@@ -11,19 +16,107 @@ class Transactions:
         'Type', 'Date', 'Asset', 'Quantity', 'Price', 'Price Factor',
         'Asset Currency', 'Exchange Rate', 'Base Currency', 'Fee',
         'Fee Currency', 'Notes']
-    transactions = None
+    updates = None
     transaction_defaults = {
         'Price Factor': 1,
         'Exchange Rate': 1,
         'Fee': 0,
         'Notes': ''
     }
+    categorical_columns = [
+        'Type', 'Asset', 'Asset Currency', 'Base Currency', 'Fee Currency']
+    numeric_columns = [
+        'Quantity', 'Price', 'Price Factor', 'Exchange Rate', 'Fee']
 
-    def load_file(self, path):
-        data = json.load(open(path))
-        self.transactions = pd.DataFrame(
+    _transactions = None
+    # frames added with add_transactions, merged into transactions only when
+    # it's next read, so appending doesn't copy the whole ledger each time
+    appended = ()
+
+    @property
+    def transactions(self):
+        if self.appended:
+            self._transactions = self.concat_transactions_frames(
+                [self._transactions] + self.appended
+                if self._transactions is not None else self.appended)
+            self.appended = ()
+        return self._transactions
+
+    @transactions.setter
+    def transactions(self, transactions):
+        self._transactions = transactions
+        self.appended = ()
+
+    def load_file(self, path, batch_size=20000, incremental=False):
+        # Parses the ledger in batches of records, so the raw records are
+        # never all in memory at once. With incremental updates each batch
+        # is also fed into the holdings as soon as it is parsed.
+        if incremental:
+            self.updates = IncrementalUpdates()
+        batches = []
+        with metrics.timer('ledger_load_seconds'):
+            for records in iter_ledger_batches(path, batch_size):
+                batch = self.create_typed_transactions_frame(records)
+                if incremental:
+                    with metrics.timer(
+                            'updates_build_seconds', kind='append'):
+                        self.updates.append(batch)
+                batches.append(batch)
+            self.transactions = self.concat_transactions_frames(batches)
+
+    def load_file_with_snapshot(self, path, snapshot_dir):
+        # Reuses the memory mapped snapshot in snapshot_dir while the ledger
+        # file is unchanged, otherwise rebuilds and rewrites the snapshot.
+        snapshot = LedgerSnapshot(snapshot_dir)
+        if snapshot.is_current(path):
+            self.transactions = snapshot.load_transactions()
+            self.updates = snapshot.load_updates()
+            return
+        self.load_file(path)
+        self.compute_updates()
+        snapshot.save(path, self.transactions, self.updates)
+
+    def create_transactions_frame(self, data):
+        return pd.DataFrame(
             data, columns=self.transaction_columns
         ).fillna(value=self.transaction_defaults)
 
-    def compute_updates(self):
-        self.updates = Updates(self.transactions)
+    def create_typed_transactions_frame(self, data):
+        result = self.create_transactions_frame(data)
+        result['Date'] = pd.to_datetime(result['Date'])
+        for column in self.numeric_columns:
+            result[column] = result[column].astype('float64')
+        for column in self.categorical_columns:
+            result[column] = result[column].astype('category')
+        # copy so the object block holding the raw strings is released
+        return result.copy()
+
+    def concat_transactions_frames(self, frames):
+        if not frames:
+            return self.create_typed_transactions_frame([])
+        result = pd.concat(frames, ignore_index=True)
+        for column in self.categorical_columns:
+            result[column] = union_categoricals(
+                [frame[column] for frame in frames])
+        return result
+
+    def compute_updates(self, incremental=False):
+        with metrics.timer(
+                'updates_build_seconds',
+                kind='incremental' if incremental else 'columnar'):
+            if incremental:
+                self.updates = IncrementalUpdates(self.transactions)
+            else:
+                self.updates = ColumnarUpdates(self.transactions)
+
+    def add_transactions(self, data):
+        # with incremental updates only the new transactions are processed
+        new_transactions = self.create_typed_transactions_frame(data)
+        if not self.appended:
+            self.appended = []
+        self.appended.append(new_transactions)
+        if isinstance(self.updates, IncrementalUpdates):
+            with metrics.timer('updates_build_seconds', kind='append'):
+                self.updates.append(new_transactions)
+        elif self.updates is not None:
+            self.compute_updates()
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+from updates import Updates
+
+
+class ColumnarUpdates(Updates):
+    # Computes the same per asset updates as Updates, but on whole columns:
+    # each transaction is expanded into up to three update slots
+    # (asset, base cash, fee cash), each slot carrying signed deltas which are
+    # accumulated per symbol in emission order.
+    deposit_types = ['Deposit', 'Payment']
+    withdrawal_types = ['Withdrawal', 'Fee']
+    purchase_types = ['Purchase']
+    sale_types = ['Sale']
+    slots_per_transaction = 3
+
+    def __init__(self, transactions):
+        self.holdings = {}
+        self.asset_currencies = {}
+        self.updates = self._compute_updates(transactions)
+
+    @staticmethod
+    def _numeric_column(column):
+        values = pd.to_numeric(column)
+        is_int = values.dtype.kind in 'iub'
+        return values.to_numpy(dtype=float), is_int
+
+    @staticmethod
+    def _date_column(column):
+        if column.dtype.kind == 'M':
+            return column.to_numpy()
+        return column.astype(object).to_numpy(dtype=object)
+
+    @staticmethod
+    def _object_column(column):
+        return column.astype(object).to_numpy(dtype=object)
+
+    def _cash_symbols(self, currencies, mask):
+        symbols = np.full(len(currencies), None, dtype=object)
+        symbols[mask] = self.cash_prefix + currencies[mask].astype(str)
+        return symbols
+
+    def _expand_slots(self, transactions):
+        n = len(transactions)
+        type_codes, type_names = pd.factorize(transactions['Type'])
+
+        def is_type(names):
+            return np.isin(type_names, names)[type_codes]
+
+        known_types = (self.deposit_types + self.withdrawal_types +
+                       self.purchase_types + self.sale_types)
+        unknown = ~is_type(known_types)
+        if unknown.any():
+            raise Exception(
+                'Unknown transaction type',
+                transactions['Type'].iloc[np.argmax(unknown)])
+
+        dates = self._date_column(transactions['Date'])
+        assets = self._object_column(transactions['Asset'])
+        asset_currency = self._object_column(transactions['Asset Currency'])
+        base_currency = self._object_column(transactions['Base Currency'])
+        fee_currency = self._object_column(transactions['Fee Currency'])
+        quantity, quantity_int = self._numeric_column(transactions['Quantity'])
+        price, price_int = self._numeric_column(transactions['Price'])
+        factor, factor_int = self._numeric_column(
+            transactions['Price Factor'])
+        rate, rate_int = self._numeric_column(transactions['Exchange Rate'])
+        fee, fee_int = self._numeric_column(transactions['Fee'])
+
+        is_cash = is_type(self.cash_trasaction_types)
+        asset_symbols = assets.copy()
+        asset_symbols[is_cash] = self.cash_prefix + assets[is_cash].astype(str)
+
+        has_fee = fee > 0
+        fee_symbols = self._cash_symbols(fee_currency, has_fee)
+        has_base = pd.notnull(base_currency)
+        base_symbols = self._cash_symbols(base_currency, has_base)
+
+        converted = has_base & (base_currency != asset_currency)
+        exchange_rate = np.where(converted, rate, 1.0)
+        exchange_rate_int = ~converted | rate_int
+
+        is_deposit = is_type(self.deposit_types)
+        is_withdrawal = is_type(self.withdrawal_types)
+        is_purchase = is_type(self.purchase_types)
+        is_sale = is_type(self.sale_types)
+        is_cash_move = is_deposit | is_withdrawal
+        is_trade = is_purchase | is_sale
+
+        fee_on_asset = has_fee & (fee_symbols == asset_symbols)
+        fee_on_base = has_base & has_fee & (fee_symbols == base_symbols)
+        asset_sign = np.where(is_deposit | is_purchase, 1.0, -1.0)
+        amount = quantity * price * factor * exchange_rate
+        amount_int = quantity_int & price_int & factor_int & exchange_rate_int
+
+        shape = (n, self.slots_per_transaction)
+        valid = np.zeros(shape, dtype=bool)
+        symbols = np.full(shape, None, dtype=object)
+        deltas = np.full(shape + (2,), -0.0)
+        quantity_ints = np.ones(shape, dtype=bool)
+        prices = np.ones(shape)
+        price_ints = np.ones(shape, dtype=bool)
+        factors = np.ones(shape)
+        factor_ints = np.ones(shape, dtype=bool)
+        rates = np.ones(shape)
+        rate_ints = np.ones(shape, dtype=bool)
+        bases = np.full(shape, None, dtype=object)
+
+        def fill(slot, mask, symbol, first, second=None, first_int=True,
+                 second_int=True):
+            valid[mask, slot] = True
+            symbols[mask, slot] = symbol[mask]
+            deltas[mask, slot, 0] = first[mask]
+            if second is not None:
+                deltas[mask, slot, 1] = second[mask]
+            quantity_ints[mask, slot] = (
+                np.broadcast_to(first_int, n)[mask] &
+                np.broadcast_to(second_int, n)[mask])
+
+        # Deposit, Payment, Withdrawal and Fee: [fee cash, asset]
+        separate_fee = is_cash_move & has_fee & ~fee_on_asset
+        fill(0, separate_fee, fee_symbols, -fee, first_int=fee_int)
+        asset_fee = np.where(fee_on_asset, -fee, -0.0)
+        fill(1, is_cash_move, asset_symbols, asset_sign * quantity,
+             asset_fee, first_int=quantity_int,
+             second_int=~fee_on_asset | fee_int)
+
+        # Purchase and Sale: [asset, base cash (+ fee), fee cash]
+        fill(0, is_trade, asset_symbols, asset_sign * quantity,
+             first_int=quantity_int)
+        prices[is_trade, 0] = price[is_trade]
+        price_ints[is_trade, 0] = price_int
+        factors[is_trade, 0] = factor[is_trade]
+        factor_ints[is_trade, 0] = factor_int
+        rates[is_trade, 0] = exchange_rate[is_trade]
+        rate_ints[is_trade, 0] = exchange_rate_int[is_trade]
+        bases[is_trade, 0] = base_currency[is_trade]
+
+        base_mask = is_trade & has_base
+        fill(1, base_mask, base_symbols, -asset_sign * amount,
+             np.where(fee_on_base, -fee, -0.0), first_int=amount_int,
+             second_int=~fee_on_base | fee_int)
+        trade_fee = is_trade & has_fee & ~fee_on_base
+        fill(2, trade_fee, fee_symbols, -fee, first_int=fee_int)
+        for slot, mask in [(1, base_mask), (2, trade_fee)]:
+            factors[mask, slot] = factor[mask]
+            factor_ints[mask, slot] = factor_int
+
+        flat = valid.ravel()
+        rows = np.repeat(np.arange(n), self.slots_per_transaction)[flat]
+        return {
+            'asset_symbols': asset_symbols,
+            'asset_currency': asset_currency,
+            'rows': rows,
+            'dates': dates[rows],
+            'symbols': symbols.ravel()[flat],
+            'deltas': deltas.reshape(-1, 2)[flat],
+            'quantity_int': quantity_ints.ravel()[flat],
+            'Price': (prices.ravel()[flat], price_ints.ravel()[flat]),
+            'Price Factor': (factors.ravel()[flat], factor_ints.ravel()[flat]),
+            'Exchange Rate': (rates.ravel()[flat], rate_ints.ravel()[flat]),
+            'Base Currency': bases.ravel()[flat],
+        }
+
+    def _symbol_codes(self, slots):
+        asset_codes, symbols = pd.factorize(slots['asset_symbols'])
+        codes = pd.Index(symbols).get_indexer(slots['symbols'])
+        first_rows = np.full(len(symbols), len(asset_codes))
+        np.minimum.at(first_rows, asset_codes, np.arange(len(asset_codes)))
+        # mirror Updates, which can only append to holdings of symbols that
+        # have already appeared as the asset of a transaction
+        unknown = (codes < 0) | (
+            first_rows[np.maximum(codes, 0)] > slots['rows'])
+        if unknown.any():
+            raise KeyError(slots['symbols'][np.argmax(unknown)])
+        last_rows = np.zeros(len(symbols), dtype=int)
+        np.maximum.at(last_rows, asset_codes, np.arange(len(asset_codes)))
+        currencies = slots['asset_currency'][last_rows]
+        return codes, list(symbols), currencies
+
+    @staticmethod
+    def _typed(values, ints):
+        if ints.all():
+            return values.astype('int64')
+        return values
+
+    def _compute_updates(self, transactions):
+        if len(transactions) == 0:
+            return {}
+        slots = self._expand_slots(transactions)
+        codes, symbols, currencies = self._symbol_codes(slots)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(symbols) + 1))
+        deltas = slots['deltas'][order]
+        updates = {}
+        for code, symbol in enumerate(symbols):
+            self.asset_currencies[symbol] = currencies[code]
+            index = order[bounds[code]:bounds[code + 1]]
+            quantity = np.add.accumulate(
+                deltas[bounds[code]:bounds[code + 1]].ravel())[1::2]
+            updates[symbol] = {
+                'asset_currency': currencies[code],
+                'updates': self._create_columnar_df(
+                    slots, index, quantity)
+            }
+        return updates
+
+    def _create_columnar_df(self, slots, index, quantity):
+        return self._updates_df(
+            slots['dates'][index],
+            (quantity, slots['quantity_int'][index]),
+            *[
+                (slots[column][0][index], slots[column][1][index])
+                for column in ['Price', 'Price Factor', 'Exchange Rate']
+            ],
+            slots['Base Currency'][index])
+
+    def _updates_df(self, dates, quantity, price, factor, rate, base,
+                    copy=True):
+        # without copy the frame keeps the given arrays (e.g. memory mapped
+        # ones) where their dtype is kept
+        result = pd.DataFrame({
+            'Date': dates,
+            'Quantity': self._typed(*quantity),
+            'Price': self._typed(*price),
+            'Price Factor': self._typed(*factor),
+            'Exchange Rate': self._typed(*rate),
+            'Base Currency': base
+        }, columns=self.updates_columns, copy=copy)
+        result['Date'] = result['Date'].infer_objects()
+        result['Base Currency'] = result['Base Currency'].infer_objects()
+        result.set_index('Date', inplace=True)
+        return result
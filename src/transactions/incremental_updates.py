@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+from columnar_updates import ColumnarUpdates
+
+
+class SymbolHoldings:
+    # Growable per symbol buffer of update slots kept in (date, sequence)
+    # order, so that appends cost O(change) and back-dated inserts only
+    # rewrite the tail after the insertion point.
+    object_fields = ['base']
+    float_fields = ['delta', 'quantity', 'price', 'factor', 'rate']
+    bool_fields = ['quantity_int', 'price_int', 'factor_int', 'rate_int']
+    initial_capacity = 16
+
+    def __init__(self, asset_currency, first_key, date_dtype=object):
+        self.date_dtype = date_dtype
+        self.asset_currency = asset_currency
+        self.currency_key = first_key
+        self.first_key = first_key
+        self.size = 0
+        self.arrays = {}
+        self._allocate(self.initial_capacity)
+
+    def _allocate(self, capacity):
+        arrays = {'date': np.empty(capacity, dtype=self.date_dtype)}
+        for field in self.object_fields:
+            arrays[field] = np.full(capacity, None, dtype=object)
+        for field in self.float_fields:
+            shape = (capacity, 2) if field == 'delta' else capacity
+            arrays[field] = np.zeros(shape)
+        for field in self.bool_fields:
+            arrays[field] = np.ones(capacity, dtype=bool)
+        arrays['sequence'] = np.zeros(capacity, dtype='int64')
+        for field, values in self.arrays.items():
+            arrays[field][:self.size] = values[:self.size]
+        self.arrays = arrays
+
+    def view(self, field, start=0):
+        return self.arrays[field][start:self.size]
+
+    def latest_quantity(self, position=None):
+        if position is None:
+            position = self.size
+        if position == 0:
+            return 0.0
+        return self.arrays['quantity'][position - 1]
+
+    def insert_position(self, first_date):
+        return int(np.searchsorted(
+            self.view('date'), first_date, side='right'))
+
+    def replace_tail(self, position, slots):
+        # slots must already be ordered and their quantities accumulated
+        num_slots = len(slots['sequence'])
+        required = position + num_slots
+        if required > len(self.arrays['sequence']):
+            self._allocate(max(required, 2 * len(self.arrays['sequence'])))
+        for field, values in slots.items():
+            self.arrays[field][position:required] = values
+        self.size = required
+
+
+class IncrementalUpdates(ColumnarUpdates):
+    # Keeps running holdings per symbol so that new transactions only cost as
+    # much as the change. Updates are ordered by date (ties keep arrival
+    # order), so for a date ordered ledger the result is the same as
+    # ColumnarUpdates. Back-dated transactions rewrite only the affected
+    # symbols from the affected date forward.
+
+    def __init__(self, transactions=None):
+        self.holdings = {}
+        self.asset_currencies = {}
+        self.checkpoint = None
+        self.next_sequence = 0
+        self._frames = {}
+        if transactions is not None:
+            self.append(transactions)
+
+    @property
+    def updates(self):
+        symbols = sorted(
+            self.holdings, key=lambda symbol: self.holdings[symbol].first_key)
+        return dict([
+            [symbol, {
+                'asset_currency': self.holdings[symbol].asset_currency,
+                'updates': self._symbol_frame(symbol)
+            }]
+            for symbol in symbols
+        ])
+
+    def latest_quantities(self):
+        return dict([
+            [symbol, holdings.latest_quantity()]
+            for symbol, holdings in self.holdings.items()
+        ])
+
+    def append(self, transactions):
+        if len(transactions) == 0:
+            return []
+        slots = self._expand_slots(transactions)
+        sequence = self.next_sequence + slots['rows']
+        self._register_assets(slots)
+        self.next_sequence += len(transactions)
+
+        codes, symbols = pd.factorize(slots['symbols'])
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(symbols) + 1))
+        for code, symbol in enumerate(symbols):
+            index = order[bounds[code]:bounds[code + 1]]
+            self._merge_symbol_slots(symbol, {
+                'date': slots['dates'][index],
+                'sequence': sequence[index],
+                'delta': slots['deltas'][index],
+                'quantity_int': slots['quantity_int'][index],
+                'price': slots['Price'][0][index],
+                'price_int': slots['Price'][1][index],
+                'factor': slots['Price Factor'][0][index],
+                'factor_int': slots['Price Factor'][1][index],
+                'rate': slots['Exchange Rate'][0][index],
+                'rate_int': slots['Exchange Rate'][1][index],
+                'base': slots['Base Currency'][index],
+            })
+            self._frames.pop(symbol, None)
+
+        latest = slots['dates'].max()
+        if self.checkpoint is None or latest > self.checkpoint:
+            self.checkpoint = latest
+        return list(symbols)
+
+    def _register_assets(self, slots):
+        asset_symbols = slots['asset_symbols']
+        asset_dates = np.empty(
+            len(asset_symbols), dtype=slots['dates'].dtype)
+        asset_dates[slots['rows']] = slots['dates']
+        codes, symbols = pd.factorize(asset_symbols)
+        order = np.argsort(asset_dates, kind='stable')
+        _, first = np.unique(codes[order], return_index=True)
+        _, last = np.unique(codes[order][::-1], return_index=True)
+        first_rows = order[first]
+        last_rows = order[len(order) - 1 - last]
+        for code, symbol in enumerate(symbols):
+            first_key = (asset_dates[first_rows[code]],
+                         self.next_sequence + first_rows[code])
+            last_key = (asset_dates[last_rows[code]],
+                        self.next_sequence + last_rows[code])
+            currency = slots['asset_currency'][last_rows[code]]
+            if symbol not in self.holdings:
+                self.holdings[symbol] = SymbolHoldings(
+                    currency, first_key, slots['dates'].dtype)
+            holdings = self.holdings[symbol]
+            holdings.first_key = min(holdings.first_key, first_key)
+            if last_key >= holdings.currency_key:
+                holdings.asset_currency = currency
+                holdings.currency_key = last_key
+            self.asset_currencies[symbol] = holdings.asset_currency
+        # mirror Updates, which can only append to holdings of symbols that
+        # have already appeared as the asset of a transaction
+        for symbol in pd.unique(slots['symbols']):
+            if symbol not in self.holdings:
+                raise KeyError(symbol)
+
+    def _merge_symbol_slots(self, symbol, slots):
+        holdings = self.holdings[symbol]
+        position = holdings.insert_position(slots['date'].min())
+        if position < holdings.size:
+            slots = dict([
+                [field, np.concatenate([
+                    holdings.view(field, position), slots[field]])]
+                for field in slots
+            ])
+        # the tail is already ordered and new slots are in arrival order, so
+        # a stable sort on date keeps ties in arrival order
+        order = np.argsort(slots['date'], kind='stable')
+        slots = dict([[field, values[order]]
+                      for field, values in slots.items()])
+        start = holdings.latest_quantity(position)
+        slots['quantity'] = np.add.accumulate(
+            np.concatenate([[start], slots['delta'].ravel()]))[2::2]
+        holdings.replace_tail(position, slots)
+
+    def _symbol_frame(self, symbol):
+        if symbol not in self._frames:
+            holdings = self.holdings[symbol]
+            self._frames[symbol] = self._updates_df(
+                holdings.view('date'),
+                (holdings.view('quantity'), holdings.view('quantity_int')),
+                (holdings.view('price'), holdings.view('price_int')),
+                (holdings.view('factor'), holdings.view('factor_int')),
+                (holdings.view('rate'), holdings.view('rate_int')),
+                holdings.view('base'))
+        return self._frames[symbol]
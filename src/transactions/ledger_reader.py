@@ -0,0 +1,51 @@
+import re
+import json
+from itertools import islice
+
+separators = re.compile(r'[\s,]*')
+
+
+def iter_ledger_records(path, read_size=1 << 20):
+    # Yields transaction records one at a time from either a JSON array of
+    # objects or a JSON lines file, holding at most about one read_size
+    # block of the file in memory.
+    decoder = json.JSONDecoder()
+    with open(path) as ledger_file:
+        buffer = ledger_file.read(read_size)
+        position = separators.match(buffer).end()
+        is_array = buffer[position:position + 1] == '['
+        if is_array:
+            position += 1
+        while True:
+            position = separators.match(buffer, position).end()
+            if position >= len(buffer) or position > read_size:
+                buffer = buffer[position:]
+                position = 0
+            if not buffer:
+                buffer = ledger_file.read(read_size)
+                if not buffer:
+                    if is_array:
+                        raise ValueError('Unterminated JSON array: ' + path)
+                    return
+                continue
+            if is_array and buffer[position] == ']':
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                more = ledger_file.read(read_size)
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield record
+
+
+def iter_ledger_batches(path, batch_size=20000, read_size=1 << 20):
+    records = iter_ledger_records(path, read_size)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,242 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from columnar_updates import ColumnarUpdates
+
+snapshot_version = 1
+index_column = '__index__'
+
+
+class StoredUpdates(ColumnarUpdates):
+    # Updates reloaded from a snapshot rather than computed from transactions.
+    # The frames are built on the memory mapped columns, so only the integer
+    # and Base Currency columns (converted from the stored floats and codes)
+    # are read in on load.
+
+    def __init__(self, directory, manifest, mmap_mode='r'):
+        self.holdings = {}
+        self.asset_currencies = {}
+        self.updates = {}
+        columns = dict([
+            [spec['name'], _load_column(directory, spec, mmap_mode, False)]
+            for spec in manifest['columns']
+        ])
+        offsets = manifest['offsets']
+        for i, symbol in enumerate(manifest['symbols']):
+            rows = slice(offsets[i], offsets[i + 1])
+            num_rows = offsets[i + 1] - offsets[i]
+            numeric = dict([
+                [column, (
+                    columns[column][rows],
+                    np.full(num_rows, manifest['int_columns'][i][column]))]
+                for column in ['Quantity', 'Price', 'Price Factor',
+                               'Exchange Rate']
+            ])
+            self.asset_currencies[symbol] = manifest['asset_currencies'][i]
+            self.updates[symbol] = {
+                'asset_currency': manifest['asset_currencies'][i],
+                'updates': self._updates_df(
+                    columns[index_column][rows],
+                    numeric['Quantity'], numeric['Price'],
+                    numeric['Price Factor'], numeric['Exchange Rate'],
+                    columns['Base Currency'][rows], copy=False)
+            }
+
+
+def ledger_fingerprint(path):
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+def _save_column(directory, name, position, values):
+    # every column is stored as a plain numeric .npy file so that it can be
+    # memory mapped on load; strings are stored as codes plus a value list
+    spec = {'name': name, 'file': '{}.npy'.format(position)}
+    file_path = os.path.join(directory, spec['file'])
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        spec['kind'] = 'category'
+        spec['categories'] = values.cat.categories.tolist()
+        np.save(file_path, values.cat.codes.to_numpy())
+    elif values.dtype.kind == 'M':
+        spec['kind'] = 'datetime'
+        spec['dtype'] = str(values.dtype)
+        np.save(file_path, values.to_numpy().view('int64'))
+    elif values.dtype.kind in 'biuf':
+        spec['kind'] = 'numeric'
+        np.save(file_path, values.to_numpy())
+    else:
+        spec['kind'] = 'object'
+        codes, uniques = pd.factorize(values.astype(object), sort=False)
+        spec['values'] = list(uniques)
+        np.save(file_path, codes)
+    return spec
+
+
+def _load_column(directory, spec, mmap_mode, infer_objects=True):
+    values = np.load(
+        os.path.join(directory, spec['file']), mmap_mode=mmap_mode)
+    if spec['kind'] == 'category':
+        return pd.Categorical.from_codes(values, spec['categories'])
+    if spec['kind'] == 'datetime':
+        return values.view(spec['dtype'])
+    if spec['kind'] == 'object':
+        uniques = np.array(spec['values'] + [None], dtype=object)
+        if not infer_objects:
+            return uniques[values]
+        return pd.Series(uniques[values]).infer_objects().to_numpy()
+    return values
+
+
+def save_frame(frame, directory):
+    columns = [[index_column, pd.Series(frame.index)]] + [
+        [name, frame[name]] for name in frame.columns]
+    return {
+        'index_name': frame.index.name,
+        'columns': [
+            _save_column(directory, name, position, values)
+            for position, (name, values) in enumerate(columns)
+        ]
+    }
+
+
+def load_frame(directory, manifest, mmap_mode='r'):
+    columns = dict([
+        [spec['name'], _load_column(directory, spec, mmap_mode)]
+        for spec in manifest['columns']
+    ])
+    index = pd.Index(columns.pop(index_column), name=manifest['index_name'])
+    return pd.DataFrame(
+        columns, index=index,
+        columns=[spec['name'] for spec in manifest['columns'][1:]],
+        copy=False)
+
+
+class LedgerSnapshot:
+    # Stores the normalized transactions and the per asset updates of a
+    # ledger as memory mappable .npy columns, alongside the fingerprint of
+    # the ledger file they were computed from.
+    manifest_file = 'manifest.json'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(
+                    self.directory, self.manifest_file)) as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+
+    def is_current(self, ledger_path):
+        manifest = self._read_manifest()
+        return (
+            manifest is not None and
+            manifest['version'] == snapshot_version and
+            manifest['ledger'] == ledger_fingerprint(ledger_path)
+        )
+
+    def save(self, ledger_path, transactions, updates):
+        # staged in a directory of its own, so processes rebuilding the same
+        # snapshot at once don't write into (or delete) each other's
+        directory = self.directory.rstrip(os.sep)
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(
+            dir=parent, prefix=os.path.basename(directory) + '.',
+            suffix='.tmp')
+        try:
+            self._write(staging, ledger_path, transactions, updates)
+            self._swap_in(staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _write(self, staging, ledger_path, transactions, updates):
+        os.makedirs(os.path.join(staging, 'transactions'))
+        os.makedirs(os.path.join(staging, 'updates'))
+
+        manifest = {
+            'version': snapshot_version,
+            'ledger': ledger_fingerprint(ledger_path),
+            'transactions': save_frame(
+                transactions, os.path.join(staging, 'transactions')),
+            'updates': self._save_updates(
+                updates, os.path.join(staging, 'updates'))
+        }
+        with open(os.path.join(staging, self.manifest_file), 'w') as f:
+            json.dump(manifest, f)
+
+    def _swap_in(self, staging):
+        # swap the complete snapshot in, so a crash never leaves a
+        # half written snapshot that looks current; the old one is moved
+        # aside rather than deleted in place, so it's never seen half
+        # deleted either. If another process swaps its own in first the
+        # rename fails: its snapshot is of the same ledger, so that's as good
+        # as ours.
+        old = staging + '.old'
+        try:
+            os.rename(self.directory, old)
+        except OSError:
+            old = None
+        try:
+            os.rename(staging, self.directory)
+        except OSError:
+            if not os.path.isdir(self.directory):
+                raise
+        finally:
+            if old is not None:
+                shutil.rmtree(old, ignore_errors=True)
+
+    @staticmethod
+    def _save_updates(updates, directory):
+        # all symbols share one set of column files, with per symbol row
+        # offsets and the per symbol column dtypes needed to rebuild frames
+        symbols = list(updates.updates)
+        frames = [updates.updates[symbol]['updates'] for symbol in symbols]
+        numeric_columns = ['Quantity', 'Price', 'Price Factor',
+                           'Exchange Rate']
+        if frames:
+            combined = pd.concat([
+                frame.astype(dict([
+                    [column, 'float64'] for column in numeric_columns]))
+                .astype({'Base Currency': object})
+                for frame in frames
+            ])
+        else:
+            combined = pd.DataFrame(
+                columns=ColumnarUpdates.updates_columns).set_index('Date')
+        if combined.index.dtype.kind != 'M':
+            combined.index = combined.index.astype(object)
+        manifest = save_frame(combined, directory)
+        manifest['symbols'] = symbols
+        manifest['asset_currencies'] = [
+            updates.updates[symbol]['asset_currency'] for symbol in symbols]
+        manifest['offsets'] = np.cumsum(
+            [0] + [len(frame) for frame in frames]).tolist()
+        manifest['int_columns'] = [
+            dict([
+                [column, frame[column].dtype.kind in 'iub']
+                for column in numeric_columns
+            ])
+            for frame in frames
+        ]
+        return manifest
+
+    def load_transactions(self, mmap_mode='r'):
+        manifest = self._read_manifest()
+        return load_frame(
+            os.path.join(self.directory, 'transactions'),
+            manifest['transactions'], mmap_mode)
+
+    def load_updates(self, mmap_mode='r'):
+        manifest = self._read_manifest()
+        return StoredUpdates(
+            os.path.join(self.directory, 'updates'),
+            manifest['updates'], mmap_mode)
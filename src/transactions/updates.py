@@ -12,6 +12,8 @@ class Updates:
     asset_currencies = {}
 
     def __init__(self, transactions):
+        self.holdings = {}
+        self.asset_currencies = {}
         for _, transaction in transactions.iterrows():
             self._updates_from_transaction(transaction)
         self.updates = dict([